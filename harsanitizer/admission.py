@@ -0,0 +1,221 @@
+"""Admission control for HAR requests: size limits, byte budget, concurrency."""
+
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import resource
+import threading
+
+
+MB = 1024 * 1024
+# Request size histogram bucket upper bounds, in bytes
+SIZE_BUCKETS = [64 * 1024, 256 * 1024, MB, 4 * MB, 16 * MB, 64 * MB, 256 * MB]
+
+
+class Rejected(Exception):
+  """Raised when a request is not admitted.
+
+  Attributes:
+    status: (int) HTTP status code, 413 or 503
+    retry_after: (int) seconds the client should wait before retrying, or None
+  """
+
+  def __init__(self, message, status, retry_after=None):
+    super(Rejected, self).__init__(message)
+    self.status = status
+    self.retry_after = retry_after
+
+
+class AdmissionController(object):
+  """Admits requests against size, in-flight byte and concurrency limits.
+
+  Each admitted HAR costs several times its size in memory while it is
+  parsed and scrubbed, so requests are admitted only while the sum of the
+  bodies being processed fits [max_inflight_bytes], and at most
+  [max_concurrent] at a time.  Requests that do not fit wait up to
+  [queue_timeout] seconds for capacity before being shed.  Data kept past
+  its request, e.g. the HAR of a preview session, is held against the same
+  budget with hold() until unhold(), up to [max_held_bytes].
+
+  Typical usage example:
+    controller = AdmissionController(max_request_bytes=50 * MB)
+    size = controller.acquire(len(body))  # raises Rejected
+    try:
+      ...
+    finally:
+      controller.release(size)
+
+  Args:
+    max_request_bytes: (int) largest request body admitted (else 413)
+    max_inflight_bytes: (int) budget for bodies being processed at once
+    max_concurrent: (int) requests processed at once
+    queue_timeout: (float) seconds to wait for capacity before a 503
+    retry_after: (int) Retry-After seconds sent with a 503
+    max_held_bytes: (int) budget for data held past its request.
+                    Default=what max_inflight_bytes leaves once a request of
+                    max_request_bytes is in flight
+  """
+
+  def __init__(
+      self,
+      max_request_bytes=100 * MB,
+      max_inflight_bytes=400 * MB,
+      max_concurrent=4,
+      queue_timeout=1.0,
+      retry_after=5,
+      max_held_bytes=None):
+    super(AdmissionController, self).__init__()
+    self.max_request_bytes = max_request_bytes
+    self.max_inflight_bytes = max_inflight_bytes
+    self.max_concurrent = max_concurrent
+    self.queue_timeout = queue_timeout
+    self.retry_after = retry_after
+    if max_held_bytes is None:
+      max_held_bytes = max(max_inflight_bytes - max_request_bytes, 0)
+    self.max_held_bytes = max_held_bytes
+
+    self.condition = threading.Condition(threading.Lock())
+    self.inflight_bytes = 0
+    self.inflight_requests = 0
+    self.held_bytes = 0
+    self.peak_inflight_bytes = 0
+    self.peak_inflight_requests = 0
+    self.counts = {
+        "admitted": 0,
+        "rejected_too_large": 0,
+        "rejected_busy": 0,
+    }
+    self.admitted_bytes = 0
+    self.max_admitted_bytes = 0
+    self.size_histogram = [0] * (len(SIZE_BUCKETS) + 1)
+    self.total_wait_seconds = 0.0
+
+  def fits(self, size):
+    """Returns True if a [size] byte request can be admitted right now."""
+    return (self.inflight_requests < self.max_concurrent
+            and self.inflight_bytes + self.held_bytes + size
+            <= self.max_inflight_bytes)
+
+  def acquire(self, size):
+    """Admits a request of [size] bytes, waiting up to queue_timeout.
+
+    Args:
+      size: (int) request body size in bytes
+
+    Returns:
+      size, to be passed to release() once the request is done
+
+    Raises:
+      Rejected: 413 if the request is too large to ever be admitted, or 503
+                if there was no capacity within queue_timeout
+    """
+    with self.condition:
+      if size > min(self.max_request_bytes, self.max_inflight_bytes):
+        self.counts["rejected_too_large"] += 1
+        raise Rejected(
+            "Request body of {} bytes exceeds the {} byte limit".format(
+                size, min(self.max_request_bytes, self.max_inflight_bytes)),
+            413)
+
+      start = time.time()
+      while not self.fits(size):
+        remaining = start + self.queue_timeout - time.time()
+        if remaining <= 0:
+          self.counts["rejected_busy"] += 1
+          raise Rejected(
+              "Server is at capacity, retry later", 503,
+              retry_after=self.retry_after)
+        self.condition.wait(remaining)
+      self.total_wait_seconds += time.time() - start
+
+      self.inflight_bytes += size
+      self.inflight_requests += 1
+      self.peak_inflight_bytes = max(
+          self.peak_inflight_bytes, self.inflight_bytes)
+      self.peak_inflight_requests = max(
+          self.peak_inflight_requests, self.inflight_requests)
+      self.counts["admitted"] += 1
+      self.admitted_bytes += size
+      self.max_admitted_bytes = max(self.max_admitted_bytes, size)
+      bucket = len([bound for bound in SIZE_BUCKETS if size > bound])
+      self.size_histogram[bucket] += 1
+    return size
+
+  def release(self, size):
+    """Releases a request admitted by acquire()."""
+    with self.condition:
+      self.inflight_bytes -= size
+      self.inflight_requests -= 1
+      self.condition.notify_all()
+
+  def hold(self, size):
+    """Holds [size] bytes of the budget for data kept past its request.
+
+    Args:
+      size: (int) bytes held
+
+    Returns:
+      size, to be passed to unhold() once the data is dropped
+
+    Raises:
+      Rejected: 413 if the held bytes would exceed max_held_bytes
+    """
+    with self.condition:
+      if self.held_bytes + size > self.max_held_bytes:
+        raise Rejected(
+            "Holding {} bytes exceeds the {} byte limit of held data".format(
+                size, self.max_held_bytes),
+            413)
+      self.held_bytes += size
+    return size
+
+  def unhold(self, size):
+    """Releases bytes held by hold()."""
+    with self.condition:
+      self.held_bytes -= size
+      self.condition.notify_all()
+
+  def stats(self):
+    """Returns admission limits and metrics as a json-serializable dict."""
+    with self.condition:
+      histogram = dict(
+          ("le_{}".format(bound), count)
+          for bound, count in zip(SIZE_BUCKETS, self.size_histogram))
+      histogram["gt_{}".format(SIZE_BUCKETS[-1])] = self.size_histogram[-1]
+      admitted = self.counts["admitted"]
+      return {
+          "limits": {
+              "max_request_bytes": self.max_request_bytes,
+              "max_inflight_bytes": self.max_inflight_bytes,
+              "max_concurrent": self.max_concurrent,
+              "queue_timeout": self.queue_timeout,
+              "max_held_bytes": self.max_held_bytes,
+          },
+          "inflight_bytes": self.inflight_bytes,
+          "inflight_requests": self.inflight_requests,
+          "held_bytes": self.held_bytes,
+          "peak_inflight_bytes": self.peak_inflight_bytes,
+          "peak_inflight_requests": self.peak_inflight_requests,
+          "counts": dict(self.counts),
+          "admitted_bytes": self.admitted_bytes,
+          "max_admitted_bytes": self.max_admitted_bytes,
+          "mean_wait_seconds": (
+              self.total_wait_seconds / admitted if admitted else 0.0),
+          "request_size_histogram": histogram,
+          # ru_maxrss is in kilobytes on Linux
+          "process_peak_rss_bytes": (
+              resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024),
+      }
@@ -0,0 +1,237 @@
+"""Compact in-memory representation of parsed HAR json."""
+
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from collections import Mapping, MutableMapping, OrderedDict
+
+# Values of these keys repeat across entries and are shared when loading
+INTERNED_VALUE_KEYS = frozenset([
+    "name", "method", "httpVersion", "mimeType", "statusText"])
+# Key order of objects stored as NameValue
+NAME_VALUE_KEYS = ("name", "value")
+
+_MISSING = object()
+
+
+class Shape(object):
+  """An ordered tuple of keys shared by every CompactDict that has them.
+
+  Attributes:
+    keys: tuple of keys, in insertion order
+    index: {key: position in keys}
+  """
+  __slots__ = ("keys", "index")
+
+  def __init__(self, keys):
+    self.keys = keys
+    self.index = dict((key, position) for position, key in enumerate(keys))
+
+
+# Shapes by key tuple, shared by all compact HARs
+_shapes = {}
+
+
+def get_shape(keys):
+  """Returns the shared Shape for [keys] (tuple)."""
+  shape = _shapes.get(keys)
+  if shape is None:
+    shape = _shapes[keys] = Shape(keys)
+  return shape
+
+
+class CompactDict(MutableMapping):
+  """A mapping storing its keys as a shared Shape and its values in a list.
+
+  Objects with the same keys in the same order (every entry, request,
+  timings...) share one key tuple and index, so each object only costs a
+  small slotted instance and a list of values.  Iterates in insertion
+  order, like the json it was loaded from.
+
+  Args:
+    pairs: iterable of (key, value), as given to a json object_pairs_hook
+  """
+  __slots__ = ("_shape", "_values")
+
+  def __init__(self, pairs=()):
+    keys = []
+    values = []
+    for key, value in pairs:
+      if key in keys:
+        values[keys.index(key)] = value
+      else:
+        keys.append(key)
+        values.append(value)
+    self._shape = get_shape(tuple(keys))
+    self._values = values
+
+  def __getitem__(self, key):
+    return self._values[self._shape.index[key]]
+
+  def __setitem__(self, key, value):
+    position = self._shape.index.get(key)
+    if position is None:
+      self._shape = get_shape(self._shape.keys + (key,))
+      self._values.append(value)
+    else:
+      self._values[position] = value
+
+  def __delitem__(self, key):
+    position = self._shape.index[key]
+    keys = self._shape.keys
+    self._shape = get_shape(keys[:position] + keys[position + 1:])
+    del self._values[position]
+
+  def __contains__(self, key):
+    return key in self._shape.index
+
+  def __iter__(self):
+    return iter(self._shape.keys)
+
+  def __len__(self):
+    return len(self._values)
+
+  def __repr__(self):
+    return "CompactDict({!r})".format(self.items())
+
+
+class NameValue(MutableMapping):
+  """A {"name": ..., "value": ...} object (header, cookie, param) in slots.
+
+  Keys other than name and value are kept, in order, in a CompactDict.
+
+  Args:
+    name: the "name" value
+    value: the "value" value
+  """
+  __slots__ = ("name", "value", "_extra")
+
+  def __init__(self, name, value):
+    self.name = name
+    self.value = value
+    self._extra = None
+
+  def __getitem__(self, key):
+    if key == "name" or key == "value":
+      item = getattr(self, key)
+      if item is not _MISSING:
+        return item
+    elif self._extra is not None:
+      return self._extra[key]
+    raise KeyError(key)
+
+  def __setitem__(self, key, value):
+    if key == "name" or key == "value":
+      setattr(self, key, value)
+    else:
+      if self._extra is None:
+        self._extra = CompactDict()
+      self._extra[key] = value
+
+  def __delitem__(self, key):
+    if key == "name" or key == "value":
+      if getattr(self, key) is _MISSING:
+        raise KeyError(key)
+      setattr(self, key, _MISSING)
+    elif self._extra is not None:
+      del self._extra[key]
+    else:
+      raise KeyError(key)
+
+  def __iter__(self):
+    for key in NAME_VALUE_KEYS:
+      if getattr(self, key) is not _MISSING:
+        yield key
+    if self._extra is not None:
+      for key in self._extra:
+        yield key
+
+  def __len__(self):
+    return (len([key for key in NAME_VALUE_KEYS
+                 if getattr(self, key) is not _MISSING])
+            + (len(self._extra) if self._extra is not None else 0))
+
+  def __repr__(self):
+    return "NameValue({!r})".format(self.items())
+
+
+def compact_str(value):
+  """Returns unicode [value] as a str if it is ASCII.
+
+  ASCII str's take a quarter (UCS-4 builds) or half of the memory of the
+  same unicode, and serialize to the same json.
+  """
+  try:
+    return value.encode("ascii")
+  except UnicodeEncodeError:
+    return value
+
+
+def gen_object_hook(interned):
+  """Returns a json object_pairs_hook building compact objects.
+
+  Args:
+    interned: {str: str} table sharing keys and repeated values
+  """
+  def intern_str(value):
+    value = compact_str(value)
+    return interned.setdefault(value, value)
+
+  def object_pairs_hook(pairs):
+    compact_pairs = []
+    for key, value in pairs:
+      key = intern_str(key)
+      if isinstance(value, unicode):
+        if key in INTERNED_VALUE_KEYS:
+          value = intern_str(value)
+        else:
+          value = compact_str(value)
+      elif isinstance(value, list):
+        value[:] = [compact_str(item) if isinstance(item, unicode) else item
+                    for item in value]
+      compact_pairs.append((key, value))
+    if len(compact_pairs) == 2 and (
+        compact_pairs[0][0] == "name" and compact_pairs[1][0] == "value"):
+      return NameValue(compact_pairs[0][1], compact_pairs[1][1])
+    return CompactDict(compact_pairs)
+
+  return object_pairs_hook
+
+
+def loads(har_str):
+  """Parses json [har_str] into CompactDict/NameValue objects."""
+  return json.loads(har_str, object_pairs_hook=gen_object_hook({}))
+
+
+def serialize(obj):
+  """json.dumps() default hook serializing compact objects.
+
+  Usage:
+    json.dumps(har_dict, default=serialize)
+  """
+  if isinstance(obj, Mapping):
+    return OrderedDict(obj.iteritems())
+  raise TypeError("{!r} is not JSON serializable".format(obj))
+
+
+def dumps(obj, **kwargs):
+  """json.dumps() supporting compact objects."""
+  return json.dumps(obj, default=serialize, **kwargs)
+
+
+def dump(obj, fp, **kwargs):
+  """json.dump() supporting compact objects."""
+  return json.dump(obj, fp, default=serialize, **kwargs)
@@ -0,0 +1,132 @@
+"""Bounded cache of scrubbed response bodies, shared across scrubs."""
+
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+from harsanitizer import load_config
+
+MB = 1024 * 1024
+DEFAULT_MAX_BYTES = 64 * MB
+
+# This process's cache, see configured_cache()
+_configured = {}
+
+
+class ContentCache(object):
+  """Least recently used cache of scrubbed response content text.
+
+  Keyed by key(), a hash of the json serialized content text and of the
+  scrub profile (the patterns of the words the text holds), so an
+  identical body scrubbed with the same profile, in any HAR, is only
+  scanned once.  Holds
+  at most [max_bytes] of scrubbed text; least recently used results are
+  evicted first.  Safe to share between threads.
+
+  Typical usage example:
+    hs = HarSanitizer()
+    hs.content_cache = ContentCache(max_bytes=16 * MB)
+    har_redacted = hs.scrub(har)
+    stats = hs.content_cache.stats()
+
+  Args:
+    max_bytes: (int) total size of the cached scrubbed texts
+  """
+
+  def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+    super(ContentCache, self).__init__()
+    self.max_bytes = max_bytes
+    self.lock = threading.Lock()
+    self.results = OrderedDict()
+    self.bytes = 0
+    self.lookups = 0
+    self.hits = 0
+    self.bytes_saved = 0
+    self.evictions = 0
+
+  def key(self, profile, text):
+    """Returns the cache key of serialized content [text] scrubbed with
+    scrub [profile] (str digest, see HarSanitizer.scrub_profile())."""
+    digest = hashlib.sha1(profile)
+    digest.update("\0")
+    digest.update(text.encode("utf-8") if isinstance(text, unicode) else text)
+    return digest.hexdigest()
+
+  def get(self, key, size):
+    """Returns the scrubbed text cached under [key], or None.
+
+    Args:
+      key: (str) key() of the text
+      size: (int) length of the serialized text, counted as bytes saved on
+            a hit
+    """
+    with self.lock:
+      self.lookups += 1
+      scrubbed = self.results.pop(key, None)
+      if scrubbed is None:
+        return None
+      # Re-inserted as the most recently used
+      self.results[key] = scrubbed
+      self.hits += 1
+      self.bytes_saved += size
+      return scrubbed
+
+  def put(self, key, scrubbed):
+    """Caches scrubbed text [scrubbed] under [key], evicting the least
+    recently used results to stay within max_bytes."""
+    size = len(scrubbed)
+    if size > self.max_bytes:
+      return
+    with self.lock:
+      if key in self.results:
+        return
+      while self.results and self.bytes + size > self.max_bytes:
+        _, evicted = self.results.popitem(last=False)
+        self.bytes -= len(evicted)
+        self.evictions += 1
+      self.results[key] = scrubbed
+      self.bytes += size
+
+  def clear(self):
+    """Empties the cache, keeping its metrics."""
+    with self.lock:
+      self.results.clear()
+      self.bytes = 0
+
+  def stats(self):
+    """Returns cache metrics as a json-serializable dict."""
+    with self.lock:
+      return {
+          "max_bytes": self.max_bytes,
+          "bytes": self.bytes,
+          "entries": len(self.results),
+          "lookups": self.lookups,
+          "hits": self.hits,
+          "hit_rate": float(self.hits) / self.lookups if self.lookups else 0.0,
+          "bytes_saved": self.bytes_saved,
+          "evictions": self.evictions,
+      }
+
+
+def configured_cache():
+  """Returns this process's ContentCache, sized by "content_cache_bytes" in
+  config.json (default 64MB), or None when that is 0."""
+  if "cache" not in _configured:
+    max_bytes = load_config().get("content_cache_bytes", DEFAULT_MAX_BYTES)
+    _configured["cache"] = ContentCache(max_bytes) if max_bytes else None
+  return _configured["cache"]
@@ -20,6 +20,8 @@ from functools import wraps
 
 from flask import request, Response
 
+import admission
+
 def accept(mimetype):
     def decorator(func):
         """
@@ -51,3 +53,44 @@ def require(mimetype):
             return Response(data, 415, mimetype="application/json")
         return wrapper
     return decorator
+
+def rejected_response(err):
+    """
+    Returns the json Response of admission.Rejected [err], with Retry-After
+    if the client should retry
+    """
+    data = json.dumps({"message": str(err)})
+    response = Response(data, err.status, mimetype="application/json")
+    if err.retry_after is not None:
+        response.headers["Retry-After"] = str(err.retry_after)
+    return response
+
+def admit(get_controller):
+    def decorator(func):
+        """
+        Decorator which runs the endpoint under an admission.AdmissionController
+        returned by get_controller(): 411 Length Required without a
+        Content-Length, 413 Payload Too Large over the size limit, or 503
+        Service Unavailable with Retry-After while the server is at capacity.
+        GET requests have no body, and are admitted as 0 bytes
+        """
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            controller = get_controller()
+            size = request.content_length
+            if size is None and request.method == "GET":
+                size = 0
+            if size is None:
+                message = "Request must include a Content-Length"
+                data = json.dumps({"message": message})
+                return Response(data, 411, mimetype="application/json")
+            try:
+                ticket = controller.acquire(size)
+            except admission.Rejected as err:
+                return rejected_response(err)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                controller.release(ticket)
+        return wrapper
+    return decorator
@@ -0,0 +1,223 @@
+"""Include/exclude rules selecting which HAR entries are scrubbed."""
+
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+import fnmatch
+import urlparse
+from collections import Mapping
+
+# What happens to entries the filter does not keep
+FILTER_ACTIONS = ["drop", "metadata"]
+RULE_FIELDS = ["host", "url", "mimeType", "status", "min_size", "max_size"]
+# Entry fields kept when an entry is reduced to metadata
+METADATA_FIELDS = ["pageref", "startedDateTime", "time"]
+REQUEST_METADATA_FIELDS = ["method", "url", "httpVersion"]
+RESPONSE_METADATA_FIELDS = ["status", "statusText", "httpVersion"]
+
+
+def entry_host(entry):
+  """Returns the lowercased request host of [entry], or ""."""
+  url = entry.get("request", {}).get("url") or ""
+  return (urlparse.urlparse(url).hostname or "").lower()
+
+
+def entry_mimetype(entry):
+  """Returns the response content mimeType of [entry] without parameters."""
+  content = entry.get("response", {}).get("content", {})
+  return (content.get("mimeType") or "").split(";")[0].strip().lower()
+
+
+def entry_size(entry):
+  """Returns the response content size of [entry], or its bodySize."""
+  response = entry.get("response", {})
+  size = response.get("content", {}).get("size")
+  if not isinstance(size, (int, long)) or size < 0:
+    size = response.get("bodySize")
+  return size if isinstance(size, (int, long)) and size >= 0 else 0
+
+
+def status_matches(expected, status):
+  """Returns True if [status] (int) matches [expected].
+
+  [expected] is an int, a "4xx" style class str, or a list of either.
+  """
+  if isinstance(expected, list):
+    return any(status_matches(item, status) for item in expected)
+  if isinstance(expected, basestring) and expected.lower().endswith("xx"):
+    return str(status)[:1] == expected[:1]
+  try:
+    return int(expected) == status
+  except (TypeError, ValueError):
+    return False
+
+
+def metadata_url(url):
+  """Returns [url] without userinfo, query or fragment.
+
+  A reduced entry keeps no queryString, cookies or headers, so scrub()
+  collects no names from it, and values in its query string would not be
+  redacted by the all_* options.
+  """
+  if not isinstance(url, basestring):
+    return url
+  parts = urlparse.urlsplit(url)
+  return urlparse.urlunsplit(
+      (parts.scheme, parts.netloc.rpartition("@")[2], parts.path, "", ""))
+
+
+def reduce_to_metadata(entry):
+  """Returns a copy of [entry] with only timing, method, URL (see
+  metadata_url()), status and content size/mimeType, without cookies,
+  headers, params or bodies."""
+  request = entry.get("request", {})
+  response = entry.get("response", {})
+  content = response.get("content", {})
+  reduced = dict(
+      (field, entry[field]) for field in METADATA_FIELDS if field in entry)
+  reduced["request"] = dict(
+      (field, request[field])
+      for field in REQUEST_METADATA_FIELDS if field in request)
+  if "url" in reduced["request"]:
+    reduced["request"]["url"] = metadata_url(reduced["request"]["url"])
+  reduced["response"] = dict(
+      (field, response[field])
+      for field in RESPONSE_METADATA_FIELDS if field in response)
+  reduced["response"]["content"] = dict(
+      (field, content[field]) for field in ["size", "mimeType"]
+      if field in content)
+  return reduced
+
+
+class EntryFilter(object):
+  """Selects the HAR entries to scrub with include and exclude rules.
+
+  A rule is a dict of one or more conditions, all of which must match:
+    host: glob of the request host, e.g. "*.cdn.example.net"
+    url: regex searched for in the request URL
+    mimeType: glob of the response content mimeType, e.g. "font/*"
+    status: response status int, "4xx" style class, or a list of either
+    min_size / max_size: bounds of the response content size in bytes
+
+  An entry is kept if it matches any include rule (or there are none) and
+  no exclude rule.  Other entries are dropped, or with action "metadata"
+  reduced to timing, method, URL without query or userinfo, status and
+  content size/mimeType.
+
+  Typical usage example:
+    entry_filter = EntryFilter(
+        exclude=[{"mimeType": "font/*"}, {"host": "*.analytics.example.org"}],
+        action="metadata")
+    entries = entry_filter.apply(har.har_dict["log"]["entries"])
+
+  Args:
+    include: list of rule dicts
+    exclude: list of rule dicts
+    action: "drop" (default) or "metadata"
+
+  Raises:
+    ValueError: invalid rule or action
+  """
+
+  def __init__(self, include=None, exclude=None, action="drop"):
+    super(EntryFilter, self).__init__()
+    if action not in FILTER_ACTIONS:
+      raise ValueError("Entry filter action must be one of: {}".format(
+          ", ".join(FILTER_ACTIONS)))
+    self.include = [self.load_rule(rule) for rule in include or []]
+    self.exclude = [self.load_rule(rule) for rule in exclude or []]
+    self.action = action
+    self.stats = {"entries": 0, "kept": 0, "dropped": 0, "reduced": 0}
+
+  @classmethod
+  def from_option(cls, entry_filter):
+    """Returns an EntryFilter for the scrub() "entry_filter" option: an
+    EntryFilter, or a dict of EntryFilter arguments."""
+    if isinstance(entry_filter, cls):
+      return entry_filter
+    if not isinstance(entry_filter, Mapping):
+      raise ValueError("entry_filter must be a dict of include, exclude "
+                       "and action")
+    unknown = set(entry_filter) - set(["include", "exclude", "action"])
+    if unknown:
+      raise ValueError("Unknown entry_filter keys: {}".format(
+          ", ".join(sorted(unknown))))
+    return cls(**dict(entry_filter))
+
+  def load_rule(self, rule):
+    """Validates [rule] (dict), returning it with its url regex compiled."""
+    if not isinstance(rule, Mapping) or not rule:
+      raise ValueError("Entry filter rules must be non-empty dicts")
+    unknown = set(rule) - set(RULE_FIELDS)
+    if unknown:
+      raise ValueError("Unknown entry filter rule fields: {}".format(
+          ", ".join(sorted(unknown))))
+    rule = dict(rule)
+    if "url" in rule:
+      try:
+        rule["url"] = re.compile(rule["url"])
+      except (re.error, TypeError):
+        raise ValueError("Invalid entry filter url regex: {}".format(
+            rule["url"]))
+    for field in ["host", "mimeType"]:
+      if field in rule and not isinstance(rule[field], basestring):
+        raise ValueError("Entry filter {} must be a str".format(field))
+    for field in ["min_size", "max_size"]:
+      if field in rule and not isinstance(rule[field], (int, long)):
+        raise ValueError("Entry filter {} must be an int".format(field))
+    return rule
+
+  def matches(self, rule, entry):
+    """Returns True if every condition of [rule] matches [entry]."""
+    if "host" in rule and not fnmatch.fnmatchcase(
+        entry_host(entry), rule["host"].lower()):
+      return False
+    if "url" in rule and not rule["url"].search(
+        entry.get("request", {}).get("url") or ""):
+      return False
+    if "mimeType" in rule and not fnmatch.fnmatchcase(
+        entry_mimetype(entry), rule["mimeType"].lower()):
+      return False
+    if "status" in rule and not status_matches(
+        rule["status"], entry.get("response", {}).get("status")):
+      return False
+    if "min_size" in rule and entry_size(entry) < rule["min_size"]:
+      return False
+    if "max_size" in rule and entry_size(entry) > rule["max_size"]:
+      return False
+    return True
+
+  def keep(self, entry):
+    """Returns True if [entry] is selected for scrubbing."""
+    if self.include and not any(
+        self.matches(rule, entry) for rule in self.include):
+      return False
+    return not any(self.matches(rule, entry) for rule in self.exclude)
+
+  def apply(self, entries):
+    """Returns [entries] (list of entry dicts) filtered, counting in stats."""
+    filtered = []
+    for entry in entries:
+      self.stats["entries"] += 1
+      if self.keep(entry):
+        self.stats["kept"] += 1
+        filtered.append(entry)
+      elif self.action == "metadata":
+        self.stats["reduced"] += 1
+        filtered.append(reduce_to_metadata(entry))
+      else:
+        self.stats["dropped"] += 1
+    return filtered
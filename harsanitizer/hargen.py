@@ -0,0 +1,157 @@
+"""Generates synthetic HARs for tests, benchmarks and load tests."""
+
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+import string
+
+HOSTS = [
+    "app.example.com",
+    "api.example.com",
+    "cdn.example.net",
+    "fonts.example.net",
+    "analytics.example.org",
+]
+PATHS = ["/", "/login", "/api/v1/items", "/static/app.js", "/static/app.css",
+         "/fonts/roboto.woff2", "/collect", "/oauth/authorize"]
+CONTENT = [
+    ("text/html", "<html><body><form action=\"/login?state={token}\">"
+                  "<input name=\"password\"></form></body></html>"),
+    ("application/javascript", "var config = {{\"token\": \"{token}\"}};"),
+    ("application/json", "{{\"id_token\": \"{token}\", \"items\": [1, 2, 3]}}"),
+    ("text/css", "body {{ background: url(/img.png?v={token}); }}"),
+    ("font/woff2", "d09GMgABAAAAA{token}"),
+    ("image/gif", "R0lGODlhAQABAIAAAAAAAP{token}"),
+]
+USER_AGENT = ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/63.0.3239.84 Safari/537.36")
+
+
+def random_token(rng, length=16):
+  """Returns a random alphanumeric str of [length]."""
+  return "".join(
+      rng.choice(string.ascii_letters + string.digits) for _ in range(length))
+
+
+def gen_entry(rng, session, body_size=0):
+  """Returns one HAR entry dict.
+
+  Args:
+    rng: random.Random instance
+    session: dict of values shared by all entries of a capture
+    body_size: (int) minimum response content text size in bytes
+  """
+  host = rng.choice(HOSTS)
+  path = rng.choice(PATHS)
+  query = [
+      {"name": "token", "value": session["token"]},
+      {"name": "page", "value": str(rng.randint(1, 3))},
+  ]
+  url = "https://{}{}?token={}&page={}".format(
+      host, path, query[0]["value"], query[1]["value"])
+  if rng.random() < 0.05:
+    url = "https://admin:{}@{}{}".format(session["password"], host, path)
+
+  mimetype, text = rng.choice(CONTENT)
+  text = text.format(token=session["token"])
+  if body_size > len(text):
+    text = (text * (body_size // len(text) + 1))[:body_size]
+
+  request = {
+      "method": "GET",
+      "url": url,
+      "httpVersion": "HTTP/1.1",
+      "cookies": [
+          {"name": "SID", "value": session["sid"]},
+          {"name": "prefs", "value": "theme=dark"},
+      ],
+      "headers": [
+          {"name": "Host", "value": host},
+          {"name": "User-Agent", "value": USER_AGENT},
+          {"name": "Authorization", "value": "Bearer " + session["token"]},
+          {"name": "Cookie", "value": "SID={}; prefs=theme=dark".format(
+              session["sid"])},
+      ],
+      "queryString": query,
+      "headersSize": -1,
+      "bodySize": 0,
+  }
+  if path == "/login":
+    request["method"] = "POST"
+    request["postData"] = {
+        "mimeType": "application/x-www-form-urlencoded",
+        "params": [
+            {"name": "email", "value": "user@example.com"},
+            {"name": "password", "value": session["password"]},
+        ],
+        "text": "email=user%40example.com&password={}".format(
+            session["password"]),
+    }
+
+  status = rng.choice([200, 200, 200, 204, 302, 404])
+  response = {
+      "status": status,
+      "statusText": "OK",
+      "httpVersion": "HTTP/1.1",
+      "cookies": [],
+      "headers": [
+          {"name": "Content-Type", "value": mimetype},
+          {"name": "Cache-Control", "value": "max-age=3600"},
+      ],
+      "content": {"size": len(text), "mimeType": mimetype, "text": text},
+      "redirectURL": "",
+      "headersSize": -1,
+      "bodySize": len(text),
+  }
+  if status == 302:
+    response["redirectURL"] = "https://{}/callback?code={}".format(
+        host, session["token"])
+
+  return {
+      "startedDateTime": "2017-12-01T12:00:00.000Z",
+      "time": rng.randint(1, 500),
+      "request": request,
+      "response": response,
+      "cache": {},
+      "timings": {"send": 0, "wait": rng.randint(1, 400), "receive": 1},
+  }
+
+
+def gen_har(entries=100, body_size=0, seed=0):
+  """Returns a synthetic single-page-app capture as a HAR dict.
+
+  Cookies, auth headers, user agents and query strings repeat across
+  entries the way they do in real captures.
+
+  Args:
+    entries: (int) number of log entries
+    body_size: (int) minimum response content text size in bytes
+    seed: (int) random seed; the same arguments always give the same HAR
+  """
+  rng = random.Random(seed)
+  session = {
+      "sid": random_token(rng, 32),
+      "token": random_token(rng),
+      "password": random_token(rng, 10),
+  }
+  return {
+      "log": {
+          "version": "1.2",
+          "creator": {"name": "hargen", "version": "1.0"},
+          "entries": [
+              gen_entry(rng, session, body_size) for _ in range(entries)],
+      }
+  }
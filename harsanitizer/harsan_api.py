@@ -16,36 +16,151 @@
 # limitations under the License.
 
 import os
+import re
+import uuid
 import datetime
 import json
+import tempfile
+import time
 import urllib2
 from flask import Flask, url_for, request, Response, render_template_string
 import decorators
+import admission
+import harsan_pool
+import profiler
+import compact
+import contentcache
+import preview
 from harsanitizer import Har, HarSanitizer
+from harsanitizer import load_config, load_json_resource, scrub_time_budget
+from harsanitizer import wordlist_path, mimetypes_path
+
+
+# Config and static resources are loaded by the library on first use
+def index_path():
+  """Returns the index.html template path/URL for the configured static folder."""
+  static_folder = load_config()["static_folder"]
+  # Local STATIC_FOLDER and template config
+  if static_folder[:4] != "http":
+    return "{}/templates/localhost/index.html".format(static_folder)
+  # Remote STATIC_FOLDER and template config
+  return "{}/templates/remotehost/index.html".format(static_folder)
+
+
+# Pre-forked scrub worker pool, started when config.json sets "workers"
+SCRUB_POOL = None
+
+# Admission controller shared by the HAR endpoints, built on first use
+ADMISSION = None
+
+
+def admission_controller():
+  """Returns the AdmissionController configured by config.json."""
+  global ADMISSION
+  if ADMISSION is None:
+    config = load_config()
+    defaults = admission.AdmissionController()
+    ADMISSION = admission.AdmissionController(
+        max_request_bytes=config.get(
+            "max_request_bytes", defaults.max_request_bytes),
+        max_inflight_bytes=config.get(
+            "max_inflight_bytes", defaults.max_inflight_bytes),
+        max_concurrent=config.get(
+            "max_concurrent_scrubs", defaults.max_concurrent),
+        queue_timeout=config.get(
+            "admission_queue_timeout", defaults.queue_timeout),
+        retry_after=config.get("retry_after", defaults.retry_after),
+        max_held_bytes=config.get("max_held_bytes"))
+    # Werkzeug also refuses to read bodies past the limit, e.g. when chunked
+    app.config["MAX_CONTENT_LENGTH"] = ADMISSION.max_request_bytes
+  return ADMISSION
+
+
+# Per-request profiling, enabled by "profiling" in config.json and requested
+# with a "profile" query flag or an X-Harsan-Profile header
+PROFILE_HEADER = "X-Harsan-Profile"
+PROFILE_ID_HEADER = "X-Harsan-Profile-Id"
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+# Stored reports kept, overridden by "max_profiles"/"profile_ttl" in config.json
+DEFAULT_MAX_PROFILES = 100
+DEFAULT_PROFILE_TTL = 3600
+
+# Set on /scrub_har responses whose scrub ran out of time and fell back to
+# degraded mode (see HarSanitizer.scrub_degraded())
+DEGRADED_HEADER = "X-Harsan-Degraded"
+
+
+def profile_dir():
+  """Returns the directory profile reports are stored in."""
+  return load_config().get("profile_dir") or os.path.join(
+      tempfile.gettempdir(), "harsanitizer-profiles")
+
+
+def profile_requested():
+  """Returns True if profiling is enabled and requested by this request."""
+  if not load_config().get("profiling"):
+    return False
+  flag = request.args.get("profile") or request.headers.get(PROFILE_HEADER)
+  return flag not in (None, "", "0", "false")
+
+
+def profile_expired(report_path):
+  """Returns True if the report at [report_path] is older than profile_ttl."""
+  ttl = load_config().get("profile_ttl", DEFAULT_PROFILE_TTL)
+  try:
+    return time.time() - os.path.getmtime(report_path) > ttl
+  except OSError:
+    return True
+
+
+def expire_profiles():
+  """Deletes reports older than profile_ttl, then the oldest reports past
+  max_profiles - 1, making room for one more."""
+  reports = []
+  for name in os.listdir(profile_dir()):
+    profile_id, extension = os.path.splitext(name)
+    if extension != ".json" or not PROFILE_ID_PATTERN.match(profile_id):
+      continue
+    report_path = os.path.join(profile_dir(), name)
+    if profile_expired(report_path):
+      remove_profile(report_path)
+    else:
+      reports.append((os.path.getmtime(report_path), report_path))
+  max_profiles = load_config().get("max_profiles", DEFAULT_MAX_PROFILES)
+  excess = len(reports) - max(max_profiles - 1, 0)
+  for _, report_path in sorted(reports)[:max(excess, 0)]:
+    remove_profile(report_path)
+
+
+def remove_profile(report_path):
+  """Deletes the report at [report_path], if another request has not."""
+  try:
+    os.remove(report_path)
+  except OSError:
+    pass
 
 
-# Config local/remote file locations
-CURRENT_DIR = os.path.abspath("./")
+def store_profile(report):
+  """Writes profile [report] (dict) to profile_dir(), returning its id.
 
-# Load/sanity check config.json
-try:
-  with open("./config.json", "r") as config:
-    STATIC_FOLDER = json.load(config)["static_folder"]
-except IOError:
-  raise IOError(
-    "'config.json' not found in '{}'. Please ensure that script is "
-    "being run from root './har-sanitizer/' directory.".format(CURRENT_DIR))
-except KeyError:
-  raise KeyError("'STATIC_FOLDER' key not found in config.json")
+  Reports are kept for "profile_ttl" seconds, and at most "max_profiles"
+  of them, the oldest being deleted first.
+  """
+  profile_id = uuid.uuid4().hex
+  if not os.path.isdir(profile_dir()):
+    os.makedirs(profile_dir())
+  expire_profiles()
+  with open(os.path.join(profile_dir(), profile_id + ".json"), "w") as out:
+    json.dump(report, out, indent=2)
+  return profile_id
 
-WORDLIST_PATH = "{}/wordlist.json".format(STATIC_FOLDER)
-MIMETYPES_PATH = "{}/mimetypesScrubList.json".format(STATIC_FOLDER)
-# Local STATIC_FOLDER and template config
-if STATIC_FOLDER[:4] != "http":
-  INDEX_PATH = "{}/templates/localhost/index.html".format(STATIC_FOLDER)
-# Remote STATIC_FOLDER and template config
-else:
-  INDEX_PATH = "{}/templates/remotehost/index.html".format(STATIC_FOLDER)
+
+def request_json():
+  """Returns the request's json body, as compact objects (see compact.py)
+  when config.json sets "compact_har"."""
+  if load_config().get("compact_har"):
+    return compact.loads(request.get_data())
+  return request.json
 
 
 # Serialize utility
@@ -62,12 +177,13 @@ app = Flask(__name__)
 
 @app.route("/")
 def index():
-  if STATIC_FOLDER[:4] == "http":
-    index_html_str = urllib2.urlopen(INDEX_PATH).read()
+  static_folder = load_config()["static_folder"]
+  if static_folder[:4] == "http":
+    index_html_str = urllib2.urlopen(index_path()).read()
   else:
-    with open(INDEX_PATH, "r") as index_file:
+    with open(index_path(), "r") as index_file:
       index_html_str = index_file.read()
-  return render_template_string(index_html_str, static_files=STATIC_FOLDER)
+  return render_template_string(index_html_str, static_files=static_folder)
 
 @app.route("/get_wordlist", methods=["GET"])
 def get_wordlist():
@@ -75,13 +191,9 @@ def get_wordlist():
   hs = HarSanitizer()
 
   try:
-    if WORDLIST_PATH[:4] == "http":
-      wordlist_json = json.loads(urllib2.urlopen(WORDLIST_PATH).read())
-      wordlist = hs.load_wordlist(wordlist=wordlist_json)
-    else:
-      wordlist = hs.load_wordlist(wordlist_path=WORDLIST_PATH)
+    wordlist = hs.load_wordlist(wordlist=load_json_resource(wordlist_path()))
   except Exception:
-    message = {"message": "Error: {} not found.".format(WORDLIST_PATH)}
+    message = {"message": "Error: {} not found.".format(wordlist_path())}
     data = json.dumps(message, default=json_serial)
     return Response(data, 500, mimetype="application/json")
 
@@ -95,13 +207,9 @@ def get_mimetype_scrublist():
   hs = HarSanitizer()
 
   try:
-    if MIMETYPES_PATH[:4] == "http":
-      mimetype_scrub_list = json.loads(urllib2.urlopen(MIMETYPES_PATH).read())
-    else:
-      with open(MIMETYPES_PATH, "r") as mimetypes_file:
-        mimetype_scrub_list = json.load(mimetypes_file)
+    mimetype_scrub_list = load_json_resource(mimetypes_path())
   except Exception:
-    message = {"message": "Error: {} not found.".format(MIMETYPES_PATH)}
+    message = {"message": "Error: {} not found.".format(mimetypes_path())}
     data = json.dumps(message, default=json_serial)
     return Response(data, 500, mimetype="application/json")
 
@@ -109,12 +217,55 @@ def get_mimetype_scrublist():
   return Response(data, 200, mimetype="application/json")
 
 
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+  """Returns admission control and content cache metrics.
+
+  With a scrub worker pool, each worker keeps its own content cache, and
+  "content_cache" only covers scrubs made in this process.
+  """
+  cache = contentcache.configured_cache()
+  metrics = {
+      "admission": admission_controller().stats(),
+      "content_cache": cache.stats() if cache is not None else None,
+  }
+  data = json.dumps(metrics, default=json_serial)
+  return Response(data, 200, mimetype="application/json")
+
+
+@app.route("/profiles/<profile_id>", methods=["GET"])
+def get_profile(profile_id):
+  """Returns a stored /scrub_har profile report."""
+  report_path = os.path.join(profile_dir(), profile_id + ".json")
+  if (not load_config().get("profiling")
+      or not PROFILE_ID_PATTERN.match(profile_id)
+      or not os.path.isfile(report_path)
+      or profile_expired(report_path)):
+    message = {"message": "Profile {} not found.".format(profile_id)}
+    data = json.dumps(message)
+    return Response(data, 404, mimetype="application/json")
+
+  with open(report_path, "r") as report_file:
+    data = report_file.read()
+  return Response(data, 200, mimetype="application/json")
+
+
+@app.errorhandler(413)
+def request_too_large(error):
+  """Returns a json 413 for bodies refused while they are read."""
+  message = "Request body exceeds the {} byte limit".format(
+      app.config["MAX_CONTENT_LENGTH"])
+  data = json.dumps({"message": message})
+  return Response(data, 413, mimetype="application/json")
+
+
 @app.route("/cookies", methods=["POST"])
 @decorators.accept("application/json")
 @decorators.require("application/json")
+@decorators.admit(admission_controller)
 def req_cookie_names():
   """Returns all cookie names found in POSTed Har (json)."""
-  data = request.json
+  data = request_json()
   hs = HarSanitizer()
 
   har = Har(har=data)
@@ -128,9 +279,10 @@ def req_cookie_names():
 @app.route("/headers", methods=["POST"])
 @decorators.accept("application/json")
 @decorators.require("application/json")
+@decorators.admit(admission_controller)
 def req_header_names():
   """Returns all header names found in POSTed Har (json)."""
-  data = request.json
+  data = request_json()
   hs = HarSanitizer()
 
   har = Har(har=data)
@@ -144,9 +296,10 @@ def req_header_names():
 @app.route("/params", methods=["POST"])
 @decorators.accept("application/json")
 @decorators.require("application/json")
+@decorators.admit(admission_controller)
 def req_urlparams():
   """Returns all URL Query and POSTData Parameter names found in POSTed Har (json)."""
-  data = request.json
+  data = request_json()
   hs = HarSanitizer()
   cond_table = {}
 
@@ -156,7 +309,6 @@ def req_urlparams():
   cond_table.update(url_pattern)
   cond_table.update(postdata_pattern)
   iter_har_dict = hs.iter_eval_exec(my_iter=har.har_dict, cond_table=cond_table)
-  har = hs.har
   urlparams = har.category["queryString"].keys()
 
   if isinstance(har.category["params"].keys(), list):
@@ -173,9 +325,10 @@ def req_urlparams():
 @app.route("/mimetypes", methods=["POST"])
 @decorators.accept("application/json")
 @decorators.require("application/json")
+@decorators.admit(admission_controller)
 def req_mimetypes():
   """Returns all content mimeTypes found in POSTed Har (json)."""
-  data = request.json
+  data = request_json()
   hs = HarSanitizer()
 
   har = Har(har=data)
@@ -186,37 +339,145 @@ def req_mimetypes():
   return Response(data, 200, mimetype="application/json")
 
 
+def invalid_scrub_response(err):
+  """Returns the 400 Response of a /scrub_har request scrub() rejected with
+  ValueError [err] (e.g. an invalid entry_filter)."""
+  message = {"message": "Invalid scrub request: {}".format(err)}
+  return Response(json.dumps(message), 400, mimetype="application/json")
+
+
 @app.route("/scrub_har", methods=["POST"])
 @decorators.accept("application/json")
 @decorators.require("application/json")
+@decorators.admit(admission_controller)
 def scrub():
   """Scrubs data["har"] with optional wordlists,
   content types, and scrub_all type bools.
+
+  The scrub is bounded by "scrub_time_budget" in config.json, or a smaller
+  data["time_budget"].  Past it, the HAR is redacted in degraded mode and
+  the response carries an X-Harsan-Degraded header.
   """
+  profile = profile_requested()
+  # The raw body is handed to a warmed worker process without parsing it here
+  # (profiled requests are scrubbed in this process)
+  if SCRUB_POOL is not None and not profile:
+    try:
+      out_path, degraded = SCRUB_POOL.scrub(request.get_data())
+    except ValueError as err:
+      return invalid_scrub_response(err)
+    response = Response(
+        harsan_pool.stream_file(out_path), 200, mimetype="text/plain")
+    if degraded:
+      response.headers[DEGRADED_HEADER] = "1"
+    return response
+
   hs = HarSanitizer()
+  hs.content_cache = contentcache.configured_cache()
   hs_kwargs = {}
 
-  data = request.json
+  data = request_json()
   har = Har(har=data["har"])
 
-  if "wordlist" in data.keys():
-    hs_kwargs["wordlist"] = data["wordlist"]
-  if "content_list" in data.keys():
-    hs_kwargs["content_list"] = data["content_list"]
-  if "all_cookies" in data.keys():
-    hs_kwargs["all_cookies"] = data["all_cookies"]
-  if "all_headers" in data.keys():
-    hs_kwargs["all_headers"] = data["all_headers"]
-  if "all_params" in data.keys():
-    hs_kwargs["all_params"] = data["all_params"]
-  if "all_content_mimetypes" in data.keys():
-    hs_kwargs["all_content_mimetypes"] = data["all_content_mimetypes"]
-
-  sanitized_har = hs.scrub(har, **hs_kwargs)
+  for option in hs.scrub_options:
+    if option in data.keys():
+      hs_kwargs[option] = data[option]
+  hs_kwargs["time_budget"] = scrub_time_budget(data.get("time_budget"))
+
+  try:
+    if profile:
+      scrub_profiler = profiler.ScrubProfiler()
+      sanitized_har = scrub_profiler.scrub(hs, har, **hs_kwargs)
+      profile_id = store_profile(scrub_profiler.report())
+    else:
+      sanitized_har = hs.scrub(har, **hs_kwargs)
+  except ValueError as err:
+    return invalid_scrub_response(err)
 
   data = json.dumps(sanitized_har.har_dict, indent=2, separators=(",", ": "))
-  return Response(data, 200, mimetype="text/plain")
+  response = Response(data, 200, mimetype="text/plain")
+  if profile:
+    response.headers[PROFILE_ID_HEADER] = profile_id
+  if hs.degraded:
+    response.headers[DEGRADED_HEADER] = "1"
+  return response
+
+
+def preview_response(session_id, page):
+  """Returns the json Response of preview [page] (dict) of [session_id]."""
+  page["session"] = session_id
+  response = Response(json.dumps(page), 200, mimetype="application/json")
+  if page["degraded"]:
+    response.headers[DEGRADED_HEADER] = "1"
+  return response
+
+
+def preview_page_args(values):
+  """Returns (start, count) of the preview page requested by [values]."""
+  return (values.get("start", 0),
+          values.get("count", preview.DEFAULT_PAGE_SIZE))
+
+
+@app.route("/preview", methods=["POST"])
+@decorators.accept("application/json")
+@decorators.require("application/json")
+@decorators.admit(admission_controller)
+def start_preview():
+  """Starts a preview session of data["har"] with the /scrub_har options,
+  and returns its first page of scrubbed entries.
+
+  Only data["count"] entries from data["start"] are scrubbed, so the first
+  page does not wait for the whole HAR.  Later pages are served by
+  /preview/<session> from the parsed HAR kept in the session, whose size is
+  held against the admission budget while it is stored.
+  """
+  hs = HarSanitizer()
+  data = request_json()
+  hs_kwargs = dict(
+      (option, data[option]) for option in hs.scrub_options if option in data)
+  hs_kwargs["time_budget"] = scrub_time_budget(data.get("time_budget"))
+
+  try:
+    session = preview.PreviewSession(
+        data["har"], hs_kwargs, contentcache.configured_cache(),
+        size=request.content_length)
+    page = session.page(*preview_page_args(data))
+  except (KeyError, ValueError) as err:
+    message = {"message": "Invalid preview request: {}".format(err)}
+    return Response(json.dumps(message), 400, mimetype="application/json")
+  try:
+    session_id = preview.configured_store(admission_controller()).add(session)
+  except admission.Rejected as err:
+    return decorators.rejected_response(err)
+  return preview_response(session_id, page)
+
+
+@app.route("/preview/<session_id>", methods=["GET"])
+@decorators.admit(admission_controller)
+def get_preview(session_id):
+  """Returns the page of scrubbed entries of preview [session_id] selected
+  by the "start" and "count" query args."""
+  session = preview.configured_store(admission_controller()).get(session_id)
+  if session is None:
+    message = {"message": "Preview {} not found.".format(session_id)}
+    return Response(json.dumps(message), 404, mimetype="application/json")
+
+  try:
+    start, count = preview_page_args(request.args)
+    page = session.page(int(start), int(count))
+  except ValueError as err:
+    message = {"message": "Invalid preview page: {}".format(err)}
+    return Response(json.dumps(message), 400, mimetype="application/json")
+  return preview_response(session_id, page)
+
+
+def run(host="0.0.0.0", port=8080):
+  """Starts the scrub worker pool, if configured, and serves the app."""
+  global SCRUB_POOL
+  if load_config().get("workers"):
+    SCRUB_POOL = harsan_pool.ScrubPool(processes=load_config()["workers"])
+  app.run(host=host, port=port, debug=False, threaded=True)
 
 
 if __name__ == "__main__":
-  app.run(host="0.0.0.0", port=8080, debug=False)
+  run()
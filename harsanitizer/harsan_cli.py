@@ -0,0 +1,179 @@
+"""Command line interface for scrubbing HAR files."""
+
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import json
+import argparse
+
+from harsanitizer import Har, HarSanitizer
+from profiler import ScrubProfiler
+from incremental import scrub_incremental
+from entryfilter import FILTER_ACTIONS, RULE_FIELDS
+
+
+def filter_rule(arg):
+  """Parses a FIELD=VALUE entry filter rule argument into a rule dict."""
+  field, separator, value = arg.partition("=")
+  if not separator or field not in RULE_FIELDS:
+    raise argparse.ArgumentTypeError(
+        "expected FIELD=VALUE with FIELD one of: {}".format(
+            ", ".join(RULE_FIELDS)))
+  if field in ["min_size", "max_size"] or (
+      field == "status" and value.isdigit()):
+    try:
+      value = int(value)
+    except ValueError:
+      raise argparse.ArgumentTypeError("{} must be an int".format(field))
+  return {field: value}
+
+
+def parse_args(argv=None):
+  """Parses command line arguments into an argparse.Namespace."""
+  parser = argparse.ArgumentParser(
+      description="Redacts sensitive information from a HAR file.")
+  parser.add_argument("har_path", help="HAR file to scrub")
+  parser.add_argument(
+      "-o", "--output", help="file to write the scrubbed HAR to "
+      "(default: stdout)")
+  parser.add_argument(
+      "-w", "--wordlist", action="append", default=[], metavar="WORD",
+      help="word to append to the default wordlist (repeatable)")
+  parser.add_argument(
+      "-c", "--content-list", action="append", default=[],
+      metavar="MIMETYPE",
+      help="content mimeType to append to the default content_list "
+      "(repeatable)")
+  parser.add_argument(
+      "--all-cookies", action="store_true", help="redacts all cookies")
+  parser.add_argument(
+      "--all-headers", action="store_true", help="redacts all headers")
+  parser.add_argument(
+      "--all-params", action="store_true",
+      help="redacts all URLQuery/POSTData parameters")
+  parser.add_argument(
+      "--all-content-mimetypes", action="store_true",
+      help="redacts all content mimeTypes")
+  parser.add_argument(
+      "--no-memoize", dest="memoize", action="store_false",
+      help="scrubs every copy of repeated values instead of memoizing them "
+      "(same as --engine reference)")
+  parser.add_argument(
+      "--engine", choices=sorted(HarSanitizer.engines),
+      help="scrub engine (default: {})".format(HarSanitizer.default_engine))
+  parser.add_argument(
+      "--compact", action="store_true",
+      help="parses the HAR into compact objects, using several times less "
+      "memory")
+  parser.add_argument(
+      "--include", action="append", default=[], type=filter_rule,
+      metavar="FIELD=VALUE",
+      help="only scrubs entries matching a rule (repeatable).  FIELD is one "
+      "of host (glob), url (regex), mimeType (glob), status (e.g. 404 or "
+      "4xx), min_size or max_size (bytes)")
+  parser.add_argument(
+      "--exclude", action="append", default=[], type=filter_rule,
+      metavar="FIELD=VALUE",
+      help="skips entries matching a rule (repeatable), see --include")
+  parser.add_argument(
+      "--filtered-entries", choices=FILTER_ACTIONS, default="drop",
+      help="drops entries not selected by --include/--exclude, or reduces "
+      "them to metadata (default: drop)")
+  parser.add_argument(
+      "--incremental", action="store_true",
+      help="only scrubs entries appended since the last run, using a "
+      "checkpoint stored next to --output (required)")
+  parser.add_argument(
+      "--time-budget", type=float, metavar="SECONDS",
+      help="stops scanning after SECONDS and redacts every cookie, header "
+      "and param value, content text and '=' parameter instead (degraded "
+      "mode)")
+  parser.add_argument(
+      "--profile", metavar="REPORT_PATH",
+      help="profiles the scrub and writes a json report of the hottest "
+      "functions, memory per stage and slowest regex patterns")
+  args = parser.parse_args(argv)
+  if args.incremental and not args.output:
+    parser.error("--incremental requires --output")
+  if args.incremental and args.time_budget is not None:
+    parser.error("--time-budget cannot be used with --incremental")
+  return args
+
+
+def scrub_kwargs(args):
+  """Returns HarSanitizer.scrub() keyword arguments for parsed [args]."""
+  return {
+      "wordlist": args.wordlist,
+      "content_list": args.content_list,
+      "all_cookies": args.all_cookies,
+      "all_headers": args.all_headers,
+      "all_params": args.all_params,
+      "all_content_mimetypes": args.all_content_mimetypes,
+      "memoize": args.memoize,
+      "engine": args.engine,
+      "entry_filter": entry_filter(args),
+  }
+
+
+def entry_filter(args):
+  """Returns the scrub() entry_filter option for parsed [args], or None."""
+  if not (args.include or args.exclude):
+    return None
+  return {
+      "include": args.include,
+      "exclude": args.exclude,
+      "action": args.filtered_entries,
+  }
+
+
+def main(argv=None):
+  """Scrubs the HAR named on the command line and writes the result."""
+  args = parse_args(argv)
+
+  if args.incremental:
+    stats = scrub_incremental(args.har_path, args.output, **scrub_kwargs(args))
+    sys.stderr.write("{} scrub: {} of {} entries scrubbed{}\n".format(
+        stats["mode"], stats["scrubbed_entries"], stats["entries"],
+        " ({})".format(stats["reason"]) if stats["reason"] else ""))
+    return 0
+
+  har = Har(har_path=args.har_path, compact=args.compact)
+  hs = HarSanitizer()
+  if args.profile:
+    profiler = ScrubProfiler()
+    sanitized_har = profiler.scrub(
+        hs, har, time_budget=args.time_budget, **scrub_kwargs(args))
+    with open(args.profile, "w") as report_file:
+      json.dump(profiler.report(), report_file, indent=2)
+  else:
+    sanitized_har = hs.scrub(
+        har, time_budget=args.time_budget, **scrub_kwargs(args))
+  if hs.degraded:
+    sys.stderr.write("Time budget exceeded: HAR redacted in degraded mode\n")
+
+  if args.output:
+    with open(args.output, "w") as out_file:
+      json.dump(
+          sanitized_har.har_dict, out_file, indent=2, separators=(",", ": "))
+  else:
+    json.dump(
+        sanitized_har.har_dict, sys.stdout, indent=2, separators=(",", ": "))
+    sys.stdout.write("\n")
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
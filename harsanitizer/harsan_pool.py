@@ -0,0 +1,158 @@
+"""Pre-forked pool of warmed HAR scrub worker processes."""
+
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import multiprocessing
+import tempfile
+
+import compact
+import contentcache
+from harsanitizer import Har, HarSanitizer
+from harsanitizer import load_config, scrub_time_budget
+from harsanitizer import load_json_resource, wordlist_path, mimetypes_path
+
+
+# Request/response bodies are handed to workers as files in a memory-backed
+# filesystem when available, so only their paths cross the process boundary.
+SHARED_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def warm():
+  """Loads the default wordlist/mimetypes and compiles their regex patterns.
+
+  Called in the parent before forking so every worker shares the loaded
+  resources and compiled patterns copy-on-write.
+  """
+  hs = HarSanitizer()
+  wordlist = hs.load_wordlist(wordlist=load_json_resource(wordlist_path()))
+  load_json_resource(mimetypes_path())
+  hs.compile_wordlist(wordlist)
+
+
+def write_shared(data):
+  """Writes [data] (str) to a new shared temp file and returns its path."""
+  fd, path = tempfile.mkstemp(prefix="harsan-", suffix=".json", dir=SHARED_DIR)
+  with os.fdopen(fd, "wb") as shared_file:
+    shared_file.write(data)
+  return path
+
+
+def stream_file(path, remove=True):
+  """Yields the contents of the file at [path] in chunks.
+
+  Args:
+    path: (str) file to stream
+    remove: (Boolean) deletes the file once it has been streamed
+  """
+  try:
+    with open(path, "rb") as stream:
+      for chunk in iter(lambda: stream.read(STREAM_CHUNK_SIZE), b""):
+        yield chunk
+  finally:
+    if remove:
+      os.remove(path)
+
+
+def scrub_file(in_path, out_path):
+  """Worker task: scrubs the /scrub_har request json at [in_path].
+
+  The request is read straight from the shared file, which lives in memory
+  (/dev/shm) where available, and the sanitized HAR is written to [out_path]
+  in the API's output format.
+
+  Args:
+    in_path: (str) path of a /scrub_har request json ({"har": ..., options})
+    out_path: (str) path to write the sanitized HAR json to
+
+  Returns:
+    (out_path, degraded), degraded being True if the scrub ran out of time
+    and fell back to HarSanitizer.scrub_degraded()
+  """
+  with open(in_path, "rb") as in_file:
+    if load_config().get("compact_har"):
+      data = compact.loads(in_file.read())
+    else:
+      data = json.load(in_file)
+
+  hs = HarSanitizer()
+  hs.content_cache = contentcache.configured_cache()
+  hs_kwargs = dict(
+      (option, data[option]) for option in hs.scrub_options if option in data)
+  hs_kwargs["time_budget"] = scrub_time_budget(data.get("time_budget"))
+  sanitized_har = hs.scrub(Har(har=data["har"]), **hs_kwargs)
+
+  with open(out_path, "wb") as out_file:
+    json.dump(
+        sanitized_har.har_dict, out_file, indent=2, separators=(",", ": "))
+  return out_path, hs.degraded
+
+
+class ScrubPool(object):
+  """A pool of pre-forked scrub worker processes.
+
+  Resources and compiled patterns are loaded before forking, so workers start
+  warm and share them copy-on-write.  Request bodies are passed to workers as
+  shared temp files rather than pickled through the pool's pipes, and results
+  come back the same way.
+
+  Typical usage example:
+    pool = ScrubPool(processes=4)
+    out_path, degraded = pool.scrub(request_body)
+    for chunk in stream_file(out_path):
+      ...
+
+  Args:
+    processes: (int) number of worker processes.  Default=cpu count
+  """
+
+  def __init__(self, processes=None):
+    super(ScrubPool, self).__init__()
+    warm()
+    self.processes = processes or multiprocessing.cpu_count()
+    self.pool = multiprocessing.Pool(processes=self.processes)
+
+  def scrub(self, data):
+    """Scrubs a /scrub_har request json in a worker process.
+
+    Args:
+      data: (str) raw /scrub_har request json ({"har": ..., options})
+
+    Returns:
+      (path, degraded): path of a shared temp file holding the sanitized HAR
+      json, and True if the scrub fell back to degraded mode (see
+      HarSanitizer.scrub_degraded()).  The caller owns the file;
+      stream_file() removes it once streamed.
+    """
+    in_path = write_shared(data)
+    out_fd, out_path = tempfile.mkstemp(
+        prefix="harsan-", suffix=".json", dir=SHARED_DIR)
+    os.close(out_fd)
+    try:
+      _, degraded = self.pool.apply(scrub_file, (in_path, out_path))
+    except Exception:
+      os.remove(out_path)
+      raise
+    finally:
+      os.remove(in_path)
+    return out_path, degraded
+
+  def close(self):
+    """Stops the worker processes."""
+    self.pool.close()
+    self.pool.join()
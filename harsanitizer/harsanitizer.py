@@ -18,59 +18,341 @@
 import os
 import json
 import re
-import urllib2
+import mmap
+import time
+import bisect
+import contextlib
+from collections import Mapping
+
+import compact
+import rulecache
+from entryfilter import EntryFilter
+
+
+# Config local/remote file locations.  Nothing is read at import time;
+# config.json and static resources are loaded on first use.
+CONFIG_PATH = "./config.json"
+DEFAULT_STATIC_FOLDER = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "static")
+
+# Loaded config.json, see load_config()
+_config = {}
+# Loaded wordlist/mimetypes resources, {path: json}
+_resource_cache = {}
+
+# Words ScanState can find as plain text; others are regexes
+LITERAL_WORD = re.compile(r"^[\w-]+\Z")
+# Candidate positions of the scrub patterns in lowercased text: a '://', a
+# word after a '"name": "' anchor, or a word=value pattern's delimiter, word
+# and '='.  The quote closing an anchored word is not consumed, since it may
+# be the delimiter of a word=value candidate.
+CANDIDATE_PATTERN = re.compile(
+    r"""://|"name": "([\w-]+)(?=")|[\s";,&?]([\w-]+)=""")
+# Where split_windows() may cut a slice (see safe_cut()): a '=' or ':'
+# starting a generic or word=value match (group 1), or a char that is not
+# part of a word
+CUT_PATTERN = re.compile(r"([=:])|[^\w-]")
+# What ends a generic or word=value match, if it has not ended before
+ANCHOR_END_PATTERN = re.compile(r"[\s{]")
+# Anchors of the name/value patterns
+NAME_VALUE_ANCHORS = ['"name": "', '"value": "']
+
+# Parsed json object types: dicts, and compact.CompactDict/NameValue.  dict
+# is listed first since isinstance() checks against Mapping are slower.
+MAPPING_TYPES = (dict, Mapping)
+CONTAINER_TYPES = (dict, list, Mapping)
+
+
+def load_config(config_path=CONFIG_PATH):
+  """Loads/sanity checks config.json on first use and returns it.
+
+  Falls back to the bundled static folder when there is no config.json in the
+  current directory, so the library can be used from any directory.
+
+  Args:
+    config_path: (str) path of config.json
+
+  Returns:
+    config: the decoded config.json dict
+
+  Raises:
+    KeyError: 'static_folder' key not found in config.json
+  """
+  if not _config:
+    try:
+      with open(config_path, "r") as config:
+        loaded = json.load(config)
+    except IOError:
+      loaded = {"static_folder": DEFAULT_STATIC_FOLDER}
+    if "static_folder" not in loaded:
+      raise KeyError("KeyError: 'static_folder' key not found in config.json")
+    _config.update(loaded)
+  return _config
+
+
+def scrub_time_budget(requested=None):
+  """Returns the time budget (seconds) of an API scrub asking for
+  [requested] seconds.
+
+  The budget is the smaller of [requested] and "scrub_time_budget" in
+  config.json, or None when neither sets one.
+  """
+  budgets = [budget for budget in [requested, load_config().get(
+      "scrub_time_budget")] if isinstance(budget, (int, long, float))
+             and not isinstance(budget, bool)]
+  return min(budgets) if budgets else None
 
 
-# Config local/remote file locations
-CURRENT_DIR = os.path.abspath("./")
+def static_path(filename):
+  """Returns the local path or URL of [filename] in the static folder."""
+  return "{}/{}".format(load_config()["static_folder"], filename)
 
-# Load/sanity check config.json
-try:
-  with open("./config.json", "r") as config:
-    STATIC_FOLDER = json.load(config)["static_folder"]
-except IOError:
-  raise IOError(
-    "'config.json' not found in '{}'. Please ensure that script is "
-    "being run from root './har-sanitizer/' directory.".format(CURRENT_DIR))
-except KeyError:
-  raise KeyError("KeyError: 'STATIC_FOLDER' key not found in config.json")
 
-WORDLIST_PATH = "{}/wordlist.json".format(STATIC_FOLDER)
-MIMETYPES_PATH = "{}/mimetypesScrubList.json".format(STATIC_FOLDER)
+def wordlist_path():
+  """Returns the local path or URL of the default scrub wordlist."""
+  return static_path("wordlist.json")
+
+
+def mimetypes_path():
+  """Returns the local path or URL of the default mimeTypes scrub list."""
+  return static_path("mimetypesScrubList.json")
+
+
+def load_json_resource(path):
+  """Loads and caches a local or remote ('http...') json resource.
+
+  Resources are loaded once per process, so worker processes forked after the
+  first load share them copy-on-write.
+
+  Args:
+    path: (str) filesystem path or URL of the json resource
+
+  Returns:
+    the decoded json resource
+  """
+  if path not in _resource_cache:
+    if path[:4] == "http":
+      # Only needed for remote static folders, and slow to import
+      import urllib2
+      _resource_cache[path] = json.loads(urllib2.urlopen(path).read())
+    else:
+      with open(path, "r") as resource_file:
+        _resource_cache[path] = json.load(resource_file)
+  return _resource_cache[path]
+
+
+def find_words(text, words, window_size):
+  """Returns the set of [words] found in [text], ignoring case.
+
+  [text] is lowercased one window at a time, the windows overlapping by the
+  length of the longest word, so a large (or memory-mapped) text is never
+  copied whole.  Against a byte str or mmap, unicode words are looked for
+  UTF-8 encoded.
+
+  Args:
+    text: (str, unicode or mmap) text to search
+    words: list of str words
+    window_size: (int) characters lowercased at a time
+  """
+  pending = {}
+  for word in words:
+    if isinstance(word, unicode) and not isinstance(text, unicode):
+      pending[word] = word.encode("utf-8").lower()
+    else:
+      pending[word] = word.lower()
+  found = set(word for word, lowered in pending.items() if not lowered)
+  overlap = max([len(lowered) for lowered in pending.values()] or [1]) - 1
+  start = 0
+  while len(found) < len(pending) and start < len(text):
+    window = text[start:start + window_size + overlap].lower()
+    for word, lowered in pending.items():
+      if word not in found and lowered in window:
+        found.add(word)
+    start += window_size
+  return found
+
+
+def safe_cut(text, start, position):
+  """Returns the first position of [text] from [position] where no match of
+  the scrub patterns can span a cut, or len(text) if there is none.
+
+  [start] must itself be such a position.  Cutting before a '{' is always
+  safe.  With a wordlist of literal words (see LITERAL_WORD), so is cutting
+  before any other char but a word char, '=' and ':' when:
+    - there is no '"name": "' or '"value": "' between [start] and the cut,
+      since the name/value patterns match anything up to the next '{',
+    - the last '=' or ':' before the cut is followed by whitespace before
+      it, since the generic and word=value patterns match no whitespace
+      after their '://' or '=' but for their last char
+  A word=value match can then only span the cut within the delimiters
+  before its word, and the part of it after the cut is still a match.
+  Redactions never add a '=' or ':', nor remove whitespace, that a later
+  pattern depends on.
+
+  Args:
+    text: (str) text to cut
+    start: (int) safe position the slice being cut starts at
+    position: (int) first position to cut at
+  """
+  # Cutting before a '{' being safe, anything before the last one is ignored
+  start = max(start, text.rfind("{", start, position))
+  anchor = max(text.rfind("=", start, position),
+               text.rfind(":", start, position))
+  while True:
+    if anchor >= 0:
+      match = ANCHOR_END_PATTERN.search(text, anchor + 1)
+      if match is None:
+        return len(text)
+      if match.group() == "{":
+        return match.start()
+      position = max(position, match.end())
+    match = CUT_PATTERN.search(text, position)
+    if match is None:
+      return len(text)
+    cut = match.start()
+    if match.group(1) is not None:
+      anchor = cut
+      position = cut + 1
+      continue
+    if text[cut] != "{":
+      for name_value in NAME_VALUE_ANCHORS:
+        found = text.find(name_value, start, cut + len(name_value) - 1)
+        if 0 <= found < cut:
+          cut = text.find("{", cut)
+          return cut if cut >= 0 else len(text)
+    return cut
+
+
+def split_windows(text, window_size, literal=True):
+  """Yields consecutive slices of [text] of about [window_size] characters.
+
+  Each slice after the first starts at a '{' when there is one within
+  [window_size] more characters.  None of the scrub patterns match across
+  a '{' (see HarSanitizer.gen_regex()), so scrubbing each slice on its own
+  gives the same result as scrubbing [text] whole, without any overlap
+  between slices.  Without a '{' (e.g. in a large base64 or text body), the
+  slice is cut at the first other position no match can span (see
+  safe_cut()), and only grows past [window_size] when there is none.
+
+  Args:
+    text: (str) text to split
+    window_size: (int) minimum slice length, except for the last slice
+    literal: (bool) False when the wordlist holds words other than literal
+             words, whose patterns may match across any cut but a '{'
+  """
+  start = 0
+  while start < len(text):
+    position = start + window_size
+    end = text.find("{", position, position + window_size)
+    if end < 0:
+      if literal:
+        end = safe_cut(text, start, position)
+      else:
+        end = text.find("{", position)
+    if end < 0 or end > len(text):
+      end = len(text)
+    yield text[start:end]
+    start = end
 
 
 class Har(object):
   """An object that represents a HAR file.
 
+  A HAR loaded from [har_path] is memory-mapped read-only rather than read:
+  har_buffer scans the mapped file without copying it, and the file is only
+  read and parsed when har_dict or har_str is first used.  Until then, the
+  HAR is only checked to be a json object.
+
   Typical usage example:
     har_instance = Har(har=har) # where [har] is either a HAR JSON dict or str
     -or-
     har_instance = Har(har_path="/path/to/har.json")
+    -or-
+    har_instance = Har(har=har_str, compact=True)
+
+  Args:
+    har: a HAR json either as a str, or a dict (or other Mapping)
+    har_path: (str) path of a HAR json file, used if [har] is not given
+    compact: (bool) parses a str [har] into compact.CompactDict/NameValue
+             objects, which take several times less memory than dicts
   """
 
-  def __init__(self, har=None, har_path=None):
+  def __init__(self, har=None, har_path=None, compact=False):
     super(Har, self).__init__()
+    self.compact = compact
+    self.har_map = None
+    self._har_dict = None
+    self._har_str = None
     self.load_har(har=har, har_path=har_path)
     self.category = {}
 
+  @property
+  def har_dict(self):
+    """The parsed HAR, parsed from the mapped file on first use."""
+    if self._har_dict is None and self.har_map is not None:
+      # Parsed from a temporary copy, so only the parsed HAR stays in memory
+      self.load_har(har=self.har_map[:])
+      self.har_str = None
+    return self._har_dict
+
+  @har_dict.setter
+  def har_dict(self, har_dict):
+    self._har_dict = har_dict
+
+  @property
+  def har_str(self):
+    """The HAR json str, read from the mapped file on first use."""
+    if self._har_str is None and self.har_map is not None:
+      self._har_str = self.har_map[:]
+    return self._har_str
+
+  @har_str.setter
+  def har_str(self, har_str):
+    self._har_str = har_str
+
+  @property
+  def har_buffer(self):
+    """The HAR json to scan: the mapped file, or har_str.
+
+    Supports len(), slicing, find() and regex searches, without copying a
+    mapped file into memory.
+    """
+    if self.har_map is not None:
+      return self.har_map
+    return self.har_str
+
   def load_har(self, har=None, har_path=None):
-    """Loads the har and sets self.har_str, self.har_dict.
+    """Loads the har and sets self.har_str, self.har_dict, or maps the file
+    at [har_path] and sets self.har_map.
 
   Args:
-    har: a HAR json either as a str, or a dict
+    har: a HAR json either as a str, or a dict (or other Mapping)
+    har_path: (str) path of a HAR json file
 
   Raises:
     AttributeError: Requires [har] (str or dict)
+    IOError: cannot open [har_path]
     TypeError: Invalid HAR provided
     """
 
     try:
-      if isinstance(har, dict):
-        self.har_str = json.dumps(har)
+      if isinstance(har, MAPPING_TYPES):
+        self.har_str = compact.dumps(har)
         self.har_dict = har
       elif isinstance(har, basestring):
-        self.har_dict = json.loads(har)
+        if self.compact:
+          self.har_dict = compact.loads(har)
+        else:
+          self.har_dict = json.loads(har)
         self.har_str = har
+      elif isinstance(har_path, basestring):
+        with open(har_path, "rb") as har_file:
+          # Raises ValueError for an empty file
+          self.har_map = mmap.mmap(
+              har_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if not re.match(r"\s*{", self.har_map):
+          raise ValueError
+        return
       else:
         raise ValueError
       assert("request" in self.har_dict["log"]["entries"][0])
@@ -80,6 +362,116 @@ class Har(object):
       raise
 
 
+class ScrubMemo(object):
+  """Memo of regex scrub results for values repeated within one scrub.
+
+  Attributes:
+    results: {memo key: scrubbed serialized value}
+    lookups: number of values looked up
+    hits: number of lookups answered from the memo
+  """
+
+  def __init__(self):
+    super(ScrubMemo, self).__init__()
+    self.results = {}
+    self.lookups = 0
+    self.hits = 0
+
+  def scrub(self, key, scrub_func):
+    """Returns the memoized result for [key], calling scrub_func() on a miss."""
+    self.lookups += 1
+    if key in self.results:
+      self.hits += 1
+    else:
+      self.results[key] = scrub_func()
+    return self.results[key]
+
+  def stats(self):
+    """Returns {"values": lookups, "distinct": distinct values, "hits": hits}."""
+    return {
+        "values": self.lookups,
+        "distinct": len(self.results),
+        "hits": self.hits,
+    }
+
+
+def find_all(text, needle):
+  """Returns the start positions of every occurrence of [needle] in [text]."""
+  positions = []
+  position = text.find(needle)
+  while position >= 0:
+    positions.append(position)
+    position = text.find(needle, position + 1)
+  return positions
+
+
+class ScanState(object):
+  """Case-folded view and candidate index of one serialized HAR, shared by
+  the generic and wordlist stages of a scrub.
+
+  The text is lowercased once, and read once more for candidate positions
+  (see CANDIDATE_PATTERN): every '://', which the generic patterns need,
+  every word following a delimiter and followed by a '=', which the
+  word=value pattern needs, and every word after a '"name": "' anchor,
+  which the name/value patterns need.  No pattern matches across a '{'
+  (see split_windows()), so the text is cut into segments at every '{',
+  and only segments holding a candidate need the patterns.
+
+  Attributes:
+    text: (str) serialized HAR
+    lower: (str) text lowercased
+    braces: sorted positions of '{', where segments start
+    urls: positions of '://'
+    candidates: {lowercased word: positions of its '=' and '"name"' hits}
+    index_bytes: bytes read to build the index
+  """
+
+  def __init__(self, text):
+    super(ScanState, self).__init__()
+    self.text = text
+    self.lower = lower = text.lower()
+    self.braces = find_all(lower, "{")
+    self.urls = []
+    self.candidates = {}
+    for match in CANDIDATE_PATTERN.finditer(lower):
+      word = match.group(1) or match.group(2)
+      if word is None:
+        self.urls.append(match.start())
+      else:
+        self.candidates.setdefault(word, []).append(match.start())
+    # Lowercasing, finding braces and finding candidates
+    self.index_bytes = 3 * len(text)
+
+  def lower_word(self, word):
+    """Returns [word] (str) lowercased, UTF-8 encoded against a byte str."""
+    word = word.lower()
+    if isinstance(word, unicode) and not isinstance(self.text, unicode):
+      word = word.encode("utf-8")
+    return word
+
+  def found(self, word):
+    """Returns True if [word] is found in the text, ignoring case, the way
+    trim_wordlist() finds it."""
+    return self.lower_word(word) in self.lower
+
+  def word_candidates(self, word):
+    """Returns the candidate positions of [word] (str)."""
+    return self.candidates.get(self.lower_word(word), [])
+
+  def segment(self, position):
+    """Returns the (start, end) of the segment holding [position]."""
+    index = bisect.bisect_right(self.braces, position)
+    start = self.braces[index - 1] if index else 0
+    end = (self.braces[index] if index < len(self.braces)
+           else len(self.text))
+    return start, end
+
+
+class DeadlineExceeded(Exception):
+  """Raised by HarSanitizer.check_deadline() when the scrub() time budget
+  has run out."""
+
+
 class HarSanitizer(object):
   """Base HAR sanitizer class.
 
@@ -98,6 +490,24 @@ class HarSanitizer(object):
     get_mimetypes: returns embedded content mimeTypes found in a HAR object
     scrub_generic: Scrubs a HAR object for generic patterns.  Returns redacted HAR object.
     scrub_wordlist: Scrubs a HAR object for wordlist patterns.  Returns redacted HAR object.
+    scrub_reference: scrub_generic + scrub_wordlist, the "reference" engine.
+                     Returns redacted HAR object.
+    scrub_memoized: scrub_generic + scrub_wordlist, scrubbing repeated cookie/header/param
+                    values and URLs once, the "memo" engine.  Returns redacted HAR object.
+    scrub_scoped: scrub_generic + scrub_wordlist, scanning only name/value objects and
+                  strings the patterns can match, the "scoped" engine.  Returns redacted
+                  HAR object.
+    scrub_indexed: scrub_generic + scrub_wordlist, scanning only the segments of the
+                   serialized HAR around candidate positions found by a ScanState, the
+                   "indexed" engine.  Returns redacted HAR object.
+    get_engine: returns the scrub engine method registered under a name
+    scrub_cached: runs a scrub engine with large response content texts scrubbed
+                  through content_cache.  Returns redacted HAR object.
+    scrub_degraded: redacts every value, content text and '=' parameter without
+                    scanning, the fallback of scrub() once its time budget has run
+                    out.  Returns redacted HAR object.
+    filter_entries: drops or reduces to metadata entries not selected by an
+                    entryfilter.EntryFilter.  Returns filtered HAR object.
     scrub: Loads and trims wordlist, generates iter_eval_exec conditional patterns and executes
             them on HAR object, generates and scrubs generic and wordlist regex patterns on 
             HAR object, and returns final redacted version of HAR object.
@@ -108,6 +518,71 @@ class HarSanitizer(object):
 
   # Class variables
   valid_hartypes = ["cookies", "headers", "queryString", "params"]
+  scrub_options = [
+      "wordlist",
+      "content_list",
+      "all_cookies",
+      "all_headers",
+      "all_params",
+      "all_content_mimetypes",
+      "memoize",
+      "engine",
+      "entry_filter",
+      "time_budget",
+  ]
+  # Scrub engines, {name: method name}.  An engine applies the generic and
+  # wordlist regex patterns to a HAR after the structural (iter_eval_exec)
+  # stage, taking (har, wordlist) and returning the scrubbed Har.  Every
+  # engine must produce the same redactions as "reference", the original
+  # scrub_generic() + scrub_wordlist() pipeline (see tools/engine_diff.py).
+  engines = {
+      "reference": "scrub_reference",
+      "memo": "scrub_memoized",
+      "scoped": "scrub_scoped",
+      "indexed": "scrub_indexed",
+  }
+  default_engine = "memo"
+  max_compiled_patterns = 2000
+  # Texts longer than this are scrubbed by scrub_memoized() in windows of
+  # about this many characters (see split_windows()), bounding the extra
+  # memory used by the copies re.sub() and lower() make of a giant
+  # content.text.
+  # trim_wordlist() lowercases HARs in windows of this size too.
+  scan_window = 1 << 20
+  # Marks where memoized values were cut out of the document by scrub_memoized
+  unit_placeholder = u"\x00harsan-unit:"
+
+  # Receives stage boundaries and compiled patterns when set, e.g. a
+  # profiler.ScrubProfiler (see stage() and compile_pattern())
+  tracer = None
+  # Bytes scanned and skipped per field by the last scrub_scoped()
+  scope_stats = None
+  # Bytes scanned by the last scrub_indexed(), and by the reference engine
+  scan_stats = None
+  # Shares scrubbed response content text across scrubs when set, e.g. a
+  # contentcache.ContentCache (see scrub_cached())
+  content_cache = None
+  # Shorter content texts are scrubbed with the rest of the HAR
+  content_cache_min_bytes = 4096
+  # Marks where content texts were cut out of the document by scrub_cached()
+  content_placeholder = u"\x00harsan-content:"
+
+  # time.time() past which scrub() stops scanning and falls back to
+  # scrub_degraded(), None when the scrub has no time budget
+  deadline = None
+  # True if the last scrub() ran out of time (see scrub_degraded())
+  degraded = False
+  # Strings redacted by scrub_degraded(), besides cookie/header/param values
+  # and content texts: URL credentials, and everything after an '='
+  degraded_patterns = [
+      (r"://[^/@]*@", r"://[credentials redacted]@"),
+      (r"=[^&;]*", r"=[redacted]"),
+  ]
+
+  # Compiled regex patterns shared by all instances, {(pattern, flags): regex}
+  _compiled_patterns = {}
+  # Compiled cond_table expressions shared by all instances, {cond: code}
+  _compiled_conds = {}
 
   def __init__(self, har=None):
     super(HarSanitizer, self).__init__()
@@ -151,6 +626,73 @@ class HarSanitizer(object):
 
     return wordlist
 
+  def compile_pattern(self, pattern, flags=0):
+    """Returns [pattern] compiled with [flags], caching it for later scrubs.
+
+    Args:
+      pattern: (str) regex pattern
+      flags: (int) re module flags
+
+    Returns:
+      compiled regex pattern object
+    """
+    key = (pattern, flags)
+    if key not in self._compiled_patterns:
+      if len(self._compiled_patterns) >= self.max_compiled_patterns:
+        self._compiled_patterns.clear()
+      self._compiled_patterns[key] = re.compile(pattern, flags)
+    if self.tracer is not None:
+      return self.tracer.pattern(self._compiled_patterns[key])
+    return self._compiled_patterns[key]
+
+  def check_deadline(self):
+    """Raises DeadlineExceeded if the scrub() time budget has run out."""
+    if self.deadline is not None and time.time() > self.deadline:
+      raise DeadlineExceeded("Scrub time budget exceeded")
+
+  @contextlib.contextmanager
+  def stage(self, name):
+    """Context manager marking the scrub() stage [name] (str) for the tracer."""
+    self.check_deadline()
+    if self.tracer is None:
+      yield
+    else:
+      with self.tracer.stage(name):
+        yield
+
+  def compile_cond(self, cond):
+    """Returns cond_table expression [cond] (str) compiled for eval().
+
+    iter_eval_exec() evaluates every cond for every key in the HAR, so each
+    cond is compiled once instead of on every eval().
+    """
+    if cond not in self._compiled_conds:
+      if len(self._compiled_conds) >= self.max_compiled_patterns:
+        self._compiled_conds.clear()
+      self._compiled_conds[cond] = compile(cond, "<cond_table>", "eval")
+    return self._compiled_conds[cond]
+
+  def compile_wordlist(self, wordlist):
+    """Compiles generic patterns and word patterns for every word in [wordlist].
+
+    Compiled patterns are loaded from the rule cache (see rulecache.py) when
+    the same rules were compiled by an earlier process.
+
+    Args:
+      wordlist: list of str scrub pattern words
+    """
+    rules = [(pattern, 0) for pattern in self.gen_regex()["single_use"]]
+    for word in wordlist:
+      rules.extend(
+          (pattern, re.I) for pattern in self.gen_regex(word)["word_patterns"])
+
+    if all(rule in self._compiled_patterns for rule in rules):
+      return
+    if len(self._compiled_patterns) + len(rules) > self.max_compiled_patterns:
+      self._compiled_patterns.clear()
+    self._compiled_patterns.update(rulecache.load_rules(
+        rules, cache_dir=load_config().get("rule_cache_dir")))
+
   def trim_wordlist(self, har, wordlist):
     """Trims wordlist to only words found in har.
 
@@ -167,10 +709,32 @@ class HarSanitizer(object):
     if not isinstance(har, Har):
        raise TypeError("'har' must be a Har() object")
 
-    trimmedlist = [word for word in wordlist if word.lower() in har.har_str.lower()]
+    found = find_words(har.har_buffer, wordlist, self.scan_window)
+    trimmedlist = [word for word in wordlist if word in found]
 
     return trimmedlist
 
+  def trim_regex_words(self, har, wordlist):
+    """Trims the words of wordlist other than letters, digits, '_' and '-'
+    to those found in har, the way trim_wordlist() trims them.
+
+    Such words are regexes, whose patterns gen_text_scrubber() applies to
+    every text, so they are looked for in the whole HAR instead.
+
+    Args:
+      har: a Har() object
+      wordlist: list of str scrub pattern words
+
+    Returns:
+      [wordlist] without the regex words missing from har
+    """
+    regex_words = [word for word in wordlist if not LITERAL_WORD.match(word)]
+    if not regex_words:
+      return wordlist
+    found = find_words(har.har_buffer, regex_words, self.scan_window)
+    return [word for word in wordlist
+            if word in found or LITERAL_WORD.match(word)]
+
   def gen_regex(self, word="word"):
     """Generates known HAR regex patterns for [word] (str).
 
@@ -257,7 +821,8 @@ class HarSanitizer(object):
     supported.
 
     Args:
-      my_iter: (dict or list) Iterator object, or iterable child branch
+      my_iter: (dict, other Mapping, or list) Iterator object, or iterable
+               child branch
       cond_table: (dict) Conditional python patterns and associated callback
                   functions:
 
@@ -289,22 +854,23 @@ class HarSanitizer(object):
       har_redacted = iter_eval_exec(my_iter=har_dict, cond_table=cond_table)
     """
 
-    if isinstance(my_iter, dict):
+    if isinstance(my_iter, MAPPING_TYPES):
       for key, value in my_iter.iteritems():
         # Makes it run faster, even though it seems counterintuitive
-        if any([eval(cond) for cond in cond_table.keys()]):
+        if any([eval(self.compile_cond(cond)) for cond in cond_table.keys()]):
           for cond, callback in cond_table.iteritems():
             # Security risks have been mitigated by
             # preventing any possible code-injection
             # attempt into cond_table keys
-            if eval(cond):
+            if eval(self.compile_cond(cond)):
               callback(self, my_iter, key, value)
-        elif isinstance(value, (dict, list)):
+        elif isinstance(value, CONTAINER_TYPES):
           self.iter_eval_exec(
               value,
               cond_table)
     elif isinstance(my_iter, list):
       for value in my_iter:
+        self.check_deadline()
         self.iter_eval_exec(
             value,
             cond_table)
@@ -491,10 +1057,12 @@ class HarSanitizer(object):
     """
 
     # Gets rid of troublesome js/html/css/base64/etc text.
-    content_scrub_list = self.default_content_scrub_list[:]
-    with open(MIMETYPES_PATH, "r") as mimetypes_file:
-        default_mimetypes = json.load(mimetypes_file)
-    # default_mimetypes = [elem['value_to_match'] for elem in self.default_content_scrub_list]
+    default_mimetypes = load_json_resource(mimetypes_path())
+    content_scrub_list = [{
+      "key_to_match": "mimeType",
+      "value_to_match": mimetype,
+      "key_to_redact": "text"
+    } for mimetype in default_mimetypes]
 
     if content_list:
       content_list = [obj for obj in content_list if isinstance(obj,basestring)]
@@ -529,7 +1097,8 @@ class HarSanitizer(object):
     scrubbed_str = har.har_str
 
     for pattern, redacted in patterns.iteritems():
-       scrubbed_str = re.sub(pattern, redacted, scrubbed_str)
+      self.check_deadline()
+      scrubbed_str = self.compile_pattern(pattern).sub(redacted, scrubbed_str)
 
     clean_har = Har(har=scrubbed_str)
 
@@ -557,20 +1126,592 @@ class HarSanitizer(object):
     # Scrub words in trimmedlist
     har_str_scrubbed = har.har_str
     for word in trimmedlist:
+      self.check_deadline()
       wordpatterns = self.gen_regex(word)["word_patterns"]
 
       # Scrub har_str for word patterns
       for pattern, redacted in wordpatterns.iteritems():
-        har_str_scrubbed = re.sub(
-            pattern,
+        har_str_scrubbed = self.compile_pattern(pattern, re.I).sub(
             redacted,
-            har_str_scrubbed,
-            flags=re.I)
+            har_str_scrubbed)
 
     clean_har = Har(har=har_str_scrubbed)
 
     return clean_har
 
+  def scrub_reference(self, har, wordlist):
+    """Scrubs HAR against generic then wordlist regex patterns, each pattern
+    applied to the whole serialized HAR.
+
+    The reference engine: scrub_generic() followed by scrub_wordlist().
+
+    Args:
+      har: a Har() object
+      wordlist: list of str scrub pattern words
+
+    Returns:
+      har: scrubbed har
+    """
+    # Scrub generic patterns
+    har_clean = self.scrub_generic(har)
+
+    # Scrub wordList patterns
+    return self.scrub_wordlist(har_clean, wordlist)
+
+  def filter_entries(self, har, entry_filter):
+    """Returns [har] with only the entries selected by [entry_filter].
+
+    Other entries are dropped or reduced to metadata before any scrubbing,
+    so their names, values and content are never scanned.  Counts are kept
+    in self.filter_stats.
+
+    Args:
+      har: a Har() object
+      entry_filter: an entryfilter.EntryFilter, or a dict of its arguments
+                    ({"include": [rules], "exclude": [rules], "action": str})
+
+    Returns:
+      har: filtered har
+    Raises:
+      TypeError: har must be a Har() object
+      ValueError: invalid entry_filter, or no entries left
+    """
+    if not isinstance(har, Har):
+      raise TypeError("'har' must be a Har object")
+
+    entry_filter = EntryFilter.from_option(entry_filter)
+    log = dict(har.har_dict["log"])
+    log["entries"] = entry_filter.apply(log["entries"])
+    self.filter_stats = dict(entry_filter.stats)
+    if not log["entries"]:
+      raise ValueError("No HAR entries left after the entry filter")
+
+    return Har(har={"log": log})
+
+  def get_engine(self, engine):
+    """Returns the scrub engine method registered as [engine] (str).
+
+    Raises:
+      ValueError: [engine] is not a registered engine
+    """
+    if engine not in self.engines:
+      raise ValueError("Unknown scrub engine {}, expected one of: {}".format(
+          engine, ", ".join(sorted(self.engines))))
+    return getattr(self, self.engines[engine])
+
+  def gen_text_scrubber(self, wordlist):
+    """Returns a function applying generic then [wordlist] patterns to a str.
+
+    Patterns are applied in the same order as scrub_generic() followed by
+    scrub_wordlist().  Patterns for words missing from the text being
+    scrubbed are skipped, the same way trim_wordlist() trims the wordlist,
+    and are only generated once a text holds the word.  Words other than
+    letters, digits, '_' and '-' are regexes that may match texts not
+    holding them, so their patterns are applied to every text: trim them
+    against the whole HAR first (see trim_regex_words()).  Texts longer than
+    scan_window are scrubbed window by window (see split_windows()) and the
+    scrubbed windows joined once at the end.
+
+    Args:
+      wordlist: list of str scrub pattern words
+
+    Returns:
+      scrub_text: function taking and returning a str
+    """
+    generic_patterns = [
+        (self.compile_pattern(pattern), redacted)
+        for pattern, redacted in self.gen_regex()["single_use"].iteritems()]
+    # (word, lowercased word, or None for words applied to every text)
+    words = [(word, word.lower() if LITERAL_WORD.match(word) else None)
+             for word in wordlist]
+    literal = all(word_lower is not None for _, word_lower in words)
+    # {word: compiled word patterns}
+    word_patterns = {}
+
+    def get_word_patterns(word):
+      if word not in word_patterns:
+        word_patterns[word] = [
+            (self.compile_pattern(pattern, re.I), redacted)
+            for pattern, redacted
+            in self.gen_regex(word)["word_patterns"].iteritems()]
+      return word_patterns[word]
+
+    def scrub_window(text):
+      self.check_deadline()
+      # Every generic pattern requires a literal '://'
+      if "://" in text:
+        for regex, redacted in generic_patterns:
+          text = regex.sub(redacted, text)
+      text_lower = text.lower()
+      for word, word_lower in words:
+        if word_lower is not None and word_lower not in text_lower:
+          continue
+        subs = 0
+        for regex, redacted in get_word_patterns(word):
+          text, count = regex.subn(redacted, text)
+          subs += count
+        if subs:
+          text_lower = text.lower()
+      return text
+
+    def scrub_text(text):
+      if len(text) <= self.scan_window:
+        return scrub_window(text)
+      return text[:0].join(
+          scrub_window(window)
+          for window in split_windows(text, self.scan_window, literal))
+
+    return scrub_text
+
+  def scrub_memoized(self, har, wordlist):
+    """Scrubs HAR against generic and wordlist regex patterns, scrubbing
+    each distinct cookie/header/param name/value object and URL only once.
+
+    Produces the same redactions as scrub_generic() followed by
+    scrub_wordlist().  None of the patterns match across a '{', so each
+    name/value object can be scrubbed on its own.  A URL is scrubbed as its
+    json string followed by the ',' that follows it in the document.  Objects
+    and URLs are replaced by placeholders while the rest of the HAR is
+    scrubbed as one document, then the memoized results are put back.
+    Statistics are kept in self.memo (see ScrubMemo.stats()).
+
+    Args:
+      har: a Har() object
+      wordlist: list of str scrub pattern words
+
+    Returns:
+      har: scrubbed har
+    Raises:
+      TypeError: har must be a Har() object
+    """
+
+    if not isinstance(har, Har):
+      raise TypeError("'har' must be a Har object")
+
+    scrub_text = self.gen_text_scrubber(self.trim_regex_words(har, wordlist))
+    self.memo = memo = ScrubMemo()
+    unit_results = []
+    replaced = []
+
+    def memo_key(item):
+      try:
+        # Types are part of the key, since True, 1 and 1.0 are equal
+        key = ("items", tuple(
+            (name, type(value), value) for name, value in item.iteritems()))
+        hash(key)
+        return key
+      except TypeError:
+        return ("json", compact.dumps(item))
+
+    def scrub_object(item):
+      return lambda: scrub_text(compact.dumps(item))
+
+    def scrub_url(url):
+      return lambda: scrub_text(json.dumps(url) + ",")[:-1]
+
+    def replace_unit(container, index, key, scrub_func):
+      unit_results.append(memo.scrub(key, scrub_func))
+      replaced.append((container, index, container[index]))
+      container[index] = u"{}{}".format(
+          self.unit_placeholder, len(unit_results) - 1)
+
+    def cut_units(node):
+      if isinstance(node, MAPPING_TYPES):
+        for key, value in node.items():
+          if key in self.valid_hartypes and isinstance(value, list):
+            for index, item in enumerate(value):
+              if isinstance(item, MAPPING_TYPES):
+                replace_unit(value, index, memo_key(item), scrub_object(item))
+              else:
+                cut_units(item)
+          elif key == "url" and isinstance(value, basestring):
+            replace_unit(node, key, ("url", value), scrub_url(value))
+          else:
+            cut_units(value)
+      elif isinstance(node, list):
+        for item in node:
+          cut_units(item)
+
+    def is_placeholder(value):
+      return (isinstance(value, basestring)
+              and value.startswith(self.unit_placeholder))
+
+    def unit_result(value):
+      return json.loads(
+          unit_results[int(value[len(self.unit_placeholder):])])
+
+    def fill_units(node):
+      if isinstance(node, dict):
+        for key, value in node.items():
+          if key in self.valid_hartypes and isinstance(value, list):
+            for index, item in enumerate(value):
+              if is_placeholder(item):
+                value[index] = unit_result(item)
+              else:
+                fill_units(item)
+          elif key == "url" and is_placeholder(value):
+            node[key] = unit_result(value)
+          else:
+            fill_units(value)
+      elif isinstance(node, list):
+        for item in node:
+          fill_units(item)
+
+    # Placeholders are assigned in place so the document keeps its key order
+    try:
+      cut_units(har.har_dict)
+      skeleton_str = compact.dumps(har.har_dict)
+    finally:
+      for container, index, original in reversed(replaced):
+        container[index] = original
+
+    try:
+      scrubbed_dict = json.loads(scrub_text(skeleton_str))
+    except ValueError:
+      raise ValueError("Missing/Invalid HAR: Requires valid [har] (str or dict)")
+    fill_units(scrubbed_dict)
+
+    clean_har = Har(har=scrubbed_dict)
+
+    return clean_har
+
+  def scrub_scoped(self, har, wordlist):
+    """Scrubs HAR against generic and wordlist regex patterns, scanning only
+    the fields where they can match.
+
+    Produces the same redactions as scrub_generic() followed by
+    scrub_wordlist().  The name/value patterns need a "name" key, so objects
+    with one (cookies, headers, params...) are scrubbed whole, outermost
+    first.  Elsewhere, the generic and word=value patterns only match inside
+    one json string plus the character following it, and need a literal
+    '://' or '='.  Every other string (timings, dates, ids...), number and
+    key is skipped without being scanned.  Repeated objects and strings are
+    scrubbed once (see ScrubMemo).  Bytes scanned and skipped per field path
+    (e.g. "log.entries[].request.url") are kept in self.scope_stats.
+
+    Args:
+      har: a Har() object
+      wordlist: list of str scrub pattern words
+
+    Returns:
+      har: scrubbed har
+    Raises:
+      TypeError: har must be a Har() object
+    """
+
+    if not isinstance(har, Har):
+      raise TypeError("'har' must be a Har object")
+
+    wordlist = self.trim_regex_words(har, wordlist)
+    scrub_text = self.gen_text_scrubber(wordlist)
+    self.memo = memo = ScrubMemo()
+    self.scope_stats = stats = {
+        "scanned_bytes": 0, "skipped_bytes": 0, "fields": {}}
+    # A word other than letters, digits, '_' and '-' is a regex, e.g. a '|'
+    # makes its word=value pattern an alternation that matches without '='
+    scan_all = any(not LITERAL_WORD.match(word) for word in wordlist)
+
+    def count(path, size, scanned):
+      field = stats["fields"].setdefault(
+          path, {"scanned_bytes": 0, "skipped_bytes": 0})
+      counter = "scanned_bytes" if scanned else "skipped_bytes"
+      field[counter] += size
+      stats[counter] += size
+
+    def scrub_string(path, value, follow):
+      text = json.dumps(value)
+      if not (scan_all or "=" in text or "://" in text):
+        count(path, len(text), False)
+        return value
+      count(path, len(text), True)
+      text += follow
+      scrubbed = memo.scrub(("str", text), lambda: scrub_text(text))
+      if scrubbed == text:
+        return value
+      return json.loads(scrubbed[:-len(follow)])
+
+    def scrub_node(path, node, follow):
+      if isinstance(node, MAPPING_TYPES):
+        if "name" in node:
+          text = compact.dumps(node)
+          count(path, len(text), True)
+          return json.loads(memo.scrub(("json", text), lambda: scrub_text(text)))
+        scrubbed = {}
+        last = len(node) - 1
+        for position, (key, value) in enumerate(node.items()):
+          child = "{}.{}".format(path, key) if path else key
+          scrubbed[scrub_string("(keys)", key, ":")] = scrub_node(
+              child, value, "}" if position == last else ",")
+        return scrubbed
+      elif isinstance(node, list):
+        last = len(node) - 1
+        return [scrub_node(path + "[]", item, "]" if index == last else ",")
+                for index, item in enumerate(node)]
+      elif isinstance(node, basestring):
+        return scrub_string(path, node, follow)
+      count(path, len(json.dumps(node)), False)
+      return node
+
+    clean_har = Har(har=scrub_node("", har.har_dict, ""))
+
+    return clean_har
+
+  def scrub_indexed(self, har, wordlist):
+    """Scrubs HAR against generic and wordlist regex patterns, scanning only
+    the parts of the serialized HAR around candidate positions.
+
+    Produces the same redactions as scrub_generic() followed by
+    scrub_wordlist().  The HAR is lowercased and indexed once by a
+    ScanState, instead of once per stage and word, and each segment holding
+    a candidate is scrubbed on its own, with the generic patterns if it
+    holds a '://' and with the patterns of the words it holds candidates
+    for, in wordlist order.  Redactions never create new candidates, so
+    every other segment is copied as is.  A word other than letters, digits,
+    '_' and '-' is a regex that may match elsewhere, so with one in the
+    wordlist every segment is scanned.  Bytes read are kept in
+    self.scan_stats, next to an estimate of what scrub_generic() and
+    scrub_wordlist() read over the same text.
+
+    Args:
+      har: a Har() object
+      wordlist: list of str scrub pattern words
+
+    Returns:
+      har: scrubbed har
+    Raises:
+      TypeError: har must be a Har() object
+    """
+
+    if not isinstance(har, Har):
+      raise TypeError("'har' must be a Har object")
+
+    text = har.har_str
+    state = ScanState(text)
+    words = set(wordlist)
+    generic_patterns = [
+        (self.compile_pattern(pattern), redacted)
+        for pattern, redacted in self.gen_regex()["single_use"].iteritems()]
+
+    segments = {}
+    if not all(LITERAL_WORD.match(word) for word in words):
+      # Every segment is a candidate
+      segments[(0, len(text))] = [
+          True, set(word for word in words if state.found(word))]
+    else:
+      for position in state.urls:
+        segments.setdefault(state.segment(position), [False, set()])[0] = True
+      for word in words:
+        for position in state.word_candidates(word):
+          segments.setdefault(
+              state.segment(position), [False, set()])[1].add(word)
+    candidate_words = set()
+    for _, segment_words in segments.itervalues():
+      candidate_words.update(segment_words)
+    # Patterns are only generated for words with a candidate
+    word_patterns = dict(
+        (word, [(self.compile_pattern(pattern, re.I), redacted)
+                for pattern, redacted
+                in self.gen_regex(word)["word_patterns"].iteritems()])
+        for word in candidate_words)
+
+    self.scan_stats = stats = {
+        "text_bytes": len(text),
+        "index_bytes": state.index_bytes,
+        "regex_bytes": 0,
+        "segments": len(state.braces) + 1,
+        "scanned_segments": len(segments),
+        # What scrub_generic() and scrub_wordlist() read at least:
+        # lowercasing and one search per word, then every pattern of the
+        # words with a candidate over the whole text
+        "reference_bytes": len(text) * (
+            1 + len(words) + len(generic_patterns)
+            + sum(len(word_patterns[word]) for word in wordlist
+                  if word in candidate_words)),
+    }
+
+    scrubbed = []
+    copied = 0
+    for (start, end) in sorted(segments):
+      self.check_deadline()
+      generic, segment_words = segments[(start, end)]
+      segment = text[start:end]
+      if generic:
+        for regex, redacted in generic_patterns:
+          segment = regex.sub(redacted, segment)
+        stats["regex_bytes"] += len(generic_patterns) * (end - start)
+      for word in wordlist:
+        if word in segment_words:
+          for regex, redacted in word_patterns[word]:
+            segment = regex.sub(redacted, segment)
+          stats["regex_bytes"] += len(word_patterns[word]) * (end - start)
+      scrubbed.append(text[copied:start])
+      scrubbed.append(segment)
+      copied = end
+    scrubbed.append(text[copied:])
+    stats["scanned_bytes"] = stats["index_bytes"] + stats["regex_bytes"]
+    stats["reduction"] = (
+        1 - float(stats["scanned_bytes"]) / stats["reference_bytes"]
+        if stats["reference_bytes"] else 0.0)
+
+    clean_har = Har(har=text[:0].join(scrubbed))
+
+    return clean_har
+
+  def scrub_profile(self, wordlist, text):
+    """Returns a digest (str) of the generic patterns and of the patterns of
+    the [wordlist] words that may match [text] (str), which identifies the
+    result of scrubbing [text] with them.
+
+    Literal words (see LITERAL_WORD) missing from [text] are left out, as
+    gen_text_scrubber() skips them, so the same text gets the same digest
+    in HARs with different cookie, header and param names.
+    """
+    found = find_words(
+        text, [word for word in wordlist if LITERAL_WORD.match(word)],
+        self.scan_window)
+    rules = [(pattern, 0) for pattern in sorted(self.gen_regex()["single_use"])]
+    for word in wordlist:
+      if word in found or not LITERAL_WORD.match(word):
+        rules.extend(
+            (pattern, re.I)
+            for pattern in sorted(self.gen_regex(word)["word_patterns"]))
+    return rulecache.rules_key(rules)
+
+  def scrub_cached(self, har, wordlist, scrub_engine):
+    """Scrubs HAR with [scrub_engine], taking large response content texts
+    from self.content_cache.
+
+    Content texts of content_cache_min_bytes or more are scrubbed on their
+    own, or taken from the cache if the same text was scrubbed with the same
+    patterns (see scrub_profile()) before, by any scrub.  The rest of
+    the HAR, with its request-specific URLs, headers and cookies, is
+    scrubbed by [scrub_engine] every time.  The generic and word=value
+    patterns only match within one json string followed by a ',' or '}',
+    and the name/value patterns need a "name" key, so this gives the same
+    redactions as scrubbing the whole HAR when the entry, response and
+    content objects have no "name" key.
+
+    Args:
+      har: a Har() object
+      wordlist: list of str scrub pattern words
+      scrub_engine: engine method (see get_engine())
+
+    Returns:
+      har: scrubbed har
+    """
+    cache = self.content_cache
+    # Regex words are applied to every content text, if found in the HAR
+    text_wordlist = self.trim_regex_words(har, wordlist)
+    scrub_text = None
+    results = []
+    replaced = []
+
+    # Placeholders are assigned in place so the document keeps its key order,
+    # and are taken out again even if the scrub is interrupted
+    try:
+      for entry in har.har_dict["log"]["entries"]:
+        self.check_deadline()
+        response = entry.get("response") if isinstance(
+            entry, MAPPING_TYPES) else None
+        content = response.get("content") if isinstance(
+            response, MAPPING_TYPES) else None
+        if not isinstance(content, MAPPING_TYPES):
+          continue
+        text = content.get("text")
+        if (not isinstance(text, basestring)
+            or len(text) < self.content_cache_min_bytes
+            or any("name" in parent for parent in [entry, response, content])):
+          continue
+        serialized = json.dumps(text)
+        key = cache.key(
+            self.scrub_profile(text_wordlist, serialized), serialized)
+        scrubbed = cache.get(key, len(serialized))
+        if scrubbed is None:
+          if scrub_text is None:
+            scrub_text = self.gen_text_scrubber(text_wordlist)
+          # Ends a word=value match the same way as the '}' that may follow
+          scrubbed = scrub_text(serialized + ",")[:-1]
+          cache.put(key, scrubbed)
+        results.append(scrubbed)
+        replaced.append((content, text))
+        content["text"] = u"{}{}".format(
+            self.content_placeholder, len(results) - 1)
+
+      if not replaced:
+        return scrub_engine(har, wordlist)
+      har_sanitized = scrub_engine(Har(har=har.har_dict), wordlist)
+    finally:
+      for content, text in replaced:
+        content["text"] = text
+
+    for entry in har_sanitized.har_dict["log"]["entries"]:
+      content = entry.get("response", {}).get("content", {})
+      text = content.get("text")
+      if (isinstance(text, basestring)
+          and text.startswith(self.content_placeholder)):
+        content["text"] = json.loads(
+            results[int(text[len(self.content_placeholder):])])
+
+    clean_har = Har(har=har_sanitized.har_dict)
+
+    return clean_har
+
+  def scrub_degraded(self, har):
+    """Returns [har] conservatively redacted without scanning for patterns.
+
+    The fallback of scrub() when its time budget runs out.  Every "value"
+    string (cookies, headers, params...) and every content/postData text is
+    redacted, and in every other string, URL credentials and anything after
+    an '=' up to the next '&' or ';' (see degraded_patterns).  This covers
+    everything the generic, wordlist and content patterns could redact,
+    whatever the wordlist and options, at the cost of redacting much more.
+
+    Args:
+      har: a Har() object
+
+    Returns:
+      har: redacted har
+    Raises:
+      TypeError: har must be a Har() object
+    """
+    if not isinstance(har, Har):
+      raise TypeError("'har' must be a Har object")
+
+    patterns = [(self.compile_pattern(pattern), redacted)
+                for pattern, redacted in self.degraded_patterns]
+
+    def redact_string(value):
+      if "=" in value or "://" in value:
+        for regex, redacted in patterns:
+          value = regex.sub(redacted, value)
+      return value
+
+    def redact_node(key, node):
+      if isinstance(node, list):
+        return [redact_node(key, item) for item in node]
+      if not isinstance(node, MAPPING_TYPES):
+        return redact_string(node) if isinstance(node, basestring) else node
+      redacted = {}
+      for child_key, value in node.iteritems():
+        if isinstance(value, basestring):
+          value = redact_string(value)
+        elif isinstance(value, CONTAINER_TYPES):
+          value = redact_node(child_key, value)
+        redacted[redact_string(child_key)] = value
+      if isinstance(redacted.get("value"), basestring):
+        name = node.get("name")
+        redacted["value"] = u"[{} redacted]".format(
+            name if isinstance(name, basestring) else "value")
+      if (key in ["content", "postData"]
+          and isinstance(redacted.get("text"), basestring)):
+        redacted["text"] = u"[{} redacted]".format(
+            node.get("mimeType") or "text")
+      return redacted
+
+    clean_har = Har(har=redact_node(None, har.har_dict))
+
+    return clean_har
+
   def scrub(
       self,
       har,
@@ -579,9 +1720,17 @@ class HarSanitizer(object):
       all_cookies=False,
       all_headers=False,
       all_params=False,
-      all_content_mimetypes=False):
+      all_content_mimetypes=False,
+      memoize=True,
+      engine=None,
+      entry_filter=None,
+      time_budget=None):
     """Full scrub/redaction of sensitive HAR fields.
 
+    With a [time_budget], the scrub checks the time between stages, entries
+    and scanned texts.  Once the budget has run out it stops, and returns
+    the HAR redacted by scrub_degraded() instead, setting self.degraded.
+
     Args:
       har: a Har() object
       wordlist=None, (list of strs) appends to default wordlist
@@ -590,6 +1739,13 @@ class HarSanitizer(object):
       all_headers=False, (Boolean) Redacts all headers
       all_params=False, (Boolean) Redacts all URLQuery/POSTData parameters
       all_content_mimetypes=False (Boolean) Redacts all content mimeTypes
+      memoize=True (Boolean) Scrubs repeated cookie/header/param values and
+                   URLs once (see scrub_memoized())
+      engine=None (str) Scrub engine name (see engines).  Defaults to
+                  default_engine, or "reference" when memoize is False
+      entry_filter=None (dict) Entry include/exclude rules applied before
+                        scrubbing (see filter_entries())
+      time_budget=None (float) Seconds the full scrub may take
 
     Returns:
       har: scrubbed har
@@ -602,68 +1758,98 @@ class HarSanitizer(object):
 
     if not isinstance(har, Har):
       raise TypeError("'har' must be a Har object")
-
-    if WORDLIST_PATH[:4] == "http":
-      wordlist_json = json.loads(urllib2.urlopen(WORDLIST_PATH).read())
-      scrub_wordlist = self.load_wordlist(wordlist=wordlist_json)
-    else:
-      scrub_wordlist = self.load_wordlist(wordlist_path=WORDLIST_PATH)
-
-    if isinstance(wordlist, list):
-      if all(isinstance(word, basestring) for word in wordlist):
-        scrub_wordlist.extend(wordlist)
-      else:
-        raise TypeError("All words in wordlist must be strings")
-
-    cond_table = {}
-
-    if all_cookies:
-      pattern = self.gen_hartype_names_pattern(har, "cookies")
-      cond_table.update(pattern)
-    if all_headers:
-      pattern = self.gen_hartype_names_pattern(har, "headers")
-      cond_table.update(pattern)
-    if all_params:
-      url_pattern = self.gen_hartype_names_pattern(har, "queryString")
-      postdata_pattern = self.gen_hartype_names_pattern(har, "params")
-      cond_table.update(url_pattern)
-      cond_table.update(postdata_pattern)
-
-    # Loads default content scrub patterns
-    if all_content_mimetypes:
-      content_patterns = self.gen_all_mimetypes_scrub_pattern()
-    elif content_list:
-      # Prevent malicious injections
-      mimetypes = self.get_mimetypes(har).keys()
-      content_list_trimmed = [mimetype for mimetype in content_list
-                              if mimetype in mimetypes]
-      content_patterns = self.gen_content_type_scrub_patterns(
-          content_list=content_list_trimmed)
-    else:
-      content_patterns = self.gen_content_type_scrub_patterns()
-    cond_table.update(content_patterns)
-
-    # Runs iter_eval_exec on self.my_dict against self.cond_table
-    iter_har_dict = self.iter_eval_exec(
-        my_iter=har.har_dict,
-        cond_table=cond_table)
-    har = Har(har=iter_har_dict)
-
-    # Scrub generic patterns
-    har_clean = self.scrub_generic(har)
-    har = har_clean
-
-    # Appends wordlist
-    if all_cookies:
-      scrub_wordlist.extend(self.har.category["cookies"].keys())
-    if all_headers:
-      scrub_wordlist.extend(self.har.category["headers"].keys())
-    if all_params:
-      scrub_wordlist.extend(self.har.category["queryString"].keys())
-      if self.har.category["params"]:
-        scrub_wordlist.extend(self.har.category["params"].keys())
-
-    # Scrub wordList patterns
-    har_sanitized = self.scrub_wordlist(har, scrub_wordlist)
+    if engine is None:
+      engine = self.default_engine if memoize else "reference"
+    scrub_engine = self.get_engine(engine)
+
+    self.degraded = False
+    self.deadline = None if time_budget is None else time.time() + time_budget
+    # The HAR scrub_degraded() falls back to, once entries are filtered
+    filtered = None
+    try:
+      if entry_filter:
+        with self.stage("filter"):
+          har = self.filter_entries(har, entry_filter)
+      filtered = har
+
+      with self.stage("wordlist"):
+        # Copied, since the cached default wordlist must not be extended
+        scrub_wordlist = list(
+            self.load_wordlist(wordlist=load_json_resource(wordlist_path())))
+        self.compile_wordlist(scrub_wordlist)
+
+        if isinstance(wordlist, list):
+          if all(isinstance(word, basestring) for word in wordlist):
+            scrub_wordlist.extend(wordlist)
+          else:
+            raise TypeError("All words in wordlist must be strings")
+
+      cond_table = {}
+      # Names collected by the hartype patterns end up in this category dict
+      category = har.category
+
+      with self.stage("patterns"):
+        if all_cookies:
+          pattern = self.gen_hartype_names_pattern(har, "cookies")
+          cond_table.update(pattern)
+        if all_headers:
+          pattern = self.gen_hartype_names_pattern(har, "headers")
+          cond_table.update(pattern)
+        if all_params:
+          url_pattern = self.gen_hartype_names_pattern(har, "queryString")
+          postdata_pattern = self.gen_hartype_names_pattern(har, "params")
+          cond_table.update(url_pattern)
+          cond_table.update(postdata_pattern)
+
+        # Loads default content scrub patterns
+        if all_content_mimetypes:
+          content_patterns = self.gen_all_mimetypes_scrub_pattern()
+        elif content_list:
+          # Prevent malicious injections
+          mimetypes = self.get_mimetypes(har).keys()
+          content_list_trimmed = [mimetype for mimetype in content_list
+                                  if mimetype in mimetypes]
+          content_patterns = self.gen_content_type_scrub_patterns(
+              content_list=content_list_trimmed)
+        else:
+          content_patterns = self.gen_content_type_scrub_patterns()
+        cond_table.update(content_patterns)
+
+      with self.stage("structural"):
+        # Runs iter_eval_exec on self.my_dict against self.cond_table
+        iter_har_dict = self.iter_eval_exec(
+            my_iter=har.har_dict,
+            cond_table=cond_table)
+        har = Har(har=iter_har_dict)
+
+      # Appends wordlist
+      if all_cookies:
+        scrub_wordlist.extend(category["cookies"].keys())
+      if all_headers:
+        scrub_wordlist.extend(category["headers"].keys())
+      if all_params:
+        scrub_wordlist.extend(category["queryString"].keys())
+        if category["params"]:
+          scrub_wordlist.extend(category["params"].keys())
+
+      with self.stage("regex"):
+        # Scrub generic and wordList patterns
+        if self.content_cache is not None:
+          har_sanitized = self.scrub_cached(har, scrub_wordlist, scrub_engine)
+        else:
+          har_sanitized = scrub_engine(har, scrub_wordlist)
+    except DeadlineExceeded:
+      # Nothing is scanned any more: everything that could hold sensitive
+      # data is redacted instead
+      self.deadline = None
+      self.degraded = True
+      with self.stage("degraded"):
+        if filtered is None:
+          filtered = har
+          if entry_filter:
+            filtered = self.filter_entries(har, entry_filter)
+        har_sanitized = self.scrub_degraded(filtered)
+    finally:
+      self.deadline = None
 
     return har_sanitized
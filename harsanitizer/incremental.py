@@ -0,0 +1,282 @@
+"""Incremental sanitization of HAR captures that grow between runs."""
+
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import hashlib
+import tempfile
+
+from harsanitizer import Har, HarSanitizer
+from harsanitizer import MAPPING_TYPES, CONTAINER_TYPES, LITERAL_WORD
+from harsanitizer import load_json_resource, wordlist_path
+from entryfilter import EntryFilter
+
+CHECKPOINT_SUFFIX = ".checkpoint"
+CHECKPOINT_VERSION = 1
+# scrub() options that select how, not what, to redact
+ENGINE_OPTIONS = ["memoize", "engine"]
+# Names collected for each all_* scrub option
+ALL_OPTION_HARTYPES = {
+    "all_cookies": ["cookies"],
+    "all_headers": ["headers"],
+    "all_params": ["queryString", "params"],
+}
+
+
+def checkpoint_path(out_path):
+  """Returns the checkpoint path stored next to output [out_path]."""
+  return out_path + CHECKPOINT_SUFFIX
+
+
+def write_json(path, data):
+  """Atomically writes [data] as json to [path] in the CLI output format."""
+  fd, tmp_path = tempfile.mkstemp(
+      prefix=".harsan-", dir=os.path.dirname(os.path.abspath(path)))
+  try:
+    with os.fdopen(fd, "w") as tmp_file:
+      json.dump(data, tmp_file, indent=2, separators=(",", ": "))
+    os.rename(tmp_path, path)
+  except Exception:
+    os.remove(tmp_path)
+    raise
+
+
+def load_checkpoint(out_path):
+  """Returns the checkpoint dict for [out_path], or None if there is none."""
+  try:
+    with open(checkpoint_path(out_path), "r") as checkpoint_file:
+      checkpoint = json.load(checkpoint_file)
+  except (IOError, ValueError):
+    return None
+  if checkpoint.get("version") != CHECKPOINT_VERSION:
+    return None
+  return checkpoint
+
+
+def update_digest(sha, items):
+  """Updates hashlib object [sha] with json-serializable [items], returning it."""
+  for item in items:
+    sha.update(json.dumps(item, sort_keys=True).encode("utf-8"))
+  return sha
+
+
+def option_key(scrub_kwargs):
+  """Returns the scrub options that affect redactions, as a json-able dict."""
+  return dict(
+      (option, value) for option, value in scrub_kwargs.items()
+      if option not in ENGINE_OPTIONS and value)
+
+
+def filtered_entries(entries, scrub_kwargs):
+  """Returns the [entries] scrub() scans given its "entry_filter" option."""
+  if not scrub_kwargs.get("entry_filter"):
+    return entries
+  return EntryFilter.from_option(scrub_kwargs["entry_filter"]).apply(entries)
+
+
+def add_names(my_iter, names):
+  """Adds the value of every "name" key nested in [my_iter] to set [names]."""
+  if isinstance(my_iter, MAPPING_TYPES):
+    for key, value in my_iter.iteritems():
+      if key == "name":
+        names.add(value)
+      elif isinstance(value, CONTAINER_TYPES):
+        add_names(value, names)
+  elif isinstance(my_iter, list):
+    for value in my_iter:
+      add_names(value, names)
+
+
+def hartype_names(my_iter, hartypes, found=None):
+  """Returns {hartype: set of names} of [hartypes] nested in [my_iter].
+
+  Finds the same names as get_hartype_names(), walking the dicts and lists
+  once for all [hartypes] instead of evaluating its cond_table at every key.
+  """
+  found = found if found is not None else dict(
+      (hartype, set()) for hartype in hartypes)
+  if isinstance(my_iter, MAPPING_TYPES):
+    for key, value in my_iter.iteritems():
+      if key in found and key in hartypes:
+        add_names(value, found[key])
+        others = [hartype for hartype in hartypes if hartype != key]
+        if others and isinstance(value, CONTAINER_TYPES):
+          hartype_names(value, others, found)
+      elif isinstance(value, CONTAINER_TYPES):
+        hartype_names(value, hartypes, found)
+  elif isinstance(my_iter, list):
+    for value in my_iter:
+      hartype_names(value, hartypes, found)
+  return found
+
+
+def collect_inventory(hs, entries, inventory=None, hartypes=None):
+  """Adds [entries]' cookie/header/param names to [inventory].
+
+  Args:
+    hs: a HarSanitizer() object
+    entries: list of HAR entry dicts
+    inventory: {hartype: sorted list of names} to extend.  Default=empty
+    hartypes: hartypes to collect.  Default=hs.valid_hartypes
+
+  Returns:
+    {hartype: sorted list of names}, as get_hartype_names() finds them
+  """
+  inventory = dict(inventory or {})
+  if not entries:
+    return inventory
+  found = hartype_names(entries, hartypes or hs.valid_hartypes)
+  for hartype, names in found.items():
+    inventory[hartype] = sorted(names.union(inventory.get(hartype, [])))
+  return inventory
+
+
+def inventory_words(inventory, scrub_kwargs):
+  """Returns the names in [inventory] of every hartype selected by the all_*
+  options in [scrub_kwargs], which scrub() appends to the wordlist."""
+  words = []
+  for option, hartypes in sorted(ALL_OPTION_HARTYPES.items()):
+    if scrub_kwargs.get(option):
+      for hartype in hartypes:
+        words.extend(inventory.get(hartype, []))
+  return words
+
+
+def effective_wordlist(hs, inventory, scrub_kwargs):
+  """Returns the words scrub() redacts given names [inventory] and options:
+  the default wordlist, the "wordlist" option and inventory_words()."""
+  words = list(hs.load_wordlist(wordlist=load_json_resource(wordlist_path())))
+  words.extend(scrub_kwargs.get("wordlist") or [])
+  words.extend(inventory_words(inventory, scrub_kwargs))
+  return words
+
+
+def scrub_incremental(har_path, out_path, **scrub_kwargs):
+  """Scrubs the HAR at [har_path] to [out_path], scrubbing only entries
+  appended since the previous run.
+
+  A checkpoint stored next to the output records the number of entries
+  already scrubbed (and a digest of them), the names inventory collected by
+  get_hartype_names(), the effective wordlist and the scrub options.  When
+  the capture has only grown, new entries are scrubbed with the effective
+  wordlist of the whole capture and appended to the previous output.  None
+  of the scrub patterns match across entries, so this gives the same
+  redactions as a full scrub.
+
+  Everything is rescrubbed when there is no usable checkpoint, the options
+  changed, earlier entries changed, or the new entries add cookie, header
+  or param names to the wordlist that appear in earlier entries.  Words
+  other than letters, digits, '_' and '-' are regexes, which scrub() keeps
+  or drops by looking for them in the whole capture and then matches
+  against text they do not literally appear in, so a wordlist holding any
+  of them is always rescrubbed in full.  When the
+  entry filter drops every new entry, only the checkpoint is updated.
+
+  Args:
+    har_path: (str) HAR file to scrub
+    out_path: (str) file to write the scrubbed HAR to
+    scrub_kwargs: HarSanitizer.scrub() keyword arguments
+
+  Returns:
+    stats dict: {"mode": "full" | "incremental" | "unchanged", "reason":
+    why a full scrub was needed or None, "entries": entries in the HAR,
+    "scrubbed_entries": entries scrubbed by this run}
+  """
+  har_dict = Har(har_path=har_path).har_dict
+  entries = har_dict["log"]["entries"]
+  log_fields = dict(
+      (key, value) for key, value in har_dict["log"].items()
+      if key != "entries")
+  hs = HarSanitizer()
+  options = option_key(scrub_kwargs)
+  log_digest = update_digest(hashlib.sha1(), [log_fields]).hexdigest()
+
+  checkpoint = load_checkpoint(out_path)
+  entries_sha = hashlib.sha1()
+  reason = None
+  if checkpoint is None or not os.path.isfile(out_path):
+    reason = "no checkpoint"
+  elif checkpoint["options"] != options:
+    reason = "scrub options changed"
+  elif (checkpoint["entries"] > len(entries)
+        or update_digest(entries_sha, entries[:checkpoint["entries"]])
+        .hexdigest() != checkpoint["digest"]):
+    reason = "earlier entries changed"
+
+  if reason is None:
+    done = checkpoint["entries"]
+    new_entries = entries[done:]
+    if not new_entries:
+      if log_digest == checkpoint["log_digest"]:
+        return {"mode": "unchanged", "reason": None,
+                "entries": len(entries), "scrubbed_entries": 0}
+      reason = "log fields changed"
+    else:
+      new_filtered = filtered_entries(new_entries, scrub_kwargs)
+      inventory = collect_inventory(hs, new_filtered, checkpoint["inventory"])
+      wordlist = effective_wordlist(hs, inventory, scrub_kwargs)
+      added = set(wordlist) - set(checkpoint["wordlist"])
+      if not new_filtered and log_digest != checkpoint["log_digest"]:
+        reason = "log fields changed"
+      elif any(not LITERAL_WORD.match(word) for word in wordlist):
+        reason = "regex words in wordlist"
+      elif added:
+        earlier_str = json.dumps(entries[:done]).lower()
+        if any(word.lower() in earlier_str for word in added):
+          reason = "new names found in earlier entries"
+
+  if reason is None and not new_filtered:
+    # The entry filter drops every new entry: the output stays the same
+    entries_digest = update_digest(entries_sha, new_entries).hexdigest()
+    sanitized = None
+    stats = {"mode": "incremental", "reason": None,
+             "entries": len(entries), "scrubbed_entries": 0}
+  elif reason is None:
+    # New entries are scrubbed with the names of the whole capture
+    partial_kwargs = dict(scrub_kwargs, wordlist=(
+        list(scrub_kwargs.get("wordlist") or [])
+        + inventory_words(inventory, scrub_kwargs)))
+    entries_digest = update_digest(entries_sha, new_entries).hexdigest()
+    partial_har = Har(har={"log": dict(log_fields, entries=new_entries)})
+    sanitized = hs.scrub(partial_har, **partial_kwargs)
+    with open(out_path, "r") as out_file:
+      previous = json.load(out_file)
+    sanitized_log = sanitized.har_dict["log"]
+    sanitized_log["entries"] = (
+        previous["log"]["entries"] + sanitized_log["entries"])
+    stats = {"mode": "incremental", "reason": None,
+             "entries": len(entries), "scrubbed_entries": len(new_entries)}
+  else:
+    inventory = collect_inventory(hs, filtered_entries(entries, scrub_kwargs))
+    wordlist = effective_wordlist(hs, inventory, scrub_kwargs)
+    entries_digest = update_digest(hashlib.sha1(), entries).hexdigest()
+    sanitized = hs.scrub(Har(har=har_dict), **scrub_kwargs)
+    stats = {"mode": "full", "reason": reason,
+             "entries": len(entries), "scrubbed_entries": len(entries)}
+
+  if sanitized is not None:
+    write_json(out_path, sanitized.har_dict)
+  write_json(checkpoint_path(out_path), {
+      "version": CHECKPOINT_VERSION,
+      "entries": len(entries),
+      "digest": entries_digest,
+      "log_digest": log_digest,
+      "options": options,
+      "inventory": inventory,
+      "wordlist": wordlist,
+  })
+  return stats
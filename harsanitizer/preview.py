@@ -0,0 +1,264 @@
+"""Paginated preview of sanitized HAR entries, scrubbed a page at a time."""
+
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+import admission
+import incremental
+from harsanitizer import Har, HarSanitizer, LITERAL_WORD
+from harsanitizer import load_config
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 200
+DEFAULT_MAX_SESSIONS = 8
+DEFAULT_SESSION_TTL = 600
+
+# This process's session store, see configured_store()
+_configured = {}
+
+
+def page_range(start, count, total):
+  """Returns the validated (start, stop) entry indices of a preview page.
+
+  Args:
+    start: (int) index of the first entry
+    count: (int) entries per page, at most MAX_PAGE_SIZE
+    total: (int) entries in the HAR
+
+  Raises:
+    ValueError: invalid start or count
+  """
+  if (not isinstance(start, (int, long)) or isinstance(start, bool)
+      or start < 0 or (total and start >= total)):
+    raise ValueError("Preview start must be an entry index below {}".format(
+        total))
+  if (not isinstance(count, (int, long)) or isinstance(count, bool)
+      or not 0 < count <= MAX_PAGE_SIZE):
+    raise ValueError("Preview count must be between 1 and {}".format(
+        MAX_PAGE_SIZE))
+  return start, min(start + count, total)
+
+
+class PreviewSession(object):
+  """A HAR being previewed, scrubbed one page of entries at a time.
+
+  None of the scrub patterns match across entries, so each page is scrubbed
+  on its own, the same way incremental.scrub_incremental() scrubs new
+  entries: the entry filter is applied once, and with the all_* options the
+  cookie/header/param names of the whole HAR are added to the wordlist of
+  every page.  Those names are collected by the first page that needs them,
+  by incremental.collect_inventory(), which walks the parsed entries without
+  scanning their strings; the entries themselves are only scrubbed a page
+  at a time.  Words other than letters, digits, '_' and '-' are regexes,
+  which scrub() keeps or drops by looking for them in the whole HAR and then
+  matches against text they do not literally appear in, so with any of them
+  in the wordlist the first page scrubs every entry at once instead.  Pages
+  give the same redactions as a full scrub() of the HAR, and scrubbed
+  entries are kept, so going back to a page does not scrub it again.
+  Entries are copied before they are scrubbed, so the session's parsed HAR
+  is never modified.  Entries of pages that fell back to degraded mode (see
+  HarSanitizer.scrub_degraded()) are not kept.
+
+  Typical usage example:
+    session = PreviewSession(har_dict, {"all_cookies": True})
+    page = session.page(0, 20)
+
+  Args:
+    har_dict: (dict) parsed HAR
+    scrub_kwargs: HarSanitizer.scrub() keyword arguments
+    content_cache: (optional) contentcache.ContentCache used by page scrubs
+    size: (int) bytes of the HAR json, held against the PreviewStore's
+          admission.AdmissionController while the session is stored
+  """
+
+  def __init__(self, har_dict, scrub_kwargs, content_cache=None, size=0):
+    super(PreviewSession, self).__init__()
+    scrub_kwargs = dict(scrub_kwargs)
+    self.time_budget = scrub_kwargs.pop("time_budget", None)
+    log = Har(har=har_dict).har_dict["log"]
+    self.log_fields = dict(
+        (key, value) for key, value in log.items() if key != "entries")
+    self.entries = incremental.filtered_entries(log["entries"], scrub_kwargs)
+    scrub_kwargs.pop("entry_filter", None)
+    self.scrub_kwargs = scrub_kwargs
+    self.content_cache = content_cache
+    self.size = size
+    self.page_kwargs = None
+    self.whole = False
+    self.results = {}
+    self.lock = threading.Lock()
+    self.last_used = time.time()
+
+  def gen_page_kwargs(self):
+    """Returns the scrub() keyword arguments of every page: scrub_kwargs,
+    with the names selected by the all_* options added to the wordlist.
+    Sets whole if the wordlist holds regex words.  Called with the lock
+    held."""
+    if self.page_kwargs is None:
+      page_kwargs = dict(self.scrub_kwargs)
+      hartypes = [
+          hartype
+          for option, option_hartypes in incremental.ALL_OPTION_HARTYPES.items()
+          if page_kwargs.get(option) for hartype in option_hartypes]
+      if hartypes:
+        inventory = incremental.collect_inventory(
+            HarSanitizer(), self.entries, hartypes=hartypes)
+        page_kwargs["wordlist"] = (
+            list(page_kwargs.get("wordlist") or [])
+            + incremental.inventory_words(inventory, page_kwargs))
+      self.whole = any(not LITERAL_WORD.match(word)
+                       for word in page_kwargs.get("wordlist") or [])
+      self.page_kwargs = page_kwargs
+    return self.page_kwargs
+
+  def page(self, start, count=DEFAULT_PAGE_SIZE):
+    """Returns the scrubbed entries [start, start + count) as a dict:
+
+      {"start": int, "total": entries in the HAR, "entries": [entries],
+       "degraded": True if the page fell back to degraded mode}
+
+    Raises:
+      ValueError: invalid start or count
+    """
+    start, stop = page_range(start, count, len(self.entries))
+    self.last_used = time.time()
+    degraded = False
+    with self.lock:
+      page_kwargs = self.gen_page_kwargs()
+      missing = [index for index in range(start, stop)
+                 if index not in self.results]
+      if missing:
+        if self.whole:
+          # Regex words are scrubbed with the whole HAR, see the class doc
+          missing = range(len(self.entries))
+          log = dict(self.log_fields, entries=copy.deepcopy(self.entries))
+        else:
+          log = {"entries": copy.deepcopy(
+              [self.entries[index] for index in missing])}
+        hs = HarSanitizer()
+        hs.content_cache = self.content_cache
+        sanitized = hs.scrub(
+            Har(har={"log": log}),
+            time_budget=self.time_budget, **page_kwargs)
+        scrubbed = dict(zip(missing, sanitized.har_dict["log"]["entries"]))
+        degraded = hs.degraded
+        if not degraded:
+          self.results.update(scrubbed)
+      else:
+        scrubbed = {}
+      entries = [self.results[index] if index in self.results
+                 else scrubbed[index] for index in range(start, stop)]
+    return {"start": start, "total": len(self.entries),
+            "entries": entries, "degraded": degraded}
+
+
+class PreviewStore(object):
+  """Least recently used store of PreviewSessions, keyed by session id.
+
+  Holds at most [max_sessions] sessions, each with its parsed HAR, and drops
+  sessions unused for [ttl] seconds.  With a [controller], the size of each
+  stored session is held against its budget, and least recently used
+  sessions are evicted to make room for new ones.  Safe to share between
+  threads.
+
+  Typical usage example:
+    store = PreviewStore()
+    session_id = store.add(PreviewSession(har_dict, scrub_kwargs))
+    page = store.get(session_id).page(20, 20)
+
+  Args:
+    max_sessions: (int) sessions kept
+    ttl: (int) seconds an unused session is kept
+    controller: (optional) admission.AdmissionController holding the
+                sessions' sizes
+  """
+
+  def __init__(self, max_sessions=DEFAULT_MAX_SESSIONS,
+               ttl=DEFAULT_SESSION_TTL, controller=None):
+    super(PreviewStore, self).__init__()
+    self.max_sessions = max_sessions
+    self.ttl = ttl
+    self.controller = controller
+    self.lock = threading.Lock()
+    self.sessions = OrderedDict()
+
+  def drop(self, session_id):
+    """Drops session [session_id].  Called with the lock held."""
+    session = self.sessions.pop(session_id)
+    if self.controller is not None:
+      self.controller.unhold(session.size)
+
+  def expire(self):
+    """Drops sessions unused for ttl seconds.  Called with the lock held."""
+    now = time.time()
+    for session_id, session in self.sessions.items():
+      if now - session.last_used > self.ttl:
+        self.drop(session_id)
+
+  def add(self, session):
+    """Stores PreviewSession [session], evicting least recently used
+    sessions if the store or the controller's held bytes are full.
+
+    Returns:
+      session id (str)
+
+    Raises:
+      admission.Rejected: the session does not fit the controller's
+                          max_held_bytes on its own
+    """
+    session_id = uuid.uuid4().hex
+    with self.lock:
+      self.expire()
+      while self.sessions and len(self.sessions) >= self.max_sessions:
+        self.drop(next(iter(self.sessions)))
+      while self.controller is not None:
+        try:
+          self.controller.hold(session.size)
+          break
+        except admission.Rejected:
+          if not self.sessions:
+            raise
+          self.drop(next(iter(self.sessions)))
+      self.sessions[session_id] = session
+    return session_id
+
+  def get(self, session_id):
+    """Returns the PreviewSession [session_id], or None if it expired."""
+    with self.lock:
+      self.expire()
+      session = self.sessions.pop(session_id, None)
+      if session is not None:
+        # Re-inserted as the most recently used
+        self.sessions[session_id] = session
+      return session
+
+
+def configured_store(controller=None):
+  """Returns this process's PreviewStore, sized by "preview_sessions" and
+  "preview_ttl" in config.json, and holding session sizes against
+  [controller] (admission.AdmissionController) when first called."""
+  if "store" not in _configured:
+    config = load_config()
+    _configured["store"] = PreviewStore(
+        max_sessions=config.get("preview_sessions", DEFAULT_MAX_SESSIONS),
+        ttl=config.get("preview_ttl", DEFAULT_SESSION_TTL),
+        controller=controller)
+  return _configured["store"]
@@ -0,0 +1,218 @@
+"""Profiles HarSanitizer.scrub() calls: hot functions, stage memory, regexes."""
+
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import pstats
+import cProfile
+import resource
+import contextlib
+
+from harsanitizer import HarSanitizer
+
+# tracemalloc is stdlib from Python 3.4 (and pytracemalloc on patched 2.7
+# builds).  Otherwise stage memory falls back to the process peak RSS.
+try:
+  import tracemalloc
+except ImportError:
+  tracemalloc = None
+
+DEFAULT_TOP = 20
+
+
+class ProfiledPattern(object):
+  """Wraps a compiled regex, recording time spent and matches substituted.
+
+  Implements the sub()/subn() calls HarSanitizer makes on compiled patterns.
+
+  Args:
+    regex: compiled regex pattern object
+    record: dict accumulating "calls", "matches" and "seconds"
+  """
+
+  def __init__(self, regex, record):
+    super(ProfiledPattern, self).__init__()
+    self.regex = regex
+    self.record = record
+    self.pattern = regex.pattern
+    self.flags = regex.flags
+
+  def subn(self, repl, string, count=0):
+    start = time.time()
+    result, matches = self.regex.subn(repl, string, count)
+    self.record["seconds"] += time.time() - start
+    self.record["calls"] += 1
+    self.record["matches"] += matches
+    return result, matches
+
+  def sub(self, repl, string, count=0):
+    return self.subn(repl, string, count)[0]
+
+
+class ScrubProfiler(object):
+  """Runs HarSanitizer.scrub() under cProfile and memory tracing.
+
+  The profiler is installed as the sanitizer's tracer for the duration of
+  the scrub: HarSanitizer.stage() reports stage boundaries to stage(), and
+  HarSanitizer.compile_pattern() hands compiled regexes to pattern().
+
+  Typical usage example:
+    profiler = ScrubProfiler()
+    har_redacted = profiler.scrub(HarSanitizer(), har, all_cookies=True)
+    report = profiler.report()
+  """
+
+  def __init__(self):
+    super(ScrubProfiler, self).__init__()
+    self.profile = cProfile.Profile()
+    self.stages = []
+    self.patterns = {}
+    self.total_seconds = 0.0
+    self.scan = None
+    self.memory_source = "tracemalloc" if tracemalloc else "ru_maxrss"
+
+  def memory_mark(self):
+    """Returns (current, peak) traced bytes, or (0, peak RSS bytes)."""
+    if tracemalloc:
+      return tracemalloc.get_traced_memory()
+    # ru_maxrss is in kilobytes on Linux
+    return 0, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+  @contextlib.contextmanager
+  def stage(self, name):
+    """Records time and peak memory of the scrub stage [name].
+
+    With tracemalloc, peak_bytes is the peak traced memory above what was
+    allocated when the stage started, and retained_bytes what the stage left
+    allocated.  Without it, peak_bytes is how much the process peak RSS grew
+    during the stage, a lower bound, and retained_bytes is None.
+    """
+    if tracemalloc and hasattr(tracemalloc, "reset_peak"):
+      tracemalloc.reset_peak()
+    start_current, start_peak = self.memory_mark()
+    start = time.time()
+    try:
+      yield
+    finally:
+      seconds = time.time() - start
+      end_current, end_peak = self.memory_mark()
+      if tracemalloc:
+        peak_bytes = end_peak - start_current
+        retained_bytes = end_current - start_current
+      else:
+        peak_bytes = end_peak - start_peak
+        retained_bytes = None
+      self.stages.append({
+          "name": name,
+          "seconds": seconds,
+          "peak_bytes": peak_bytes,
+          "retained_bytes": retained_bytes,
+      })
+
+  def pattern(self, regex):
+    """Returns [regex] wrapped to record its timings and match counts."""
+    key = (regex.pattern, regex.flags)
+    if key not in self.patterns:
+      self.patterns[key] = {"calls": 0, "matches": 0, "seconds": 0.0}
+    return ProfiledPattern(regex, self.patterns[key])
+
+  def scrub(self, hs, har, **scrub_kwargs):
+    """Runs hs.scrub(har, **scrub_kwargs) under the profiler.
+
+    Args:
+      hs: a HarSanitizer() object
+      har: a Har() object
+      scrub_kwargs: HarSanitizer.scrub() keyword arguments
+
+    Returns:
+      har: scrubbed har
+    """
+    started_tracing = tracemalloc and not tracemalloc.is_tracing()
+    if started_tracing:
+      tracemalloc.start()
+    hs.tracer = self
+    hs.scope_stats = None
+    hs.scan_stats = None
+    start = time.time()
+    self.profile.enable()
+    try:
+      return hs.scrub(har, **scrub_kwargs)
+    finally:
+      self.profile.disable()
+      self.total_seconds += time.time() - start
+      hs.tracer = None
+      self.scan = (hs.scope_stats if hs.scope_stats is not None
+                   else hs.scan_stats)
+      if started_tracing:
+        tracemalloc.stop()
+
+  def report(self, top=DEFAULT_TOP):
+    """Returns the profile as a json-serializable dict.
+
+    Args:
+      top: (int) number of functions and patterns to report
+
+    Returns:
+      {"total_seconds", "memory_source", "stages", "functions", "patterns",
+      "scan"}, with functions sorted by their own (exclusive) time and
+      patterns by time spent substituting, slowest first.  "scan" holds the
+      bytes scanned per field by the "scoped" engine (see
+      HarSanitizer.scrub_scoped()), the bytes scanned by the "indexed"
+      engine next to the reference engine's (see
+      HarSanitizer.scrub_indexed()), or None for other engines.
+    """
+    functions = []
+    for (filename, line, name), (primitive_calls, calls, own_seconds,
+                                 cumulative_seconds, _) in (
+                                     pstats.Stats(self.profile).stats.items()):
+      functions.append({
+          "function": "{}:{}({})".format(filename, line, name),
+          "calls": calls,
+          "primitive_calls": primitive_calls,
+          "own_seconds": own_seconds,
+          "cumulative_seconds": cumulative_seconds,
+      })
+    functions.sort(key=lambda function: function["own_seconds"], reverse=True)
+
+    patterns = [
+        dict(record, pattern=pattern, flags=flags)
+        for (pattern, flags), record in self.patterns.items()]
+    patterns.sort(key=lambda pattern: pattern["seconds"], reverse=True)
+
+    return {
+        "total_seconds": self.total_seconds,
+        "memory_source": self.memory_source,
+        "stages": list(self.stages),
+        "functions": functions[:top],
+        "patterns": patterns[:top],
+        "scan": self.scan,
+    }
+
+
+def profile_scrub(har, top=DEFAULT_TOP, **scrub_kwargs):
+  """Scrubs [har] with a new HarSanitizer under a ScrubProfiler.
+
+  Args:
+    har: a Har() object
+    top: (int) number of functions and patterns to report
+    scrub_kwargs: HarSanitizer.scrub() keyword arguments
+
+  Returns:
+    (scrubbed har, report dict), see ScrubProfiler.report()
+  """
+  profiler = ScrubProfiler()
+  har_redacted = profiler.scrub(HarSanitizer(), har, **scrub_kwargs)
+  return har_redacted, profiler.report(top=top)
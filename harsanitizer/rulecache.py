@@ -0,0 +1,139 @@
+"""Disk cache of compiled scrub regex rules, keyed by content hash."""
+
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+import sys
+import hashlib
+import marshal
+import tempfile
+
+import _sre
+import sre_compile
+import sre_parse
+
+
+# Compiled SRE code is only valid for the regex engine that produced it, and
+# its layout may change between interpreter builds, not only releases
+ENGINE_KEY = "{}:{}:{}".format(sys.version, _sre.MAGIC, _sre.CODESIZE)
+
+
+def default_cache_dir():
+  """Returns $HARSAN_CACHE_DIR, or ~/.cache/harsanitizer."""
+  return os.environ.get(
+      "HARSAN_CACHE_DIR",
+      os.path.join(os.path.expanduser("~"), ".cache", "harsanitizer"))
+
+
+def rules_key(rules):
+  """Returns the content hash of [rules] (list of (pattern, flags) tuples)."""
+  digest = hashlib.sha1(ENGINE_KEY)
+  for pattern, flags in rules:
+    if isinstance(pattern, unicode):
+      pattern = pattern.encode("utf8")
+    digest.update("{}\0{}\0".format(flags, pattern))
+  return digest.hexdigest()
+
+
+def compile_rule(pattern, flags=0):
+  """Compiles [pattern] the way re.compile() does, keeping its SRE code.
+
+  Args:
+    pattern: (str) regex pattern
+    flags: (int) re module flags
+
+  Returns:
+    (regex, artifact): the compiled pattern object, and a marshal-able
+                       artifact that load_rule() turns back into it
+  """
+  parsed = sre_parse.parse(pattern, flags)
+  code = sre_compile._code(parsed, flags)
+  groupindex = parsed.pattern.groupdict
+  indexgroup = [None] * parsed.pattern.groups
+  for name, index in groupindex.items():
+    indexgroup[index] = name
+
+  artifact = (
+      pattern,
+      flags,
+      flags | parsed.pattern.flags,
+      code,
+      parsed.pattern.groups - 1,
+      groupindex,
+      indexgroup)
+  return load_rule(artifact), artifact
+
+
+def load_rule(artifact):
+  """Returns the compiled pattern object for a compile_rule() artifact."""
+  pattern, _, sre_flags, code, groups, groupindex, indexgroup = artifact
+  return _sre.compile(pattern, sre_flags, code, groups, groupindex, indexgroup)
+
+
+def load_rules(rules, cache_dir=None):
+  """Loads compiled [rules] from the disk cache, compiling and saving on a miss.
+
+  Skips regex parsing and code generation on every startup after the first
+  for the same rules and interpreter.  The SRE code is built with private
+  sre_compile/_sre internals, so any failure to read, load or build it falls
+  back to re.compile(), and cache write failures are ignored.
+
+  Args:
+    rules: list of (pattern, flags) tuples
+    cache_dir: (str) cache directory.  Default=default_cache_dir()
+
+  Returns:
+    compiled: {(pattern, flags): compiled pattern object}
+  """
+  cache_dir = cache_dir or default_cache_dir()
+  path = os.path.join(cache_dir, "rules-{}.marshal".format(rules_key(rules)))
+
+  try:
+    with open(path, "rb") as cache_file:
+      artifacts = marshal.load(cache_file)
+    compiled = dict(
+        ((artifact[0], artifact[1]), load_rule(artifact))
+        for artifact in artifacts)
+    if sorted(compiled) == sorted(set(rules)):
+      return compiled
+  except Exception:
+    pass
+
+  compiled = {}
+  artifacts = []
+  try:
+    for pattern, flags in rules:
+      regex, artifact = compile_rule(pattern, flags)
+      compiled[(pattern, flags)] = regex
+      artifacts.append(artifact)
+  except Exception:
+    return dict(
+        ((pattern, flags), re.compile(pattern, flags))
+        for pattern, flags in rules)
+
+  try:
+    if not os.path.isdir(cache_dir):
+      os.makedirs(cache_dir)
+    # Written to a temp file first so readers never see a partial artifact
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=".rules-")
+    with os.fdopen(fd, "wb") as cache_file:
+      marshal.dump(artifacts, cache_file)
+    os.rename(tmp_path, path)
+  except (IOError, OSError):
+    pass
+
+  return compiled
@@ -0,0 +1,119 @@
+/**
+ * Copyright 2017, Google Inc.
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ *
+ * Authors: Garrett Anderson
+ *
+ * Web Worker that runs HarSanitizer off the page's main thread.  Expects
+ * harsanitizer.js to be loaded with importScripts() first (see
+ * hsweb.prototype.createWorker in main.js).
+ *
+ * Request message:
+ *   {harText: str, wordList: [str], contentList: [str], chunkSize: int}
+ * Reply messages:
+ *   {type: "progress", stage: str, done: int, total: int}
+ *   {type: "done", harStr: str, cookies: [str], headers: [str],
+ *    queryString: [str], params: [str], mimeTypes: [str]}
+ *   {type: "invalid", message: str}  harText is not a HAR with entries
+ *   {type: "error", message: str}
+ */
+
+var DEFAULT_CHUNK_SIZE = 200;
+
+var splitHarChunks = function(harJson, chunkSize) {
+  // Splits a HAR into {"log": ...} chunks of at most chunkSize entries.
+  // The first chunk holds every log field except the entries.
+  let logFields = Object.assign({}, harJson["log"]);
+  logFields["entries"] = [];
+  let chunks = [{"log": logFields}];
+  let entries = harJson["log"]["entries"];
+  for (let start = 0; start < entries.length; start += chunkSize) {
+    chunks.push({"log": {"entries": entries.slice(start, start + chunkSize)}});
+  }
+  return chunks;
+};
+
+var joinHarChunks = function(chunks) {
+  let harJson = {"log": chunks[0]["log"]};
+  let entries = [];
+  for (let chunk of chunks.slice(1)) {
+    entries = entries.concat(chunk["log"]["entries"]);
+  }
+  harJson["log"]["entries"] = entries;
+  return harJson;
+};
+
+var parseHar = function(harText) {
+  // Returns the parsed HAR, or null if harText is not a HAR with entries.
+  // The file is only parsed here, off the page's main thread.
+  try {
+    var harJson = JSON.parse(harText);
+    if (!(harJson["log"]["entries"].length >= 1)) {
+      return null;
+    }
+  } catch(err) {
+    return null;
+  }
+  return harJson;
+};
+
+var sanitizeHar = function(request, postProgress) {
+  let harJson = parseHar(request.harText);
+  if (harJson === null) {
+    return {type: "invalid", message: "Invalid HAR JSON"};
+  }
+  let chunks = splitHarChunks(
+    harJson, request.chunkSize || DEFAULT_CHUNK_SIZE);
+  let hs = new HarSanitizer(null);
+
+  // Names, values and mimeTypes are collected from every chunk before any
+  // redaction, since a name found in one chunk is redacted in all of them.
+  chunks.forEach((chunk, index) => {
+    hs.harJson = chunk;
+    for (let harType of ["cookies", "headers", "queryString", "params"]) {
+      hs.getTypeNames(harType);
+    }
+    hs.getMimeTypes();
+    chunks[index] = hs.scrubMimeTypes(request.contentList);
+    postProgress("collect", index + 1, chunks.length);
+  });
+
+  let regexes = hs.buildRedactRegexes(request.wordList);
+  chunks.forEach((chunk, index) => {
+    hs.harJson = chunk;
+    chunks[index] = hs.redactWith(regexes);
+    postProgress("redact", index + 1, chunks.length);
+  });
+
+  return {
+    type: "done",
+    harStr: JSON.stringify(joinHarChunks(chunks), null, 2),
+    cookies: Object.keys(hs.harElems["cookies"]),
+    headers: Object.keys(hs.harElems["headers"]),
+    queryString: Object.keys(hs.harElems["queryString"]),
+    params: Object.keys(hs.harElems["params"]),
+    mimeTypes: hs.harElems["mimeTypes"],
+  };
+};
+
+onmessage = function(event) {
+  let postProgress = (stage, done, total) => {
+    postMessage({type: "progress", stage: stage, done: done, total: total});
+  };
+  try {
+    postMessage(sanitizeHar(event.data, postProgress));
+  } catch(err) {
+    postMessage({type: "error", message: err.toString()});
+  }
+};
@@ -172,40 +172,86 @@ HarSanitizer.prototype.scrubUrlPass = function() {
   return harJsonRedacted;
 }
 
-HarSanitizer.prototype.redactHar = function(scrublist) {
-  this.harJson = this.scrubUrlPass();
-  let harStrRedacted = this.harStr;
-  let harJsonRedacted = {};
-  let scrubList = this.trimWordlist(scrublist);
-  let scrubListLower = scrubList.map(toLower);
+HarSanitizer.prototype.buildRedactRegexes = function(scrublist) {
+  // Builds one combined regex for the name/value pairs of every name in
+  // scrublist (instead of two regexes per pair), and a set of the pairs for
+  // the case where "value" comes before "name".  Returns null if nothing
+  // needs redacting.
+  let scrubListLower = scrublist.map(toLower);
+  let keyValues = {};
 
   for (let type of Object.keys(this.harElems)) {
+    // mimeTypes is a plain list of types, not a map of names to values
+    if (Array.isArray(this.harElems[type])) {
+      continue;
+    }
     for (let key of Object.keys(this.harElems[type])) {
-      let keyLower = key.toLowerCase();
-      let keyInList = scrubListLower.includes(keyLower);
-      if (keyInList) {
-        for (let value of this.harElems[type][key]) {
-          let valueFormatted = escapeRegExp(value.toString());
-          let regex = ""
-          +"([\"?&;, ]{1}" + key + "){1}(?![{}\[\]])"
-          +"(\",\"value\":\"|=){1}"
-          +"(" + valueFormatted + "){1}"
-          +"(\",|\"}|\"]|;|&){1}";
-          let redacted = "$1$2[" + key + " redacted]$4";
-          let re = new RegExp(regex, "g");
-          harStrRedacted = harStrRedacted.replace(re, redacted);
-          // key/value order flipped regex
-          let regexBackwards = ""
-          +"(\"value\":\"){1}"
-          +"(" + valueFormatted + "){1}(?![{}\[\]])"
-          +"(\",\"name\":\"" + key + "\"){1}";
-          let redactedBackwards = "$1[" + key + " redacted]$3";
-          let reBackwards = new RegExp(regexBackwards, "g");
-          harStrRedacted = harStrRedacted.replace(reBackwards, redactedBackwards);
-        }
+      if (scrubListLower.includes(key.toLowerCase())) {
+        keyValues[key] = (keyValues[key] || []).concat(
+          this.harElems[type][key].map((value) => value.toString()));
       }
     }
   }
-  harJsonRedacted = JSON.parse(harStrRedacted);
-  return harJsonRedacted;
+  // Longest first, so a name that prefixes another name never shadows it
+  let keys = Object.keys(keyValues).sort((a, b) => b.length - a.length);
+  if (keys.length == 0) {
+    return null;
+  }
+
+  // Values are only tried after their name matched
+  let forwardAlts = keys.map((key) => {
+    return escapeRegExp(key) + "(?![{}\\[\\]])(?:\",\"value\":\"|=)(?:"
+      + keyValues[key].map(escapeRegExp).join("|") + ")";
+  });
+  let backwardPairs = new Set();
+  for (let key of keys) {
+    for (let value of keyValues[key]) {
+      backwardPairs.add(key + "\u0000" + value);
+    }
+  }
+  return {
+    keys: keys,
+    // The terminator is a lookahead so that it can also start the next match
+    forward: new RegExp(
+      "([\"?&;, ])(" + forwardAlts.join("|") + ")(?=\",|\"}|\"]|;|&)", "g"),
+    // Any "value" string followed by one of the names, checked against
+    // backwardPairs in redactWith()
+    backward: new RegExp(
+      "(\"value\":\")((?:[^\"\\\\]|\\\\.)*)(?![{}\\[\\]])(\",\"name\":\"(?:"
+      + keys.map(escapeRegExp).join("|") + ")\")", "g"),
+    backwardPairs: backwardPairs,
+  };
+}
+
+HarSanitizer.prototype.redactWith = function(regexes) {
+  // Redacts this.harJson with regexes from buildRedactRegexes()
+  this.harJson = this.scrubUrlPass();
+  if (regexes === null) {
+    return this.harJson;
+  }
+  let nameSeparators = ["\",\"value\":\"", "="];
+  let backwardSeparator = "\",\"name\":\"";
+
+  let harStrRedacted = this.harStr.replace(regexes.forward, (match, delim, pair) => {
+    for (let key of regexes.keys) {
+      for (let separator of nameSeparators) {
+        if (pair.startsWith(key + separator)) {
+          return delim + key + separator + "[" + key + " redacted]";
+        }
+      }
+    }
+    return match;
+  });
+  harStrRedacted = harStrRedacted.replace(regexes.backward, (match, prefix, value, name) => {
+    let key = name.slice(backwardSeparator.length, -1);
+    if (!regexes.backwardPairs.has(key + "\u0000" + value)) {
+      return match;
+    }
+    return prefix + "[" + key + " redacted]" + name;
+  });
+  return JSON.parse(harStrRedacted);
+}
+
+HarSanitizer.prototype.redactHar = function(scrublist) {
+  return this.redactWith(this.buildRedactRegexes(scrublist));
 }
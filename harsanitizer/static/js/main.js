@@ -51,6 +51,13 @@ var defaultContentList = [
     "text/xml",
 ];
 
+// Entries per preview page
+var previewPageSize = 20;
+
+// Scripts are loaded into the Web Worker from the same place as main.js,
+// which may be a remote static folder.
+var scriptBaseUrl = document.currentScript.src.replace(/[^\/]*$/, "");
+
 var destroyClickedElement = function(event) {
   document.body.removeChild(event.target);
 };
@@ -85,6 +92,9 @@ var hsweb = function() {
 
   this.previewBody = $("#preview-body");
   this.previewText = $("#preview-text");
+  this.previewRange = $("#preview-range");
+  this.scrubProgress = $("#scrub-progress");
+  this.worker = null;
 
   this.initVars();
   this.clickActionBehavior();
@@ -108,6 +118,8 @@ hsweb.prototype.initVars = function() {
   this.formChanged = false;
   this.hs = null;
   this.harElems = {};
+  this.previewEntries = null;
+  this.previewStart = 0;
 };
 
 hsweb.prototype.clickActionBehavior = function() {
@@ -121,6 +133,14 @@ hsweb.prototype.clickActionBehavior = function() {
   this.exportButton.click(this.onExportButtonClicked.bind(this));
   this.previewBackButton = $("#preview-back");
   this.previewBackButton.click(this.hidePreview.bind(this));
+  this.previewPrevButton = $("#preview-prev");
+  this.previewPrevButton.click(() => {
+    this.showPreviewPage(Math.max(0, this.previewStart - previewPageSize));
+  });
+  this.previewNextButton = $("#preview-next");
+  this.previewNextButton.click(() => {
+    this.showPreviewPage(this.previewStart + previewPageSize);
+  });
 };
 
 hsweb.prototype.applyChangesDiag = function(callback) {
@@ -139,8 +159,7 @@ hsweb.prototype.applyChangesDiag = function(callback) {
 
 hsweb.prototype.onPreviewButtonClicked = function(event) {
   var callback = () => {
-    var content = this.harStr;
-    this.showPreview(content);
+    this.showPreviewPage(0);
   };
   if (this.formChanged) {
     // Callback would be permanently set after the 1st time if
@@ -206,19 +225,9 @@ hsweb.prototype.onFileAdded = function(event) {
 };
 
 hsweb.prototype.loadFile = function(reader, filename) {
+  // The file is parsed and checked to be a HAR by the worker, which replies
+  // "invalid" if it is not (see scrubHar)
   var fileText = reader.result;
-  try {
-    var harJson = JSON.parse(fileText);
-    if (!(harJson["log"]["entries"].length >= 1)) {
-      throw("Invalid HAR JSON");
-    }
-  } catch(err) {
-    this.disableElements();
-    this.tabsSpinner.removeClass("is-active");
-    componentHandler.upgradeDom();
-    alert("File not a valid HAR JSON");
-    return;
-  }
   this.initVars();
   this.disableElements();
   this.originalHarText = fileText;
@@ -228,147 +237,97 @@ hsweb.prototype.loadFile = function(reader, filename) {
     element.MaterialCheckbox.uncheck();
     element.MaterialCheckbox.updateClasses_();
   });
-  this.scrubHar(harJson, [], []).done(() => {
+  this.scrubHar(fileText, [], []).done(() => {
     this.onLoadedHarData();
   });
 };
 
-hsweb.prototype.scrubHar = function(harJson, wordlist, contentlist) {
+hsweb.prototype.createWorker = function() {
+  // A Blob worker can load scripts from a remote static folder, which a
+  // worker created directly from a cross-origin URL cannot.
+  let source = "importScripts("
+    + JSON.stringify(scriptBaseUrl + "harsanitizer.js") + ", "
+    + JSON.stringify(scriptBaseUrl + "harsanitizer-worker.js") + ");";
+  let blob = new Blob([source], {type: "application/javascript"});
+  return new Worker(window.URL.createObjectURL(blob));
+};
+
+hsweb.prototype.showProgress = function(stage, done, total) {
+  // Both worker stages ("collect", "redact") take half of the bar
+  let percent = 50 * done / total + (stage == "redact" ? 50 : 0);
+  let progress = this.scrubProgress.get(0);
+  if (progress && progress.MaterialProgress) {
+    progress.MaterialProgress.setProgress(percent);
+  }
+};
+
+hsweb.prototype.scrubHar = function(harText, wordlist, contentlist) {
+  // Parsing, name collection and redaction all run in a Web Worker, which
+  // processes the HAR in chunks of entries and reports progress.
   var deferred = $.Deferred();
   var self = this;
-  let hs = new HarSanitizer(harJson);
   let contentListConcat = self.defaultContentList.concat(contentlist);
   let wordListConcat = self.defaultWordList.concat(wordlist);
   // Remove duplicate list entries
   self.wordList = [...new Set(wordListConcat)];
   self.contentList = [...new Set(contentListConcat)];
 
-  var scrubMimeTypes = (self, hs) => {
-    let mimeDeferred = $.Deferred();
-    // setTimeout used throughout to make expensive functions run async
-    setTimeout((self, hs, mimeDeferred) => {
-      hs.harJson = hs.scrubMimeTypes(self.contentList);
-      mimeDeferred.resolve();
-    }, 400, self, hs, mimeDeferred);
-    return mimeDeferred.promise();
+  var onFail = (message, alertText) => {
+    console.log("scrubHar() failed: ", message);
+    self.worker.terminate();
+    self.worker = null;
+    self.scrubProgress.hide();
+    self.disableElements();
+    self.tabsSpinner.removeClass("is-active");
+    deferred.reject();
+    componentHandler.upgradeDom();
+    alert(alertText || "Error submitting HAR.  Please contact support.");
   };
 
-  $.when(
-      scrubMimeTypes(self, hs),
-      self.getHarData(hs),
-    ).then(() => {
-      let redactDeferred = $.Deferred();
-      setTimeout((self, hs, redactDeferred) => {
-        hs.harJson = hs.redactHar(self.wordList);
-        redactDeferred.resolve();
-      }, 400, self, hs, redactDeferred);
-    return redactDeferred.promise();
-  }).then(() => {
-      self.harJson = hs.harJson;
-      self.harStr = JSON.stringify(self.harJson, null, 2);
+  if (self.worker !== null) {
+    self.worker.terminate();
+  }
+  self.worker = self.createWorker();
+  self.worker.onmessage = (event) => {
+    let message = event.data;
+    if (message.type == "progress") {
+      self.showProgress(message.stage, message.done, message.total);
+    } else if (message.type == "done") {
+      self.worker.terminate();
+      self.worker = null;
+      self.scrubProgress.hide();
+      self.cookies = message.cookies;
+      self.headers = message.headers;
+      self.urlparams = message.queryString;
+      self.postparams = message.params;
+      // Combine self.urlparams and self.postparams to self.params
+      self.params = self.urlparams.concat(self.postparams);
+      self.mimetypes = message.mimeTypes;
+      self.harStr = message.harStr;
+      // Preview pages were cut from the previous result
+      self.previewEntries = null;
       self.formChanged = false;
       deferred.resolve();
-  }).fail(() => {
-      console.log("scrubHar() failed");
-      self.disableElements();
-      self.tabsSpinner.removeClass("is-active");
-      deferred.reject();
-      componentHandler.upgradeDom();
-      alert("Error submitting HAR.  Please contact support.");
+    } else if (message.type == "invalid") {
+      onFail(message.message, "File not a valid HAR JSON");
+    } else {
+      onFail(message.message);
+    }
+  };
+  self.worker.onerror = (event) => {
+    onFail(event.message);
+  };
+
+  self.showProgress("collect", 0, 1);
+  self.scrubProgress.show();
+  self.worker.postMessage({
+    harText: harText,
+    wordList: self.wordList,
+    contentList: self.contentList,
   });
   return deferred.promise();
 };
 
-hsweb.prototype.getHarData = function (hs) {
-  var deferred = $.Deferred();
-  var self = this;
-
-  var getCookies = (self) => {
-    let getDeferred = $.Deferred();
-    setTimeout((self, hs, getDeferred) => {
-      try {
-        self.cookies = Object.keys(hs.getTypeNames("cookies"));
-        getDeferred.resolve();
-      } catch(err) {
-        console.log("Error getting HarType: ", err);
-        getDeferred.reject();
-      }
-    }, 400, self, hs, getDeferred);
-    return getDeferred.promise();
-  };
-  var getHeaders = (self) => {
-    let getDeferred = $.Deferred();
-    setTimeout((self, hs, getDeferred) => {
-      try {
-        self.headers = Object.keys(hs.getTypeNames("headers"));
-        getDeferred.resolve();
-      } catch(err) {
-        console.log("Error getting HarType: ", err);
-        getDeferred.reject();
-      }
-    }, 400, self, hs, getDeferred);
-    return getDeferred.promise();
-  };
-  var getUrlparams = (self) => {
-    let getDeferred = $.Deferred();
-    setTimeout((self, hs, getDeferred) => {
-      try {
-        self.urlparams = Object.keys(hs.getTypeNames("queryString"));
-        getDeferred.resolve();
-      } catch(err) {
-        console.log("Error getting HarType: ", err);
-        getDeferred.reject();
-      }
-    }, 400, self, hs, getDeferred);
-    return getDeferred.promise();
-  };
-  var getPostparams = (self) => {
-    let getDeferred = $.Deferred();
-    setTimeout((self, hs, getDeferred) => {
-      try {
-        self.postparams = Object.keys(hs.getTypeNames("params"));
-        getDeferred.resolve();
-      } catch(err) {
-        console.log("Error getting HarType: ", err);
-        getDeferred.reject();
-      }
-    }, 400, self, hs, getDeferred);
-    return getDeferred.promise();
-  };
-  var getMimetypes = (self) => {
-    let getDeferred = $.Deferred();
-    setTimeout((self, hs, getDeferred) => {
-      try {
-        self.mimetypes = hs.getMimeTypes();
-        getDeferred.resolve();
-      } catch(err) {
-        console.log("Error getting HarType: ", err);
-        getDeferred.reject();
-      }
-    }, 400, self, hs, getDeferred);
-    return getDeferred.promise();
-  };
-  $.when(
-    getCookies(self),
-    getHeaders(self),
-    getUrlparams(self),
-    getPostparams(self),
-    getMimetypes(self)).then(() => {
-      // Combine self.urlparams and self.postparams to self.params
-      try {
-        self.params = self.urlparams.concat(self.postparams);
-      } catch(err) {
-        console.log("Error assigning self.params: ", err);
-        deferred.reject();
-      }
-      deferred.resolve();
-      }).fail(() => {
-        console.log("Error getting harElems.");
-        deferred.reject();
-      });
-    return deferred.promise();
-  };
-
 hsweb.prototype.onLoadedHarData = function() {
   // Populate tables with Har's type [cookies | headers | params | mimetypes] names
   let typesTable = {
@@ -465,7 +424,6 @@ hsweb.prototype.onScrubButtonClicked = function(event) {
   this.disableElements();
   this.wordList = [];
   this.contentList = [];
-  this.harJson = JSON.parse(this.originalHarText);
   componentHandler.upgradeDom();
   // Populate lists
   $.each(['cookies', 'headers', 'params', 'mimetypes'], (index, type) => {
@@ -485,7 +443,7 @@ hsweb.prototype.onScrubButtonClicked = function(event) {
     });
   });
   // Run the scrub
-  this.scrubHar(this.harJson, this.wordList, this.contentList).done(() => {
+  this.scrubHar(this.originalHarText, this.wordList, this.contentList).done(() => {
     this.onLoadedHarData();
     deferred.resolve();
   });
@@ -512,6 +470,23 @@ hsweb.prototype.enableElements = function() {
   componentHandler.upgradeDom();
 };
 
+hsweb.prototype.showPreviewPage = function(start) {
+  // Pages are cut from the worker's sanitized HAR, the same bytes Export
+  // downloads, so only one page of entries is rendered at a time.
+  if (this.previewEntries === null) {
+    this.previewEntries = JSON.parse(this.harStr)["log"]["entries"];
+  }
+  let total = this.previewEntries.length;
+  let entries = this.previewEntries.slice(start, start + previewPageSize);
+  let stop = start + entries.length;
+  this.previewStart = start;
+  this.previewRange.text(
+    "Entries " + (total ? start + 1 : 0) + "-" + stop + " of " + total);
+  this.previewPrevButton.prop("disabled", start == 0);
+  this.previewNextButton.prop("disabled", stop >= total);
+  this.showPreview(JSON.stringify(entries, null, 2));
+};
+
 hsweb.prototype.showPreview = function(content) {
   this.pageContent.hide("medium");
   this.previewButton.hide("medium");
@@ -526,6 +501,7 @@ hsweb.prototype.hidePreview = function() {
   this.previewBackButton.hide('medium');
   this.previewBody.hide('medium');
   this.previewText.text('');
+  this.previewRange.text('');
   this.pageContent.show('medium').css('display', 'flex');
   this.previewButton.show("medium").css('display', 'flex');
   this.scrubButton.show("medium").css('display', 'flex');
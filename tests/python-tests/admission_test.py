@@ -0,0 +1,141 @@
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#    http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+import pytest
+
+from harsanitizer import harsan_api
+from harsanitizer.admission import AdmissionController, Rejected
+
+def test_AdmissionController_acquire_release():
+  """Test in-flight bytes/requests are tracked and released"""
+  controller = AdmissionController(
+    max_request_bytes=100, max_inflight_bytes=150, max_concurrent=2)
+  ticket = controller.acquire(60)
+  assert controller.inflight_bytes == 60
+  assert controller.inflight_requests == 1
+  controller.release(ticket)
+  stats = controller.stats()
+
+  assert stats["inflight_bytes"] == 0
+  assert stats["inflight_requests"] == 0
+  assert stats["peak_inflight_bytes"] == 60
+  assert stats["counts"]["admitted"] == 1
+  assert stats["request_size_histogram"]["le_65536"] == 1
+
+@pytest.mark.parametrize("max_request_bytes, size", [
+  (100, 101),
+  (200, 151)
+])
+def test_AdmissionController_too_large(max_request_bytes, size):
+  """Test requests over the size limit or byte budget are rejected with 413"""
+  controller = AdmissionController(
+    max_request_bytes=max_request_bytes, max_inflight_bytes=150,
+    max_concurrent=2)
+  with pytest.raises(Rejected) as excinfo:
+    controller.acquire(size)
+  assert excinfo.value.status == 413
+  assert controller.stats()["counts"]["rejected_too_large"] == 1
+
+@pytest.mark.parametrize("sizes", [
+  ([10, 10, 10]),
+  ([90, 90])
+])
+def test_AdmissionController_busy(sizes):
+  """Test 503 once the concurrency cap or in-flight byte budget is reached"""
+  controller = AdmissionController(
+    max_request_bytes=100, max_inflight_bytes=150, max_concurrent=2,
+    queue_timeout=0.01, retry_after=7)
+  for size in sizes[:-1]:
+    controller.acquire(size)
+  with pytest.raises(Rejected) as excinfo:
+    controller.acquire(sizes[-1])
+  assert excinfo.value.status == 503
+  assert excinfo.value.retry_after == 7
+  assert controller.stats()["counts"]["rejected_busy"] == 1
+
+def test_AdmissionController_hold():
+  """Test held bytes count against the in-flight budget up to max_held_bytes"""
+  controller = AdmissionController(
+    max_request_bytes=100, max_inflight_bytes=150, max_concurrent=2,
+    queue_timeout=0.01)
+  assert controller.max_held_bytes == 50
+  held = controller.hold(40)
+  with pytest.raises(Rejected) as excinfo:
+    controller.hold(20)
+  assert excinfo.value.status == 413
+  ticket = controller.acquire(50)
+  with pytest.raises(Rejected) as excinfo:
+    controller.acquire(100)
+  assert excinfo.value.status == 503
+  controller.unhold(held)
+
+  controller.release(controller.acquire(100))
+  controller.release(ticket)
+  assert controller.stats()["held_bytes"] == 0
+
+@pytest.fixture
+def controller():
+  """Small AdmissionController installed in the Flask app"""
+  harsan_api.ADMISSION = AdmissionController(
+    max_request_bytes=2000, max_inflight_bytes=4000, max_concurrent=1,
+    queue_timeout=0.01, retry_after=3)
+  harsan_api.app.config["MAX_CONTENT_LENGTH"] = 2000
+  yield harsan_api.ADMISSION
+  harsan_api.ADMISSION = None
+  harsan_api.app.config["MAX_CONTENT_LENGTH"] = None
+
+def post_cookies(har):
+  """POSTs [har] to /cookies with the Flask test client"""
+  return harsan_api.app.test_client().post(
+    "/cookies",
+    data=json.dumps(har),
+    headers={"Content-Type": "application/json", "Accept": "application/json"})
+
+def test_POST_admitted(controller, sample_har):
+  """Test a request within the limits is admitted and released"""
+  response = post_cookies(sample_har)
+
+  assert response.status_code == 200
+  assert json.loads(response.data.decode("utf8")) == ["cookie_a"]
+  assert controller.inflight_requests == 0
+  assert controller.stats()["counts"]["admitted"] == 1
+
+def test_POST_too_large(controller, sample_har):
+  """Test API returns 413 for a body over max_request_bytes"""
+  sample_har["log"]["comment"] = "x" * 2000
+  response = post_cookies(sample_har)
+
+  assert response.status_code == 413
+  assert "message" in json.loads(response.data.decode("utf8"))
+
+def test_POST_busy(controller, sample_har):
+  """Test API returns 503 with Retry-After while at capacity"""
+  ticket = controller.acquire(10)
+  response = post_cookies(sample_har)
+  controller.release(ticket)
+
+  assert response.status_code == 503
+  assert response.headers["Retry-After"] == "3"
+
+def test_GET_metrics(controller):
+  """Test API /metrics returns the admission stats"""
+  response = harsan_api.app.test_client().get("/metrics")
+  data = json.loads(response.data.decode("utf8"))
+
+  assert response.status_code == 200
+  assert data["admission"]["limits"]["max_concurrent"] == 1
+  assert "process_peak_rss_bytes" in data["admission"]
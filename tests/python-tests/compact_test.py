@@ -0,0 +1,69 @@
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#    http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from collections import OrderedDict
+
+import pytest
+
+from harsanitizer import compact
+from harsanitizer.harsanitizer import Har, HarSanitizer
+from harsanitizer.hargen import gen_har
+
+def test_loads_dumps_identical():
+  """Test compact objects serialize to the same json as the input"""
+  har_str = json.dumps(gen_har(entries=20, seed=3))
+  har_dict = compact.loads(har_str)
+  assert isinstance(har_dict, compact.CompactDict)
+  assert compact.dumps(har_dict) == json.dumps(
+      json.loads(har_str, object_pairs_hook=OrderedDict))
+
+def test_CompactDict_mapping():
+  """Test CompactDict behaves as an ordered dict sharing its keys"""
+  first = compact.loads('{"a": 1, "b": "x"}')
+  second = compact.loads('{"a": 2, "b": "y"}')
+  assert first._shape is second._shape
+  assert isinstance(first["b"], str)
+  first["c"] = [1]
+  del first["a"]
+  assert list(first) == ["b", "c"]
+  assert dict(first) == {"b": "x", "c": [1]}
+  assert "a" not in first and len(first) == 2
+  with pytest.raises(KeyError):
+    first["a"]
+
+def test_NameValue_mapping():
+  """Test name/value pairs are stored as NameValue, keeping extra keys"""
+  pair = compact.loads('{"name": "session", "value": "abc"}')
+  assert isinstance(pair, compact.NameValue)
+  assert pair["name"] == "session" and pair.value == "abc"
+  pair["comment"] = "c"
+  assert list(pair.items()) == [
+      ("name", "session"), ("value", "abc"), ("comment", "c")]
+  del pair["value"]
+  assert "value" not in pair and len(pair) == 2
+  with pytest.raises(KeyError):
+    del pair["value"]
+  cookie = compact.loads('{"name": "a", "value": "b", "httpOnly": true}')
+  assert isinstance(cookie, compact.CompactDict)
+
+@pytest.mark.parametrize("engine", sorted(HarSanitizer.engines))
+def test_scrub_compact_matches_dict(engine):
+  """Test scrubbing a compact HAR gives the same output as a dict HAR"""
+  har_str = json.dumps(gen_har(entries=15, seed=1))
+  options = {"all_cookies": True, "all_headers": True, "engine": engine}
+  expected = HarSanitizer().scrub(Har(har=har_str), **options)
+  actual = HarSanitizer().scrub(Har(har=har_str, compact=True), **options)
+  assert actual.har_dict == expected.har_dict
@@ -0,0 +1,120 @@
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#    http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import json
+
+import pytest
+
+from harsanitizer import contentcache, harsan_api
+from harsanitizer.contentcache import ContentCache
+from harsanitizer.harsanitizer import Har, HarSanitizer
+from harsanitizer.hargen import gen_har
+
+BUNDLE = "var cfg = {token=abc;}; // https://u:p@cdn.example.com/app.js " * 100
+
+def gen_bundle_har(seed):
+  """Returns a generated HAR where every 5th response is the same bundle"""
+  har_dict = gen_har(entries=20, seed=seed)
+  for entry in har_dict["log"]["entries"][::5]:
+    entry["response"]["content"].update(
+      {"mimeType": "application/json", "text": BUNDLE})
+  return har_dict
+
+def test_ContentCache_lru():
+  """Test results are evicted least recently used first to fit max_bytes"""
+  cache = ContentCache(max_bytes=10)
+  cache.put("a", "1234")
+  cache.put("b", "5678")
+  assert cache.get("a", 100) == "1234"
+  cache.put("c", "90ab")
+  stats = cache.stats()
+
+  assert cache.get("b", 100) is None
+  assert cache.get("c", 100) == "90ab"
+  assert stats["bytes"] == 8 and stats["evictions"] == 1
+  assert stats["hits"] == 1 and stats["bytes_saved"] == 100
+
+def test_ContentCache_key():
+  """Test keys depend on both the scrub profile and the text"""
+  cache = ContentCache()
+  assert cache.key("p", '"text"') == cache.key("p", u'"text"')
+  assert cache.key("p", '"text"') != cache.key("q", '"text"')
+  assert cache.key("p", '"text"') != cache.key("p", '"other"')
+
+@pytest.mark.parametrize("engine", sorted(HarSanitizer.engines))
+def test_HarSanitizer_scrub_cached(engine):
+  """Test scrubs sharing a cache match uncached scrubs, across HARs"""
+  cache = ContentCache()
+  for seed in [1, 2]:
+    har_dict = gen_bundle_har(seed)
+    expected = HarSanitizer().scrub(
+      Har(har=copy.deepcopy(har_dict)), engine=engine, all_cookies=True,
+      wordlist=["token"])
+
+    hs = HarSanitizer()
+    hs.content_cache = cache
+    har = hs.scrub(
+      Har(har=har_dict), engine=engine, all_cookies=True, wordlist=["token"])
+
+    assert har.har_dict == expected.har_dict
+    assert json.loads(har.har_str) == expected.har_dict
+  stats = cache.stats()
+
+  assert stats["entries"] == 1
+  assert stats["lookups"] == 8 and stats["hits"] == 7
+  assert stats["bytes_saved"] == 7 * len(json.dumps(BUNDLE))
+
+def test_HarSanitizer_scrub_cached_profile():
+  """Test a different wordlist does not reuse cached results"""
+  hs = HarSanitizer()
+  hs.content_cache = ContentCache()
+  hs.scrub(Har(har=gen_bundle_har(1)), wordlist=["cfg"])
+  har = hs.scrub(Har(har=gen_bundle_har(1)))
+
+  text = har.har_dict["log"]["entries"][0]["response"]["content"]["text"]
+  assert "[cfg redacted]" not in text
+  assert hs.content_cache.stats()["hits"] == 6
+
+@pytest.mark.parametrize("engine", sorted(HarSanitizer.engines))
+def test_HarSanitizer_scrub_cached_names(engine):
+  """Test HARs with different cookie names, some non-ASCII, share results"""
+  cache = ContentCache()
+  for seed, name in [(1, "session_a"), (2, u"sessi\xf3n")]:
+    har_dict = gen_bundle_har(seed)
+    har_dict["log"]["entries"][1]["request"]["cookies"].append(
+      {"name": name, "value": "s3cret"})
+    expected = HarSanitizer().scrub(Har(har=copy.deepcopy(har_dict)),
+      engine="reference", all_cookies=True, all_headers=True)
+
+    hs = HarSanitizer()
+    hs.content_cache = cache
+    har = hs.scrub(Har(har=har_dict), engine=engine, all_cookies=True,
+                   all_headers=True)
+
+    assert har.har_dict == expected.har_dict
+  stats = cache.stats()
+
+  assert stats["entries"] == 1
+  assert stats["lookups"] == 8 and stats["hits"] == 7
+
+def test_GET_metrics_content_cache(monkeypatch):
+  """Test API /metrics returns the content cache stats"""
+  monkeypatch.setattr(contentcache, "_configured", {"cache": ContentCache(5)})
+  response = harsan_api.app.test_client().get("/metrics")
+  data = json.loads(response.data.decode("utf8"))
+
+  assert data["content_cache"]["max_bytes"] == 5
+  assert data["content_cache"]["hit_rate"] == 0.0
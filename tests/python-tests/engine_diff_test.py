@@ -0,0 +1,37 @@
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#    http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+from tools import engine_diff
+
+def test_diff_paths():
+  """Test diff_paths() reports the json paths of differing values"""
+  expected = {"log": {"entries": [{"url": "a"}, {"url": "b"}], "version": "1"}}
+  actual = {"log": {"entries": [{"url": "a"}, {"url": "c"}], "comment": ""}}
+
+  assert engine_diff.diff_paths(expected, actual) == [
+    "$.log.comment: unexpected",
+    "$.log.entries[1].url: 'b' != 'c'",
+    "$.log.version: missing"]
+
+def test_run_case(sample_har):
+  """Test run_case() compares every engine for every option set"""
+  engines = sorted(engine_diff.HarSanitizer.engines)
+  cases = engine_diff.run_case("sample", json.dumps(sample_har), engines)
+
+  assert len(cases) == len(engine_diff.OPTION_SETS)
+  assert all(case["engines"][engine]["equal"]
+             for case in cases for engine in engines)
@@ -0,0 +1,140 @@
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#    http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import json
+
+import pytest
+
+from harsanitizer import harsan_cli
+from harsanitizer.harsan_api import app
+from harsanitizer.harsanitizer import Har, HarSanitizer
+from harsanitizer.hargen import gen_har
+from harsanitizer.entryfilter import EntryFilter
+from harsanitizer.preview import PreviewSession
+
+@pytest.mark.parametrize("rule, expected", [
+  ({"host": "*.example.net"}, True),
+  ({"host": "app.example.com"}, False),
+  ({"url": r"/fonts/"}, True),
+  ({"mimeType": "font/*"}, True),
+  ({"status": "2xx"}, True),
+  ({"status": [404, 500]}, False),
+  ({"min_size": 10, "max_size": 100}, True),
+  ({"min_size": 101}, False),
+  ({"host": "*.example.net", "status": 404}, False),
+])
+def test_EntryFilter_matches(rule, expected):
+  """Test every rule condition must match an entry"""
+  entry = {
+    "request": {"url": "https://fonts.example.net/fonts/roboto.woff2"},
+    "response": {
+      "status": 200,
+      "content": {"size": 50, "mimeType": "font/woff2; charset=binary"}}
+  }
+  entry_filter = EntryFilter(include=[rule])
+
+  assert entry_filter.matches(entry_filter.include[0], entry) == expected
+
+@pytest.mark.parametrize("entry_filter", [
+  ({"exclude": [{"nope": 1}]}),
+  ({"include": [{}]}),
+  ({"exclude": [{"url": "("}]}),
+  ({"exclude": [{"host": ["*.example.com"]}]}),
+  ({"include": [{"mimeType": 1}]}),
+  ({"action": "shred"}),
+  ({"exclude": [], "typo": True}),
+])
+def test_EntryFilter_invalid(entry_filter):
+  """Test invalid rules and actions raise ValueError"""
+  with pytest.raises(ValueError):
+    EntryFilter.from_option(entry_filter)
+
+@pytest.mark.parametrize("rule", [
+  ({"host": 1}),
+  ({"mimeType": ["font/*"]}),
+  ({"min_size": "1"}),
+])
+def test_POST_scrub_har_invalid_entry_filter(rule):
+  """Test /scrub_har rejects invalid entry filter rules with a 400"""
+  client = app.test_client()
+  body = json.dumps({"har": gen_har(entries=2), "entry_filter": {"exclude": [rule]}})
+  response = client.post("/scrub_har", data=body, headers={
+    "Content-Type": "application/json", "Accept": "application/json"})
+
+  assert response.status_code == 400
+
+def test_HarSanitizer_scrub_entry_filter():
+  """Test scrub() with entry_filter equals scrubbing only the kept entries"""
+  har_dict = gen_har(entries=40, seed=11)
+  entry_filter = {
+    "include": [{"host": "*.example.com"}],
+    "exclude": [{"mimeType": "image/*"}]}
+  kept = copy.deepcopy(har_dict)
+  kept["log"]["entries"] = [
+    entry for entry in kept["log"]["entries"]
+    if ".example.com" in entry["request"]["headers"][0]["value"]
+    and entry["response"]["content"]["mimeType"] != "image/gif"]
+  expected = HarSanitizer().scrub(Har(har=kept), all_cookies=True)
+
+  hs = HarSanitizer()
+  har = hs.scrub(Har(har=har_dict), all_cookies=True, entry_filter=entry_filter)
+
+  assert har.har_dict == expected.har_dict
+  assert hs.filter_stats["kept"] == len(kept["log"]["entries"])
+  assert hs.filter_stats["dropped"] == 40 - len(kept["log"]["entries"])
+
+def test_HarSanitizer_scrub_entry_filter_metadata():
+  """Test excluded entries reduced to metadata keep no cookies or bodies"""
+  har_dict = gen_har(entries=10, body_size=256, seed=2)
+  har = HarSanitizer().scrub(
+    Har(har=har_dict),
+    entry_filter={"include": [{"status": 999}], "action": "metadata"})
+
+  for entry in har.har_dict["log"]["entries"]:
+    assert set(entry["request"]) == set(["method", "url", "httpVersion"])
+    assert set(entry["response"]["content"]) == set(["size", "mimeType"])
+
+def test_HarSanitizer_scrub_entry_filter_metadata_url(sample_har):
+  """Test the URL of an entry reduced to metadata keeps no query secrets"""
+  font = copy.deepcopy(sample_har["log"]["entries"][0])
+  font["request"]["url"] = "https://user:pw@cdn.example.net/x?sid=SECRET&a=1#t=2"
+  font["request"]["queryString"] = [
+    {"name": "sid", "value": "SECRET"}, {"name": "a", "value": "1"}]
+  font["response"]["content"]["mimeType"] = "font/woff2"
+  har_dict = {"log": {"entries": [sample_har["log"]["entries"][0], font]}}
+  entry_filter = {"exclude": [{"mimeType": "font/*"}], "action": "metadata"}
+
+  scrub_kwargs = {"all_params": True, "entry_filter": entry_filter}
+
+  har = HarSanitizer().scrub(Har(har=copy.deepcopy(har_dict)), **scrub_kwargs)
+  page = PreviewSession(har_dict, scrub_kwargs).page(0, 2)
+
+  assert har.har_dict["log"]["entries"][1]["request"]["url"] == (
+    "https://cdn.example.net/x")
+  assert page["entries"] == har.har_dict["log"]["entries"]
+  assert "SECRET" not in json.dumps(har.har_dict)
+  assert "pw@" not in json.dumps(har.har_dict)
+
+def test_cli_filter_rules():
+  """Test --include/--exclude parse into the scrub() entry_filter option"""
+  args = harsan_cli.parse_args([
+    "in.har", "--exclude", "host=*.example.net", "--exclude", "status=404",
+    "--include", "status=2xx", "--filtered-entries", "metadata"])
+
+  assert harsan_cli.scrub_kwargs(args)["entry_filter"] == {
+    "include": [{"status": "2xx"}],
+    "exclude": [{"host": "*.example.net"}, {"status": 404}],
+    "action": "metadata"}
@@ -0,0 +1,63 @@
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#    http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+from harsanitizer import harsan_cli
+
+def test_cli_main(tmpdir, sample_har):
+  """Test harsan_cli.main() scrubs a HAR file to --output"""
+  har_path = str(tmpdir.join("in.har"))
+  out_path = str(tmpdir.join("out.har"))
+  with open(har_path, "w") as har_file:
+    json.dump(sample_har, har_file)
+
+  assert harsan_cli.main([har_path, "-o", out_path, "--all-cookies"]) == 0
+
+  with open(out_path, "r") as out_file:
+    result = json.load(out_file)
+  cookies = result["log"]["entries"][0]["request"]["cookies"]
+  assert cookies[0]["value"] == "[cookie_a redacted]"
+
+def test_cli_main_profile(tmpdir, sample_har):
+  """Test harsan_cli.main() --profile writes a json report"""
+  har_path = str(tmpdir.join("in.har"))
+  report_path = str(tmpdir.join("profile.json"))
+  with open(har_path, "w") as har_file:
+    json.dump(sample_har, har_file)
+
+  assert harsan_cli.main(
+    [har_path, "-o", str(tmpdir.join("out.har")), "--profile", report_path]) == 0
+
+  with open(report_path, "r") as report_file:
+    report = json.load(report_file)
+  assert set(report) == set(
+    ["total_seconds", "memory_source", "stages", "functions", "patterns",
+     "scan"])
+
+def test_cli_main_time_budget(tmpdir, sample_har, capsys):
+  """Test harsan_cli.main() --time-budget falls back to degraded mode"""
+  har_path = str(tmpdir.join("in.har"))
+  out_path = str(tmpdir.join("out.har"))
+  with open(har_path, "w") as har_file:
+    json.dump(sample_har, har_file)
+
+  assert harsan_cli.main([har_path, "-o", out_path, "--time-budget", "0"]) == 0
+
+  with open(out_path, "r") as out_file:
+    result = json.load(out_file)
+  headers = result["log"]["entries"][0]["request"]["headers"]
+  assert headers[1]["value"] == "[header_a redacted]"
+  assert "degraded mode" in capsys.readouterr().err
@@ -0,0 +1,57 @@
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#    http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+
+import pytest
+
+from harsanitizer.harsanitizer import Har, HarSanitizer
+from harsanitizer.harsan_pool import ScrubPool, stream_file
+
+@pytest.fixture
+def pool():
+  """Two process ScrubPool pytest fixture"""
+  scrub_pool = ScrubPool(processes=2)
+  yield scrub_pool
+  scrub_pool.close()
+
+def test_ScrubPool_scrub(pool, sample_har):
+  """Test ScrubPool.scrub() matches an in-process HarSanitizer.scrub()"""
+  body = json.dumps({"har": sample_har, "all_cookies": True})
+  expected = HarSanitizer().scrub(Har(har=sample_har), all_cookies=True)
+
+  out_path, degraded = pool.scrub(body)
+  result = json.loads("".join(stream_file(out_path)))
+
+  assert result == expected.har_dict
+  assert not degraded
+  assert not os.path.exists(out_path)
+
+def test_ScrubPool_scrub_degraded(pool, sample_har):
+  """Test ScrubPool.scrub() reports scrubs that ran out of time"""
+  body = json.dumps({"har": sample_har, "time_budget": 0})
+  expected = HarSanitizer().scrub_degraded(Har(har=sample_har))
+
+  out_path, degraded = pool.scrub(body)
+  result = json.loads("".join(stream_file(out_path)))
+
+  assert degraded
+  assert result == expected.har_dict
+
+def test_ScrubPool_scrub_invalid(pool):
+  """Test ScrubPool.scrub() raises on an invalid HAR"""
+  with pytest.raises(ValueError):
+    pool.scrub(json.dumps({"har": {"not": "a har"}}))
@@ -0,0 +1,155 @@
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#    http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import json
+
+import pytest
+
+from harsanitizer.harsanitizer import Har, HarSanitizer
+from harsanitizer.hargen import gen_har
+from harsanitizer.incremental import scrub_incremental, checkpoint_path
+from harsanitizer.incremental import collect_inventory
+
+def write_har(path, har_dict, entries):
+  """Writes [har_dict] truncated to its first [entries] entries to [path]"""
+  har_dict = copy.deepcopy(har_dict)
+  har_dict["log"]["entries"] = har_dict["log"]["entries"][:entries]
+  with open(path, "w") as har_file:
+    json.dump(har_dict, har_file)
+  return har_dict
+
+def full_scrub(har_dict, **scrub_kwargs):
+  """Returns the har_dict of a full HarSanitizer.scrub() of [har_dict]"""
+  return HarSanitizer().scrub(
+    Har(har=copy.deepcopy(har_dict)), **scrub_kwargs).har_dict
+
+def read_json(path):
+  with open(path, "r") as json_file:
+    return json.load(json_file)
+
+@pytest.mark.parametrize("scrub_kwargs", [
+  ({}),
+  ({"all_cookies": True, "all_headers": True, "all_params": True}),
+])
+def test_scrub_incremental_growing(tmpdir, scrub_kwargs):
+  """Test scrubbing a growing capture matches full scrubs at every size"""
+  har_path = str(tmpdir.join("capture.har"))
+  out_path = str(tmpdir.join("capture.redacted.har"))
+  har_dict = gen_har(entries=60, seed=7)
+
+  modes = []
+  for entries in [20, 45, 45, 60]:
+    written = write_har(har_path, har_dict, entries)
+    stats = scrub_incremental(har_path, out_path, **scrub_kwargs)
+    modes.append(stats["mode"])
+    assert read_json(out_path) == full_scrub(written, **scrub_kwargs)
+
+  assert modes == ["full", "incremental", "unchanged", "incremental"]
+  assert read_json(checkpoint_path(out_path))["entries"] == 60
+
+def test_scrub_incremental_new_name(tmpdir, sample_har):
+  """Test a new cookie name found in earlier entries forces a full rescrub"""
+  har_path = str(tmpdir.join("capture.har"))
+  out_path = str(tmpdir.join("capture.redacted.har"))
+  first = copy.deepcopy(sample_har["log"]["entries"][0])
+  first["request"]["url"] = "https://example.com/?late_cookie=s3cr3t"
+  second = copy.deepcopy(sample_har["log"]["entries"][0])
+  second["request"]["cookies"] = [{"name": "late_cookie", "value": "v"}]
+  har_dict = {"log": {"entries": [first, second]}}
+
+  write_har(har_path, har_dict, 1)
+  scrub_incremental(har_path, out_path, all_cookies=True)
+  write_har(har_path, har_dict, 2)
+  stats = scrub_incremental(har_path, out_path, all_cookies=True)
+
+  assert stats["mode"] == "full"
+  assert stats["reason"] == "new names found in earlier entries"
+  assert read_json(out_path) == full_scrub(har_dict, all_cookies=True)
+
+@pytest.mark.parametrize("early_name", [True, False])
+def test_scrub_incremental_regex_name(tmpdir, sample_har, early_name):
+  """Test a cookie name with regex metacharacters forces a full rescrub, in
+  entries before or after the one holding it"""
+  har_path = str(tmpdir.join("capture.har"))
+  out_path = str(tmpdir.join("capture.redacted.har"))
+  named = copy.deepcopy(sample_har["log"]["entries"][0])
+  named["request"]["cookies"] = [{"name": "a.b", "value": "v"}]
+  matched = copy.deepcopy(sample_har["log"]["entries"][0])
+  matched["request"]["url"] = "https://example.com/?aXb=SECRET&z=1"
+  entries = [named, matched] if early_name else [matched, named]
+  har_dict = {"log": {"entries": entries}}
+
+  write_har(har_path, har_dict, 1)
+  scrub_incremental(har_path, out_path, all_cookies=True)
+  write_har(har_path, har_dict, 2)
+  stats = scrub_incremental(har_path, out_path, all_cookies=True)
+  expected = full_scrub(har_dict, all_cookies=True)
+
+  assert stats["mode"] == "full"
+  assert stats["reason"] == "regex words in wordlist"
+  assert read_json(out_path) == expected
+  assert "aXb=[a.b redacted]" in json.dumps(expected)
+
+def test_scrub_incremental_options_changed(tmpdir):
+  """Test changed scrub options force a full rescrub"""
+  har_path = str(tmpdir.join("capture.har"))
+  out_path = str(tmpdir.join("capture.redacted.har"))
+  write_har(har_path, gen_har(entries=5), 5)
+
+  scrub_incremental(har_path, out_path)
+  stats = scrub_incremental(har_path, out_path, all_headers=True)
+
+  assert stats["mode"] == "full"
+  assert stats["reason"] == "scrub options changed"
+
+def test_scrub_incremental_filtered_out(tmpdir):
+  """Test new entries all dropped by the entry filter leave the output as is"""
+  har_path = str(tmpdir.join("capture.har"))
+  out_path = str(tmpdir.join("capture.redacted.har"))
+  har_dict = gen_har(entries=10, seed=4)
+  for entry in har_dict["log"]["entries"][5:]:
+    entry["response"]["content"]["mimeType"] = "font/woff2"
+  scrub_kwargs = {"entry_filter": {"exclude": [{"mimeType": "font/*"}]}}
+
+  write_har(har_path, har_dict, 5)
+  scrub_incremental(har_path, out_path, **scrub_kwargs)
+  written = write_har(har_path, har_dict, 10)
+  stats = scrub_incremental(har_path, out_path, **scrub_kwargs)
+
+  assert stats["mode"] == "incremental"
+  assert stats["scrubbed_entries"] == 0
+  assert read_json(out_path) == full_scrub(written, **scrub_kwargs)
+  assert read_json(checkpoint_path(out_path))["entries"] == 10
+
+def test_collect_inventory(sample_har):
+  """Test collect_inventory() finds the names get_hartype_names() finds"""
+  har_dict = gen_har(entries=10, seed=5)
+  har_dict["log"]["entries"].append(sample_har["log"]["entries"][0])
+  har_dict["log"]["entries"][0]["request"]["headers"].append(
+    {"name": "X-Nested", "value": "", "cookies": [{"name": "nested"}]})
+  hs = HarSanitizer()
+  expected = dict(
+    (hartype, sorted(hs.get_hartype_names(
+      Har(har=copy.deepcopy(har_dict)), hartype).keys()))
+    for hartype in hs.valid_hartypes)
+
+  inventory = collect_inventory(hs, har_dict["log"]["entries"])
+
+  assert inventory == expected
+  assert "nested" in inventory["cookies"]
+  assert collect_inventory(
+    hs, har_dict["log"]["entries"], hartypes=["cookies"]) == {
+      "cookies": expected["cookies"]}
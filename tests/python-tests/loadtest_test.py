@@ -0,0 +1,45 @@
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#    http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+
+import pytest
+
+from tools import loadtest
+
+@pytest.mark.parametrize("percent, expected", [
+  (50, 5),
+  (95, 10),
+  (99, 10),
+  (10, 1),
+])
+def test_percentile(percent, expected):
+  """Test nearest-rank percentiles"""
+  assert loadtest.percentile(range(1, 11), percent) == expected
+
+def test_parse_mix():
+  """Test endpoint mixes parse, and unknown endpoints are rejected"""
+  assert loadtest.parse_mix("cookies=2,scrub_har") == [
+    ("cookies", 2), ("scrub_har", 1)]
+  with pytest.raises(argparse.ArgumentTypeError):
+    loadtest.parse_mix("nope=1")
+
+def test_gen_schedule_stable():
+  """Test the same seed always gives the same request schedule"""
+  mix = loadtest.parse_mix(loadtest.DEFAULT_MIX)
+  schedule = loadtest.gen_schedule(mix, [10, 100], 50, seed=4)
+
+  assert schedule == loadtest.gen_schedule(mix, [10, 100], 50, seed=4)
+  assert set(name for name, _ in schedule) <= set(loadtest.ENDPOINTS)
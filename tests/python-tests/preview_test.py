@@ -0,0 +1,211 @@
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#    http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import json
+
+import pytest
+
+from harsanitizer import harsan_api, incremental, preview
+from harsanitizer.admission import AdmissionController, Rejected
+from harsanitizer.harsanitizer import Har, HarSanitizer
+from harsanitizer.hargen import gen_har
+from harsanitizer.preview import PreviewSession, PreviewStore
+
+@pytest.mark.parametrize("scrub_kwargs", [
+  ({}),
+  ({"all_cookies": True, "all_headers": True, "all_params": True}),
+  ({"all_cookies": True,
+    "entry_filter": {"exclude": [{"mimeType": "font/*"}]}}),
+])
+def test_PreviewSession_pages(scrub_kwargs):
+  """Test preview pages match the entries of a full scrub"""
+  har_dict = gen_har(entries=45, seed=6)
+  expected = HarSanitizer().scrub(
+    Har(har=copy.deepcopy(har_dict)), **scrub_kwargs).har_dict
+
+  total = len(expected["log"]["entries"])
+  session = PreviewSession(har_dict, scrub_kwargs)
+  pages = [session.page(start, 20) for start in reversed(range(0, total, 20))]
+
+  assert [page["total"] for page in pages] == [total] * len(pages)
+  assert sum([page["entries"] for page in reversed(pages)], []) == (
+    expected["log"]["entries"])
+  assert not any(page["degraded"] for page in pages)
+
+@pytest.mark.parametrize("scrub_kwargs", [
+  ({"all_cookies": True}),
+  ({"wordlist": ["a.b"]}),
+])
+def test_PreviewSession_regex_names(sample_har, scrub_kwargs):
+  """Test a name with regex metacharacters on one page is redacted as a
+  regex on the others, as in a full scrub"""
+  har_dict = gen_har(entries=30, seed=4)
+  named = copy.deepcopy(sample_har["log"]["entries"][0])
+  named["request"]["cookies"] = [{"name": "a.b", "value": "v"}]
+  matched = copy.deepcopy(sample_har["log"]["entries"][0])
+  matched["request"]["url"] = "https://example.com/?aXb=SECRET&z=1"
+  har_dict["log"]["entries"][:2] = [named, matched]
+  expected = HarSanitizer().scrub(
+    Har(har=copy.deepcopy(har_dict)), **scrub_kwargs).har_dict
+
+  session = PreviewSession(har_dict, scrub_kwargs)
+  pages = [session.page(start, 1) for start in range(30)]
+
+  assert "aXb=[a.b redacted]" in json.dumps(expected)
+  assert sum([page["entries"] for page in pages], []) == (
+    expected["log"]["entries"])
+
+def test_PreviewSession_entries_not_modified(sample_har):
+  """Test scrubbing pages leaves the session's parsed HAR as it was"""
+  har_dict = gen_har(entries=10, seed=7)
+  har_dict["log"]["entries"][0] = copy.deepcopy(sample_har["log"]["entries"][0])
+  original = copy.deepcopy(har_dict)
+  kwargs = {"all_cookies": True, "all_headers": True, "all_params": True}
+
+  session = PreviewSession(har_dict, kwargs)
+  session.page(0, 10)
+
+  assert har_dict == original
+  assert session.entries == original["log"]["entries"]
+
+def test_PreviewSession_names_collected_once(monkeypatch):
+  """Test the all_* names are collected by the first page, not the session"""
+  collected = []
+  collect_inventory = incremental.collect_inventory
+  def counting_collect(hs, entries, **kwargs):
+    collected.append(kwargs.get("hartypes"))
+    return collect_inventory(hs, entries, **kwargs)
+  monkeypatch.setattr(incremental, "collect_inventory", counting_collect)
+
+  session = PreviewSession(gen_har(entries=30, seed=2), {"all_cookies": True})
+  assert collected == []
+  session.page(0, 10)
+  session.page(10, 10)
+
+  assert collected == [["cookies"]]
+
+def test_PreviewSession_page_cached(monkeypatch):
+  """Test entries already previewed are not scrubbed again"""
+  session = PreviewSession(gen_har(entries=30, seed=2), {})
+  first = session.page(0, 10)
+
+  scrubbed = []
+  scrub = HarSanitizer.scrub
+  def counting_scrub(self, har, **kwargs):
+    scrubbed.append(len(har.har_dict["log"]["entries"]))
+    return scrub(self, har, **kwargs)
+  monkeypatch.setattr(HarSanitizer, "scrub", counting_scrub)
+
+  assert session.page(0, 10) == first
+  assert session.page(5, 10)["entries"][:5] == first["entries"][5:]
+  assert scrubbed == [5]
+
+@pytest.mark.parametrize("start,count", [
+  (-1, 10), (30, 10), (0, 0), (0, preview.MAX_PAGE_SIZE + 1), ("0", 10),
+])
+def test_PreviewSession_page_invalid(start, count):
+  """Test page() raises ValueError for ranges outside the HAR"""
+  session = PreviewSession(gen_har(entries=30), {})
+  with pytest.raises(ValueError):
+    session.page(start, count)
+
+def test_PreviewStore_eviction(monkeypatch):
+  """Test the store keeps the most recently used sessions within ttl"""
+  store = PreviewStore(max_sessions=2, ttl=60)
+  har_dict = gen_har(entries=2)
+  first = store.add(PreviewSession(har_dict, {}))
+  second = store.add(PreviewSession(har_dict, {}))
+  assert store.get(first) is not None
+  third = store.add(PreviewSession(har_dict, {}))
+
+  assert store.get(second) is None
+  assert store.get(first) is not None
+
+  now = preview.time.time()
+  monkeypatch.setattr(preview.time, "time", lambda: now + 61)
+  assert store.get(third) is None
+
+def test_PreviewStore_held_bytes(monkeypatch):
+  """Test stored sessions are held against the admission controller, and
+  least recently used sessions are evicted to make room"""
+  controller = AdmissionController(
+    max_request_bytes=100, max_inflight_bytes=200, max_held_bytes=100)
+  store = PreviewStore(max_sessions=8, ttl=60, controller=controller)
+  har_dict = gen_har(entries=2)
+  first = store.add(PreviewSession(har_dict, {}, size=60))
+  assert controller.held_bytes == 60
+
+  second = store.add(PreviewSession(har_dict, {}, size=40))
+  third = store.add(PreviewSession(har_dict, {}, size=30))
+  assert store.get(first) is None
+  assert store.get(second) is not None
+  assert controller.held_bytes == 70
+  with pytest.raises(Rejected) as excinfo:
+    store.add(PreviewSession(har_dict, {}, size=101))
+  assert excinfo.value.status == 413
+
+  now = preview.time.time()
+  monkeypatch.setattr(preview.time, "time", lambda: now + 61)
+  assert store.get(third) is None
+  assert controller.held_bytes == 0
+
+def test_POST_preview(sample_har):
+  """Test API /preview scrubs a page and /preview/<session> the next ones"""
+  client = harsan_api.app.test_client()
+  har_dict = gen_har(entries=25, seed=3)
+  expected = HarSanitizer().scrub(
+    Har(har=copy.deepcopy(har_dict)), all_cookies=True).har_dict
+  headers = {"Content-Type": "application/json", "Accept": "application/json"}
+  body = json.dumps({"har": har_dict, "all_cookies": True, "count": 10})
+
+  response = client.post("/preview", data=body, headers=headers)
+  first = json.loads(response.data.decode("utf8"))
+  response = client.get(
+    "/preview/{}?start=10&count=20".format(first["session"]))
+  second = json.loads(response.data.decode("utf8"))
+
+  assert response.status_code == 200
+  assert first["total"] == second["total"] == 25
+  assert first["entries"] + second["entries"] == expected["log"]["entries"]
+
+  assert client.get("/preview/{}?start=50".format(
+    first["session"])).status_code == 400
+  assert client.get("/preview/{}".format("0" * 32)).status_code == 404
+  body = json.dumps({"har": sample_har, "start": 5})
+  assert client.post(
+    "/preview", data=body, headers=headers).status_code == 400
+
+def test_GET_preview_admitted(sample_har):
+  """Test API /preview/<session> is admitted like /preview"""
+  harsan_api.ADMISSION = AdmissionController(
+    max_concurrent=1, queue_timeout=0.01, retry_after=3)
+  try:
+    client = harsan_api.app.test_client()
+    response = client.post(
+      "/preview", data=json.dumps({"har": sample_har}),
+      headers={"Content-Type": "application/json",
+               "Accept": "application/json"})
+    session_id = json.loads(response.data.decode("utf8"))["session"]
+    ticket = harsan_api.ADMISSION.acquire(10)
+    busy = client.get("/preview/{}".format(session_id))
+    harsan_api.ADMISSION.release(ticket)
+    admitted = client.get("/preview/{}".format(session_id))
+  finally:
+    harsan_api.ADMISSION = None
+
+  assert busy.status_code == 503
+  assert busy.headers["Retry-After"] == "3"
+  assert admitted.status_code == 200
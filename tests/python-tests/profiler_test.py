@@ -0,0 +1,117 @@
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#    http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import time
+
+import pytest
+
+from harsanitizer import harsan_api
+from harsanitizer.harsanitizer import Har, HarSanitizer
+from harsanitizer.hargen import gen_har
+from harsanitizer.profiler import ScrubProfiler, profile_scrub
+
+def test_profile_scrub():
+  """Test profile_scrub() matches HarSanitizer.scrub() and reports stages"""
+  har_dict = gen_har(entries=20)
+  expected = HarSanitizer().scrub(Har(har=har_dict), all_cookies=True)
+
+  har, report = profile_scrub(Har(har=har_dict), top=5, all_cookies=True)
+
+  assert har.har_dict == expected.har_dict
+  assert [stage["name"] for stage in report["stages"]] == [
+    "wordlist", "patterns", "structural", "regex"]
+  assert len(report["functions"]) == 5
+  assert report["patterns"]
+  assert sum(pattern["matches"] for pattern in report["patterns"]) > 0
+
+def test_profile_scrub_scoped_scan():
+  """Test the report holds bytes scanned per field by the scoped engine"""
+  _, report = profile_scrub(Har(har=gen_har(entries=5)), engine="scoped")
+  _, memo_report = profile_scrub(Har(har=gen_har(entries=5)), engine="memo")
+
+  assert report["scan"]["fields"]["log.entries[].request.url"]["scanned_bytes"]
+  assert memo_report["scan"] is None
+
+def test_profile_scrub_indexed_scan():
+  """Test the report compares bytes scanned by the indexed engine with the
+  reference engine"""
+  _, report = profile_scrub(Har(har=gen_har(entries=20)), engine="indexed")
+  scan = report["scan"]
+
+  assert scan["scanned_bytes"] == scan["index_bytes"] + scan["regex_bytes"]
+  assert 0 < scan["scanned_bytes"] < scan["reference_bytes"]
+  assert scan["scanned_segments"] < scan["segments"]
+  assert 0 < scan["reduction"] < 1
+
+def test_ScrubProfiler_detaches():
+  """Test the profiler is removed from the sanitizer after the scrub"""
+  hs = HarSanitizer()
+  ScrubProfiler().scrub(hs, Har(har=gen_har(entries=2)))
+
+  assert hs.tracer is None
+  assert not hasattr(hs.compile_pattern("a"), "record")
+
+@pytest.fixture
+def profiling(monkeypatch, tmpdir):
+  """Enables API profiling with reports stored in a temp dir"""
+  config = {"profiling": True, "profile_dir": str(tmpdir)}
+  monkeypatch.setattr(harsan_api, "load_config", lambda: config)
+  return config
+
+def test_POST_scrub_har_profile(profiling, sample_har):
+  """Test /scrub_har?profile=1 stores a report served by /profiles/<id>"""
+  client = harsan_api.app.test_client()
+  response = client.post(
+    "/scrub_har?profile=1",
+    data=json.dumps({"har": sample_har}),
+    headers={"Content-Type": "application/json", "Accept": "application/json"})
+  profile_id = response.headers[harsan_api.PROFILE_ID_HEADER]
+
+  report = json.loads(
+    client.get("/profiles/{}".format(profile_id)).data.decode("utf8"))
+
+  assert response.status_code == 200
+  assert os.path.isfile(os.path.join(profiling["profile_dir"], profile_id + ".json"))
+  assert [stage["name"] for stage in report["stages"]][-1] == "regex"
+
+def test_GET_profile_not_found(profiling):
+  """Test /profiles/<id> rejects unknown and malformed ids"""
+  client = harsan_api.app.test_client()
+
+  assert client.get("/profiles/{}".format("0" * 32)).status_code == 404
+  assert client.get("/profiles/..%2Fconfig").status_code == 404
+
+def test_store_profile_expiry(profiling, monkeypatch):
+  """Test stored reports are capped by max_profiles and expire after profile_ttl"""
+  profiling["profile_ttl"] = 60
+  client = harsan_api.app.test_client()
+  profile_ids = [harsan_api.store_profile({"n": n}) for n in range(3)]
+  profiling["max_profiles"] = 2
+  for age, profile_id in zip([30, 20, 10], profile_ids):
+    report_path = os.path.join(profiling["profile_dir"], profile_id + ".json")
+    mtime = time.time() - age
+    os.utime(report_path, (mtime, mtime))
+  newest = harsan_api.store_profile({"n": 3})
+
+  assert sorted(os.listdir(profiling["profile_dir"])) == sorted(
+    [profile_ids[2] + ".json", newest + ".json"])
+  assert client.get("/profiles/{}".format(profile_ids[0])).status_code == 404
+  assert client.get("/profiles/{}".format(newest)).status_code == 200
+
+  now = time.time()
+  monkeypatch.setattr(harsan_api.time, "time", lambda: now + 61)
+  assert client.get("/profiles/{}".format(newest)).status_code == 404
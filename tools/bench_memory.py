@@ -0,0 +1,115 @@
+"""Measures memory used by parsed HARs, as dicts and as compact objects.
+
+Usage (@ root "./har-sanitizer/" directory):
+  $ PYTHONPATH=. python ./tools/bench_memory.py [--entries 1000,5000]
+
+For each generated HAR size (see harsanitizer/hargen.py), parses the HAR
+in a fresh interpreter with json.loads() ("dict") and with
+Har(compact=True) ("compact"), and reports the RSS growth in MB per MB of
+HAR json.  Also checks that the compact HAR serializes back to the same
+json as the input.
+"""
+
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from harsanitizer.hargen import gen_har
+
+MODES = ["dict", "compact"]
+
+# Run in a fresh interpreter: prints the RSS growth of parsing argv[2] as
+# mode argv[1], in bytes
+MEASURE = """
+import gc, os, sys
+from harsanitizer.harsanitizer import Har
+import json
+
+def rss():
+  with open("/proc/self/statm") as statm:
+    return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+with open(sys.argv[2]) as har_file:
+  har_str = har_file.read()
+gc.collect()
+before = rss()
+if sys.argv[1] == "compact":
+  har_dict = Har(har=har_str, compact=True).har_dict
+else:
+  har_dict = json.loads(har_str)
+gc.collect()
+print(rss() - before)
+"""
+
+
+def measure(mode, har_path):
+  """Returns the RSS growth in bytes of parsing [har_path] as [mode]."""
+  env = dict(os.environ)
+  env["PYTHONPATH"] = os.pathsep.join(
+      [os.path.abspath(".")] + env.get("PYTHONPATH", "").split(os.pathsep))
+  return int(subprocess.check_output(
+      [sys.executable, "-c", MEASURE, mode, har_path], env=env))
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+  parser.add_argument(
+      "--entries", default="1000,5000",
+      help="comma separated HAR entry counts (default: 1000,5000)")
+  parser.add_argument(
+      "--body-size", type=int, default=512,
+      help="response content text size per entry (default: 512)")
+  args = parser.parse_args(argv)
+
+  # Imported here so the parent process stays small
+  from collections import OrderedDict
+  from harsanitizer import compact
+
+  work_dir = tempfile.mkdtemp(prefix="harsan-bench-")
+  report = {}
+  try:
+    for entries in [int(count) for count in args.entries.split(",")]:
+      har_str = json.dumps(gen_har(entries=entries, body_size=args.body_size))
+      har_path = os.path.join(work_dir, "{}.har".format(entries))
+      with open(har_path, "w") as har_file:
+        har_file.write(har_str)
+      input_mb = len(har_str) / 1048576.0
+      result = {
+          "input_mb": round(input_mb, 2),
+          "identical_json": compact.dumps(compact.loads(har_str)) == (
+              json.dumps(json.loads(har_str, object_pairs_hook=OrderedDict))),
+      }
+      for mode in MODES:
+        parsed_mb = measure(mode, har_path) / 1048576.0
+        result[mode] = {
+            "parsed_mb": round(parsed_mb, 2),
+            "mb_per_input_mb": round(parsed_mb / input_mb, 2),
+        }
+      report[str(entries)] = result
+  finally:
+    shutil.rmtree(work_dir)
+
+  print(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,97 @@
+"""Benchmarks HAR Sanitizer cold start time for short-lived processes.
+
+Usage (@ root "./har-sanitizer/" directory):
+  $ PYTHONPATH=. python ./tools/bench_startup.py [--runs 20]
+
+Times, in fresh interpreter processes:
+  * import: importing harsanitizer.harsanitizer
+  * cli_cold: a CLI scrub of a small HAR with an empty rule cache
+  * cli_warm: the same CLI scrub with the rule cache already populated
+"""
+
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+SMALL_HAR = {
+  "log": {
+    "entries": [{
+      "request": {
+        "url": "https://example.com/?token=abc",
+        "cookies": [{"name": "sid", "value": "123"}],
+        "headers": [{"name": "Authorization", "value": "Bearer abc"}],
+        "queryString": [{"name": "token", "value": "abc"}]
+      },
+      "response": {"content": {"mimeType": "text/html", "text": "<p>"}}
+    }]
+  }
+}
+
+
+def time_process(argv, env):
+  """Returns the wall time in seconds of running [argv] to completion."""
+  start = time.time()
+  subprocess.check_call(argv, env=env, stdout=open(os.devnull, "w"))
+  return time.time() - start
+
+
+def median(values):
+  values = sorted(values)
+  return values[len(values) // 2]
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+  parser.add_argument("--runs", type=int, default=20)
+  args = parser.parse_args()
+
+  work_dir = tempfile.mkdtemp(prefix="harsan-bench-")
+  har_path = os.path.join(work_dir, "small.har")
+  with open(har_path, "w") as har_file:
+    json.dump(SMALL_HAR, har_file)
+
+  env = dict(os.environ)
+  env["PYTHONPATH"] = os.pathsep.join(
+      [os.path.abspath(".")] + env.get("PYTHONPATH", "").split(os.pathsep))
+  import_argv = [sys.executable, "-c", "import harsanitizer.harsanitizer"]
+  cli_argv = [sys.executable, "-m", "harsanitizer.harsan_cli", har_path]
+
+  results = {"import": [], "cli_cold": [], "cli_warm": []}
+  try:
+    for run in range(args.runs):
+      env["HARSAN_CACHE_DIR"] = os.path.join(work_dir, "cache-{}".format(run))
+      results["import"].append(time_process(import_argv, env))
+      results["cli_cold"].append(time_process(cli_argv, env))
+      results["cli_warm"].append(time_process(cli_argv, env))
+  finally:
+    shutil.rmtree(work_dir)
+
+  report = dict(
+      (name, {"median_ms": round(median(times) * 1000, 1),
+              "min_ms": round(min(times) * 1000, 1)})
+      for name, times in results.items())
+  print(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,183 @@
+"""Differential test of HarSanitizer scrub engines against "reference".
+
+Usage (@ root "./har-sanitizer/" directory):
+  $ PYTHONPATH=. python ./tools/engine_diff.py [real.har ...] [--repeat 3]
+
+Scrubs generated HARs (see harsanitizer/hargen.py) and any HAR files given
+on the command line with every registered engine and each set of scrub
+options in OPTION_SETS.  Prints a json report of every engine's output
+differences from the reference engine and its speed relative to it, and
+exits with status 1 if any engine's output differs.
+"""
+
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import json
+import time
+import argparse
+
+from harsanitizer.harsanitizer import Har, HarSanitizer
+from harsanitizer.hargen import gen_har
+
+REFERENCE = "reference"
+# Generated HARs, (entries, body_size, seed)
+GENERATED = [(50, 0, 0), (200, 0, 1), (100, 4096, 2), (1000, 0, 3)]
+OPTION_SETS = {
+    "default": {},
+    "all_cookies": {"all_cookies": True},
+    "all_names": {"all_cookies": True, "all_headers": True, "all_params": True},
+    "all_content": {"all_content_mimetypes": True},
+    "custom_lists": {"wordlist": ["page", "email", "prefs"],
+                     "content_list": ["application/json", "text/css"]},
+    # Words with regex metacharacters, found in the HAR as they are
+    "regex_words": {"wordlist": ["1.1", "example.com", "prefs=theme"]},
+}
+MAX_DIFFS = 10
+
+
+def diff_paths(expected, actual, path="$"):
+  """Returns a list of "path: expected != actual" strs where json values differ."""
+  if isinstance(expected, dict) and isinstance(actual, dict):
+    diffs = []
+    for key in sorted(set(expected) | set(actual)):
+      child = "{}.{}".format(path, key)
+      if key not in actual:
+        diffs.append("{}: missing".format(child))
+      elif key not in expected:
+        diffs.append("{}: unexpected".format(child))
+      else:
+        diffs.extend(diff_paths(expected[key], actual[key], child))
+    return diffs
+  if isinstance(expected, list) and isinstance(actual, list):
+    diffs = []
+    if len(expected) != len(actual):
+      diffs.append("{}: length {} != {}".format(
+          path, len(expected), len(actual)))
+    for index, (expected_item, actual_item) in enumerate(zip(expected, actual)):
+      diffs.extend(diff_paths(
+          expected_item, actual_item, "{}[{}]".format(path, index)))
+    return diffs
+  if expected != actual:
+    return ["{}: {!r} != {!r}".format(path, expected, actual)]
+  return []
+
+
+def run_engine(har_str, engine, options, repeat):
+  """Scrubs [har_str] with [engine] [repeat] times.
+
+  Returns:
+    (sanitized har dict, fastest scrub in seconds)
+  """
+  best = None
+  for _ in range(repeat):
+    # scrub() modifies the Har it is given, so each run parses a fresh one
+    har = Har(har=har_str)
+    start = time.time()
+    sanitized_har = HarSanitizer().scrub(har, engine=engine, **options)
+    seconds = time.time() - start
+    best = seconds if best is None else min(best, seconds)
+  return sanitized_har.har_dict, best
+
+
+def run_case(name, har_str, engines, repeat=1):
+  """Runs every engine on [har_str] with every OPTION_SETS entry.
+
+  Returns:
+    list of case report dicts, one per option set
+  """
+  cases = []
+  for options_name, options in sorted(OPTION_SETS.items()):
+    expected, reference_seconds = run_engine(
+        har_str, REFERENCE, options, repeat)
+    results = {}
+    for engine in engines:
+      if engine == REFERENCE:
+        actual, seconds = expected, reference_seconds
+      else:
+        actual, seconds = run_engine(har_str, engine, options, repeat)
+      diffs = diff_paths(expected, actual)
+      results[engine] = {
+          "seconds": round(seconds, 4),
+          "speedup": round(reference_seconds / max(seconds, 1e-9), 2),
+          "equal": not diffs,
+          "diffs": diffs[:MAX_DIFFS],
+          "diff_count": len(diffs),
+      }
+    cases.append({
+        "har": name,
+        "bytes": len(har_str),
+        "options": options_name,
+        "engines": results,
+    })
+  return cases
+
+
+def summarize(cases, engines):
+  """Returns {engine: {"mismatched_cases", "seconds", "speedup"}}."""
+  summary = {}
+  reference_total = sum(case["engines"][REFERENCE]["seconds"] for case in cases)
+  for engine in engines:
+    total = sum(case["engines"][engine]["seconds"] for case in cases)
+    summary[engine] = {
+        "mismatched_cases": len(
+            [case for case in cases if not case["engines"][engine]["equal"]]),
+        "seconds": round(total, 4),
+        "speedup": round(reference_total / max(total, 1e-9), 2),
+    }
+  return summary
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+  parser.add_argument("har_paths", nargs="*", help="real HAR files to include")
+  parser.add_argument(
+      "--engine", action="append", dest="engines",
+      choices=sorted(HarSanitizer.engines),
+      help="engine to compare (repeatable, default: all)")
+  parser.add_argument(
+      "--repeat", type=int, default=3, help="runs per engine, fastest is kept")
+  parser.add_argument(
+      "--no-generated", dest="generated", action="store_false",
+      help="only scrub the HAR files given")
+  args = parser.parse_args(argv)
+
+  engines = sorted(set(args.engines or HarSanitizer.engines) | set([REFERENCE]))
+  inputs = []
+  if args.generated:
+    for entries, body_size, seed in GENERATED:
+      inputs.append((
+          "hargen:entries={},body_size={},seed={}".format(
+              entries, body_size, seed),
+          json.dumps(gen_har(entries=entries, body_size=body_size, seed=seed))))
+  for har_path in args.har_paths:
+    with open(har_path, "r") as har_file:
+      inputs.append((os.path.basename(har_path), har_file.read()))
+
+  cases = []
+  for name, har_str in inputs:
+    cases.extend(run_case(name, har_str, engines, repeat=args.repeat))
+
+  summary = summarize(cases, engines)
+  print(json.dumps(
+      {"summary": summary, "cases": cases}, indent=2, sort_keys=True))
+  return 1 if any(result["mismatched_cases"]
+                  for result in summary.values()) else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,372 @@
+"""Load tests the HAR Sanitizer Flask API on localhost.
+
+Usage (@ root "./har-sanitizer/" directory):
+  $ PYTHONPATH=. python ./tools/loadtest.py [--requests 500] [--concurrency 8]
+      [--mix scrub_har=4,cookies=1,...] [--sizes 10,100,1000] [--workers 0]
+
+Starts harsan_api in a subprocess on a free local port, with config.json
+plus the given overrides, and replays a mix of endpoint calls with
+generated HARs (see harsanitizer/hargen.py) from concurrent client threads.
+The sequence of calls is fixed by --seed, so runs with the same arguments
+send the same requests.  Prints a json report of throughput, latency
+percentiles and error rates per endpoint, and the RSS of the server and its
+worker processes over time.  Nothing is fetched from the network.
+"""
+
+# Copyright 2017, Google Inc.
+# Authors: Garrett Anderson
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import json
+import time
+import Queue
+import random
+import shutil
+import socket
+import httplib
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+
+from harsanitizer.hargen import gen_har
+
+DEFAULT_MIX = "scrub_har=4,cookies=1,headers=1,params=1,mimetypes=1,get_wordlist=1"
+DEFAULT_SIZES = "10,100,1000"
+# {name: (method, path, sends a HAR)}
+ENDPOINTS = {
+    "scrub_har": ("POST", "/scrub_har", True),
+    "cookies": ("POST", "/cookies", True),
+    "headers": ("POST", "/headers", True),
+    "params": ("POST", "/params", True),
+    "mimetypes": ("POST", "/mimetypes", True),
+    "get_wordlist": ("GET", "/get_wordlist", False),
+}
+PERCENTILES = [50, 95, 99]
+STARTUP_TIMEOUT = 30
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def parse_mix(mix):
+  """Parses "name=weight,..." into a sorted list of (name, weight)."""
+  weights = []
+  for item in mix.split(","):
+    name, _, weight = item.partition("=")
+    if name not in ENDPOINTS:
+      raise argparse.ArgumentTypeError("unknown endpoint {}, expected one "
+                                       "of: {}".format(name, ", ".join(
+                                           sorted(ENDPOINTS))))
+    weights.append((name, int(weight or 1)))
+  return sorted(weights)
+
+
+def parse_sizes(sizes):
+  """Parses "10,100,..." into a sorted list of HAR entry counts."""
+  return sorted(int(size) for size in sizes.split(","))
+
+
+def free_port():
+  """Returns a free local TCP port."""
+  sock = socket.socket()
+  sock.bind(("127.0.0.1", 0))
+  port = sock.getsockname()[1]
+  sock.close()
+  return port
+
+
+def percentile(sorted_values, percent):
+  """Returns the nearest-rank [percent] percentile of [sorted_values]."""
+  if not sorted_values:
+    return None
+  rank = int(-(-percent * len(sorted_values) // 100))
+  return sorted_values[max(rank, 1) - 1]
+
+
+def process_tree_rss(pid):
+  """Returns (RSS bytes, process count) of [pid] and its descendants."""
+  parents = {}
+  for entry in os.listdir("/proc"):
+    if not entry.isdigit():
+      continue
+    try:
+      with open("/proc/{}/stat".format(entry), "r") as stat_file:
+        # The command name may contain spaces, fields follow the last ")"
+        fields = stat_file.read().rsplit(")", 1)[1].split()
+      parents.setdefault(int(fields[1]), []).append(int(entry))
+    except (IOError, IndexError):
+      continue
+
+  rss, count, pending = 0, 0, [pid]
+  while pending:
+    current = pending.pop()
+    try:
+      with open("/proc/{}/statm".format(current), "r") as statm_file:
+        rss += int(statm_file.read().split()[1]) * PAGE_SIZE
+      count += 1
+    except IOError:
+      continue
+    pending.extend(parents.get(current, []))
+  return rss, count
+
+
+class RssSampler(threading.Thread):
+  """Samples the RSS of a process tree every [interval] seconds."""
+
+  def __init__(self, pid, interval):
+    super(RssSampler, self).__init__()
+    self.daemon = True
+    self.pid = pid
+    self.interval = interval
+    self.samples = []
+    self.stopped = threading.Event()
+    self.start_time = time.time()
+
+  def run(self):
+    while not self.stopped.is_set():
+      rss, count = process_tree_rss(self.pid)
+      self.samples.append({
+          "seconds": round(time.time() - self.start_time, 1),
+          "rss_mb": round(rss / 1048576.0, 1),
+          "processes": count,
+      })
+      self.stopped.wait(self.interval)
+
+  def stop(self):
+    self.stopped.set()
+    self.join()
+
+
+class Server(object):
+  """harsan_api running in a subprocess on a free local port.
+
+  Args:
+    config: dict written as the server's config.json
+  """
+
+  def __init__(self, config):
+    super(Server, self).__init__()
+    self.port = free_port()
+    self.work_dir = tempfile.mkdtemp(prefix="harsan-loadtest-")
+    with open(os.path.join(self.work_dir, "config.json"), "w") as config_file:
+      json.dump(config, config_file)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [os.path.abspath(".")] + env.get("PYTHONPATH", "").split(os.pathsep))
+    self.log = open(os.path.join(self.work_dir, "server.log"), "w")
+    self.process = subprocess.Popen(
+        [sys.executable, "-c",
+         "from harsanitizer import harsan_api; "
+         "harsan_api.run(host='127.0.0.1', port={})".format(self.port)],
+        cwd=self.work_dir, env=env, stdout=self.log, stderr=subprocess.STDOUT)
+
+  def wait_ready(self):
+    """Waits until the server answers /get_wordlist."""
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+      if self.process.poll() is not None:
+        raise RuntimeError("Server exited, see {}".format(self.log.name))
+      try:
+        if call(self.port, "GET", "/get_wordlist", None)[0] == 200:
+          return
+      except socket.error:
+        pass
+      time.sleep(0.1)
+    raise RuntimeError("Server did not start in {}s".format(STARTUP_TIMEOUT))
+
+  def stop(self):
+    self.process.terminate()
+    self.process.wait()
+    self.log.close()
+    shutil.rmtree(self.work_dir)
+
+
+def call(port, method, path, body):
+  """Makes one request, returning (status, response bytes)."""
+  connection = httplib.HTTPConnection("127.0.0.1", port, timeout=300)
+  try:
+    headers = {"Accept": "application/json"}
+    if body is not None:
+      headers["Content-Type"] = "application/json"
+    connection.request(method, path, body, headers)
+    response = connection.getresponse()
+    return response.status, len(response.read())
+  finally:
+    connection.close()
+
+
+def gen_payloads(sizes, seed):
+  """Returns {(endpoint, entries): request body str} for every HAR size."""
+  payloads = {}
+  for entries in sizes:
+    har = gen_har(entries=entries, seed=seed)
+    for name, (_, _, sends_har) in ENDPOINTS.items():
+      if not sends_har:
+        payloads[(name, entries)] = None
+      elif name == "scrub_har":
+        payloads[(name, entries)] = json.dumps(
+            {"har": har, "all_cookies": True})
+      else:
+        payloads[(name, entries)] = json.dumps(har)
+  return payloads
+
+
+def gen_schedule(mix, sizes, requests, seed):
+  """Returns the list of (endpoint, entries) requests to send, in order."""
+  rng = random.Random(seed)
+  names = [name for name, weight in mix for _ in range(weight)]
+  return [(rng.choice(names), rng.choice(sizes)) for _ in range(requests)]
+
+
+def run_load(port, schedule, payloads, concurrency):
+  """Sends [schedule] from [concurrency] threads.
+
+  Returns:
+    (list of (endpoint, entries, status or error str, seconds), wall seconds)
+  """
+  work = Queue.Queue()
+  for item in schedule:
+    work.put(item)
+  results = []
+  lock = threading.Lock()
+
+  def worker():
+    while True:
+      try:
+        name, entries = work.get_nowait()
+      except Queue.Empty:
+        return
+      method, path, _ = ENDPOINTS[name]
+      start = time.time()
+      try:
+        status = call(port, method, path, payloads[(name, entries)])[0]
+      except (socket.error, httplib.HTTPException) as err:
+        status = type(err).__name__
+      with lock:
+        results.append((name, entries, status, time.time() - start))
+
+  threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+  start = time.time()
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  return results, time.time() - start
+
+
+def summarize(results, wall_seconds):
+  """Returns throughput, latency and error stats for [results]."""
+  latencies = sorted(seconds * 1000 for _, _, _, seconds in results)
+  statuses = {}
+  for _, _, status, _ in results:
+    statuses[str(status)] = statuses.get(str(status), 0) + 1
+  errors = len([1 for _, _, status, _ in results if status != 200])
+  summary = {
+      "requests": len(results),
+      "throughput_rps": round(len(results) / max(wall_seconds, 1e-9), 2),
+      "error_rate": round(errors / float(max(len(results), 1)), 4),
+      "statuses": statuses,
+      "latency_ms": {
+          "mean": round(sum(latencies) / max(len(latencies), 1), 1),
+          "max": round(latencies[-1], 1) if latencies else None,
+      },
+  }
+  for percent in PERCENTILES:
+    value = percentile(latencies, percent)
+    summary["latency_ms"]["p{}".format(percent)] = (
+        round(value, 1) if value is not None else None)
+  return summary
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+  parser.add_argument("--requests", type=int, default=500)
+  parser.add_argument("--concurrency", type=int, default=8)
+  parser.add_argument(
+      "--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+      help="endpoint=weight list (default: {})".format(DEFAULT_MIX))
+  parser.add_argument(
+      "--sizes", type=parse_sizes, default=parse_sizes(DEFAULT_SIZES),
+      help="HAR entry counts (default: {})".format(DEFAULT_SIZES))
+  parser.add_argument("--seed", type=int, default=0)
+  parser.add_argument(
+      "--workers", type=int, default=None,
+      help="overrides the config.json scrub worker pool size")
+  parser.add_argument(
+      "--config", default="config.json",
+      help="server config to start from (default: ./config.json)")
+  parser.add_argument(
+      "--sample-interval", type=float, default=1.0,
+      help="seconds between RSS samples")
+  args = parser.parse_args(argv)
+
+  with open(args.config, "r") as config_file:
+    config = json.load(config_file)
+  if not config.get("static_folder", "").startswith("http"):
+    config["static_folder"] = os.path.abspath(
+        config.get("static_folder", "./harsanitizer/static"))
+  if args.workers is not None:
+    config["workers"] = args.workers
+
+  payloads = gen_payloads(args.sizes, args.seed)
+  schedule = gen_schedule(args.mix, args.sizes, args.requests, args.seed)
+
+  server = Server(config)
+  try:
+    server.wait_ready()
+    sampler = RssSampler(server.process.pid, args.sample_interval)
+    sampler.start()
+    results, wall_seconds = run_load(
+        server.port, schedule, payloads, args.concurrency)
+    sampler.stop()
+  finally:
+    server.stop()
+
+  endpoints = {}
+  for name, _ in args.mix:
+    endpoints[name] = summarize(
+        [result for result in results if result[0] == name], wall_seconds)
+  sizes = {}
+  for entries in args.sizes:
+    sizes[str(entries)] = summarize(
+        [result for result in results if result[1] == entries], wall_seconds)
+
+  report = {
+      "config": {
+          "requests": args.requests,
+          "concurrency": args.concurrency,
+          "mix": dict(args.mix),
+          "sizes": args.sizes,
+          "seed": args.seed,
+          "workers": config.get("workers", 0),
+          "python": platform.python_version(),
+      },
+      "wall_seconds": round(wall_seconds, 2),
+      "overall": summarize(results, wall_seconds),
+      "endpoints": endpoints,
+      "sizes": sizes,
+      "rss": {
+          "peak_mb": max([sample["rss_mb"] for sample in sampler.samples]
+                         or [0]),
+          "samples": sampler.samples,
+      },
+  }
+  print(json.dumps(report, indent=2, sort_keys=True))
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())